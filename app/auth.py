@@ -1,9 +1,13 @@
+import asyncio
 import secrets
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from passlib.context import CryptContext
 from fastapi import HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from redis import asyncio as redis
 from app.config import get_settings
+from app.redis_pool import get_client
+from app.token_cache import invalidate, token_cache
 import logging
 
 logger = logging.getLogger(__name__)
@@ -16,14 +20,53 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 bearer_scheme = HTTPBearer(auto_error=False)
 
 async def get_redis():
-    logger.debug("Connecting to redis")
-    return redis.from_url(str(settings.redis_url), decode_responses=False)
+    return get_client()
+
+# bcrypt calls waiting for or running on the hashing executor
+_hash_pending = 0
+_hash_rejected = 0
+
+@lru_cache
+def _hash_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(
+        max_workers=settings.password_hash_workers, thread_name_prefix="bcrypt"
+    )
+
+async def _run_hashing(fn, *args):
+    """Run a bcrypt call on the dedicated executor.
+
+    At most ``PASSWORD_HASH_QUEUE_SIZE`` calls may be queued or running; any
+    further call is rejected with HTTP 429 instead of piling up.
+    """
+    global _hash_pending, _hash_rejected
+    if _hash_pending >= settings.password_hash_queue_size:
+        _hash_rejected += 1
+        logger.warning("Password hashing saturated, rejecting request")
+        raise HTTPException(
+            status_code=429,
+            detail="too many login attempts",
+            headers={"Retry-After": "1"},
+        )
+    _hash_pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_hash_executor(), fn, *args)
+    finally:
+        _hash_pending -= 1
+
+def password_hash_stats() -> dict[str, int]:
+    return {
+        "workers": settings.password_hash_workers,
+        "pending": _hash_pending,
+        "queue_size": settings.password_hash_queue_size,
+        "rejected": _hash_rejected,
+    }
 
 async def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return await _run_hashing(pwd_context.hash, password)
 
 async def verify_password(password: str, hashed: str) -> bool:
-    return pwd_context.verify(password, hashed)
+    return await _run_hashing(pwd_context.verify, password, hashed)
 
 async def create_token() -> str:
     return secrets.token_hex(32)
@@ -62,6 +105,7 @@ async def login_user(username: str, password: str) -> str:
     old_token = data.get(b"token")
     if old_token:
         await rds.delete(f"token:{old_token.decode()}")
+        await invalidate(rds, f"token:{old_token.decode()}")
     await rds.hset(key, "token", token)
     await rds.set(
         f"token:{token}", f"{username}:{company_id}", ex=settings.token_ttl
@@ -74,6 +118,10 @@ async def get_current_user(
     if credentials is None:
         raise HTTPException(status_code=401, detail="missing token")
     token = credentials.credentials
+    cache = token_cache()
+    cached = cache.get(f"token:{token}")
+    if cached is not None:
+        return cached
     rds = await get_redis()
     pair = await rds.get(f"token:{token}")
     if not pair:
@@ -95,5 +143,8 @@ async def get_current_user(
     if stored != company_id:
         logger.warning("Token company mismatch for %s", username)
         raise HTTPException(status_code=401, detail="invalid token")
+    cache.set(f"token:{token}", (username, company_id))
+    # lets _ensure_company skip its lookup for the authenticated user
+    cache.set(f"identity:{username}", company_id)
     return username, company_id
 
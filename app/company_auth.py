@@ -3,11 +3,13 @@ import secrets
 
 from fastapi import APIRouter, Cookie, Depends, HTTPException
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from passlib.context import CryptContext
-from redis import asyncio as redis
 
+from app.auth import hash_password, verify_password
 from app.config import get_settings
+from app.redis_pool import get_client
 from app.models import CompanyAuthResponse, CompanyFlagsResponse, CompanyFlagsUpdate
+from app.services.company import invalidate_company
+from app.token_cache import invalidate, token_cache
 
 logger = logging.getLogger(__name__)
 
@@ -15,23 +17,12 @@ settings = get_settings()
 
 router = APIRouter()
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 # HTTP bearer scheme for authentication in Swagger UI
 bearer_scheme = HTTPBearer(auto_error=False)
 
 
 async def get_redis():
-    logger.debug("Connecting to redis")
-    return redis.from_url(str(settings.redis_url), decode_responses=False)
-
-
-async def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
-
-
-async def verify_password(password: str, hashed: str) -> bool:
-    return pwd_context.verify(password, hashed)
+    return get_client()
 
 
 async def create_token() -> str:
@@ -64,6 +55,11 @@ async def register_company(
             "enable_calendar": int(enable_calendar),
         },
     )
+    if idle_timeout:
+        # companies the idle-user task has to look at
+        await rds.hset("companies:idle_timeout", name, idle_timeout)
+    # a lookup before registration may have cached the missing company
+    await invalidate_company(rds, name)
     await rds.set(f"company_token:{token}", name, ex=settings.token_ttl)
     return token
 
@@ -82,6 +78,7 @@ async def login_company(name: str, password: str) -> str:
     old_token = data.get(b"token")
     if old_token:
         await rds.delete(f"company_token:{old_token.decode()}")
+        await invalidate(rds, f"company_token:{old_token.decode()}")
     await rds.hset(key, "token", token)
     await rds.set(f"company_token:{token}", name, ex=settings.token_ttl)
     return token
@@ -99,8 +96,10 @@ async def rotate_company_key(name: str) -> str:
     old_token = data.get(b"token")
     if old_token:
         await rds.delete(f"company_token:{old_token.decode()}")
+        await invalidate(rds, f"company_token:{old_token.decode()}")
     await rds.hset(key, "token", new_token)
     await rds.set(f"company_token:{new_token}", name, ex=settings.token_ttl)
+    await invalidate_company(rds, name)
     return new_token
 
 
@@ -111,6 +110,10 @@ async def get_current_company(
     token = credentials.credentials if credentials else token_cookie
     if not token:
         raise HTTPException(status_code=401, detail="missing token")
+    cache = token_cache()
+    name = cache.get(f"company_token:{token}")
+    if name is not None:
+        return name
     rds = await get_redis()
     name = await rds.get(f"company_token:{token}")
     if not name:
@@ -118,6 +121,7 @@ async def get_current_company(
         raise HTTPException(status_code=401, detail="invalid token")
     if isinstance(name, bytes):
         name = name.decode()
+    cache.set(f"company_token:{token}", name)
     return name
 
 
@@ -142,6 +146,7 @@ async def update_company_flags(name: str, flags: CompanyFlagsUpdate) -> dict[str
         mapping["enable_calendar"] = int(flags.enable_calendar)
     if mapping:
         await rds.hset(key, mapping=mapping)
+        await invalidate_company(rds, name)
     data = await rds.hgetall(key)
     return {
         "enable_summary": bool(int(data.get(b"enable_summary", b"1"))),
@@ -0,0 +1,208 @@
+"""Compression codecs for message content.
+
+Codecs are registered by name; the name a message was written with is kept
+in ``extra["compress_algo"]`` so every message can be read back whatever the
+current ``COMPRESSION_ALGORITHM`` is. ``zstd`` and ``lz4`` need the optional
+``zstandard`` and ``lz4`` packages and are only usable when those are
+installed.
+
+``zstd`` can additionally use a dictionary trained on a company's messages.
+Small messages share most of their vocabulary, so a dictionary lets zstd
+compress them well below what it reaches on its own. Dictionaries are stored
+in Redis under ``zstd:dict:{id}`` and cached in the process by ID; the ID is
+saved in ``extra["compress_dict"]`` of every message compressed with it.
+"""
+
+import gzip
+import logging
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# level 3 is zstd's default: close to gzip -6 in ratio, far faster
+ZSTD_LEVEL = 3
+# size of trained dictionaries; larger ones gain little on chat messages
+DICT_SIZE = 16 * 1024
+
+
+def dictionary_key(dict_id: int) -> str:
+    return f"zstd:dict:{dict_id}"
+
+
+class MissingDictionary(LookupError):
+    """Raised when data needs a zstd dictionary not yet loaded in the process."""
+
+    def __init__(self, dict_id: int):
+        super().__init__(dict_id)
+        self.dict_id = dict_id
+
+
+class Codec:
+    """Compress and decompress bytes; ``dict_id`` is only used by zstd."""
+
+    name = "none"
+
+    def compress(self, data: bytes, dict_id: int | None = None) -> bytes:
+        return data
+
+    def decompress(self, data: bytes, dict_id: int | None = None) -> bytes:
+        return data
+
+
+class GzipCodec(Codec):
+    name = "gzip"
+
+    def compress(self, data: bytes, dict_id: int | None = None) -> bytes:
+        # mtime=0 keeps the output deterministic
+        return gzip.compress(data, mtime=0)
+
+    def decompress(self, data: bytes, dict_id: int | None = None) -> bytes:
+        return gzip.decompress(data)
+
+
+class ZstdCodec(Codec):
+    name = "zstd"
+
+    def __init__(self):
+        import zstandard
+
+        self._zstd = zstandard
+        self._plain_c = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+        self._plain_d = zstandard.ZstdDecompressor()
+
+    @lru_cache(maxsize=64)
+    def _compressor(self, dict_id: int):
+        return self._zstd.ZstdCompressor(
+            level=ZSTD_LEVEL, dict_data=_dictionary(dict_id)
+        )
+
+    @lru_cache(maxsize=64)
+    def _decompressor(self, dict_id: int):
+        return self._zstd.ZstdDecompressor(dict_data=_dictionary(dict_id))
+
+    def compress(self, data: bytes, dict_id: int | None = None) -> bytes:
+        if dict_id:
+            return self._compressor(dict_id).compress(data)
+        return self._plain_c.compress(data)
+
+    def decompress(self, data: bytes, dict_id: int | None = None) -> bytes:
+        if dict_id:
+            return self._decompressor(dict_id).decompress(data)
+        return self._plain_d.decompress(data)
+
+
+class Lz4Codec(Codec):
+    name = "lz4"
+
+    def __init__(self):
+        import lz4.frame
+
+        self._frame = lz4.frame
+
+    def compress(self, data: bytes, dict_id: int | None = None) -> bytes:
+        return self._frame.compress(data)
+
+    def decompress(self, data: bytes, dict_id: int | None = None) -> bytes:
+        return self._frame.decompress(data)
+
+
+# codec classes by name; instances are created on first use so a missing
+# optional package only matters to the messages that need it
+_REGISTRY: dict[str, type[Codec]] = {
+    "none": Codec,
+    "gzip": GzipCodec,
+    "zstd": ZstdCodec,
+    "lz4": Lz4Codec,
+}
+_dictionaries: dict[int, bytes] = {}
+
+
+def register_codec(codec: type[Codec]) -> None:
+    _REGISTRY[codec.name] = codec
+    get_codec.cache_clear()
+
+
+@lru_cache
+def get_codec(name: str) -> Codec:
+    """Return the codec registered as ``name``.
+
+    Raises ``ValueError`` for unknown names and for codecs whose package is
+    not installed.
+    """
+    try:
+        cls = _REGISTRY[name]
+    except KeyError:
+        raise ValueError(f"unknown compression codec {name!r}") from None
+    try:
+        return cls()
+    except ImportError as exc:
+        raise ValueError(
+            f"compression codec {name!r} is unavailable: {exc}"
+        ) from exc
+
+
+def available_codecs() -> list[str]:
+    out = []
+    for name in _REGISTRY:
+        try:
+            get_codec(name)
+        except ValueError:
+            continue
+        out.append(name)
+    return out
+
+
+def _dictionary(dict_id: int):
+    import zstandard
+
+    try:
+        raw = _dictionaries[dict_id]
+    except KeyError:
+        raise MissingDictionary(dict_id) from None
+    return zstandard.ZstdCompressionDict(raw)
+
+
+def add_dictionary(dict_id: int, raw: bytes) -> None:
+    _dictionaries[dict_id] = raw
+
+
+async def load_dictionary(rds, dict_id: int) -> bool:
+    """Fetch dictionary ``dict_id`` from Redis unless it is already loaded."""
+    if dict_id in _dictionaries:
+        return True
+    raw = await rds.get(dictionary_key(dict_id))
+    if raw is None:
+        logger.error("zstd dictionary %s is missing from Redis", dict_id)
+        return False
+    add_dictionary(dict_id, raw)
+    return True
+
+
+def train_dictionary(samples: list[bytes], size: int) -> tuple[int, bytes]:
+    """Train a zstd dictionary of at most ``size`` bytes on ``samples``.
+
+    Returns the dictionary ID and its serialized form. Raises ``ValueError``
+    when zstd cannot train on the samples, usually because there are too
+    few of them.
+    """
+    import zstandard
+
+    try:
+        trained = zstandard.train_dictionary(size, samples)
+    except zstandard.ZstdError as exc:
+        raise ValueError(f"dictionary training failed: {exc}") from exc
+    return trained.dict_id(), trained.as_bytes()
+
+
+__all__ = [
+    "DICT_SIZE",
+    "Codec",
+    "MissingDictionary",
+    "add_dictionary",
+    "available_codecs",
+    "dictionary_key",
+    "get_codec",
+    "load_dictionary",
+    "register_codec",
+    "train_dictionary",
+]
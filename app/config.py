@@ -5,6 +5,12 @@ from pydantic import Field
 class Settings(BaseSettings):
     redis_url: str = Field("redis://redis:6379/0", alias="REDIS_URL")
     redis_index_algorithm: str = Field("flat", alias="REDIS_INDEX_ALGORITHM")
+    redis_max_connections: int = Field(100, alias="REDIS_MAX_CONNECTIONS")
+    redis_pool_timeout: float = Field(5.0, alias="REDIS_POOL_TIMEOUT")
+    redis_socket_timeout: float | None = Field(None, alias="REDIS_SOCKET_TIMEOUT")
+    redis_connect_timeout: float = Field(5.0, alias="REDIS_CONNECT_TIMEOUT")
+    redis_socket_keepalive: bool = Field(True, alias="REDIS_SOCKET_KEEPALIVE")
+    redis_health_check_interval: int = Field(30, alias="REDIS_HEALTH_CHECK_INTERVAL")
     minio_endpoint: str = Field("localhost:9000", alias="MINIO_ENDPOINT")
     minio_access_key: str = Field("minioadmin", alias="MINIO_ACCESS_KEY")
     minio_secret_key: str = Field("minioadmin", alias="MINIO_SECRET_KEY")
@@ -13,9 +19,31 @@ class Settings(BaseSettings):
     openai_base_url: str | None = Field("https://api.openai.com/v1", alias="OPENAI_BASE_URL")
     openai_chat_model: str = Field("gpt-3.5-turbo", alias="OPENAI_CHAT_MODEL")
     summary_token_threshold: int = Field(3000, alias="SUMMARY_TOKEN_THRESHOLD")
+    summary_max_tokens: int = Field(2000, alias="SUMMARY_MAX_TOKENS")
+    summary_chunk_tokens: int = Field(3000, alias="SUMMARY_CHUNK_TOKENS")
+    summary_concurrency: int = Field(4, alias="SUMMARY_CONCURRENCY")
+    summary_chunk_ttl: int = Field(86400, alias="SUMMARY_CHUNK_TTL")
+    summary_lock_ttl: int = Field(300, alias="SUMMARY_LOCK_TTL")
+    tag_batch_size: int = Field(20, alias="TAG_BATCH_SIZE")
+    calendar_feed_maxlen: int = Field(100000, alias="CALENDAR_FEED_MAXLEN")
+    calendar_claim_idle_ms: int = Field(300000, alias="CALENDAR_CLAIM_IDLE_MS")
+    calendar_poll_interval: float = Field(10.0, alias="CALENDAR_POLL_INTERVAL")
+    reminder_poll_interval: float = Field(1.0, alias="REMINDER_POLL_INTERVAL")
+    worker_max_in_flight: int = Field(32, alias="WORKER_MAX_IN_FLIGHT")
+    celery_worker_pool: str = Field("prefork", alias="CELERY_WORKER_POOL")
+    celery_worker_concurrency: int | None = Field(
+        None, alias="CELERY_WORKER_CONCURRENCY"
+    )
     hf_embed_model: str = Field("sentence-transformers/all-MiniLM-L6-v2", alias="HF_EMBED_MODEL")
+    embed_dimension: int | None = Field(None, alias="EMBED_DIMENSION")
+    embed_meta_path: str = Field(
+        os.path.join(os.path.expanduser("~"), ".cache", "history-hub", "embeddings.json"),
+        alias="EMBED_META_PATH",
+    )
     stt_ws_url: str | None = Field("ws://127.0.0.1:8088/ws", alias="STT_WS_URL")
     encryption_key: str | None = Field(None, alias="ENCRYPTION_KEY")
+    encryption_old_keys: str | None = Field(None, alias="ENCRYPTION_OLD_KEYS")
+    encryption_mode: str = Field("message", alias="ENCRYPTION_MODE")
     admin_key: str | None = Field(None, alias="ADMIN_KEY")
     token_ttl: int = Field(86400, alias="TOKEN_TTL")
     log_level: str = Field("INFO", alias="LOG_LEVEL")
@@ -24,6 +52,19 @@ class Settings(BaseSettings):
     compression_algorithm: str = Field("gzip", alias="COMPRESSION_ALGORITHM")
     cost_per_message: float = Field(0.0, alias="COST_PER_MESSAGE")
     cost_per_token: float = Field(0.0, alias="COST_PER_TOKEN")
+    bulk_import_chunk: int = Field(1000, alias="BULK_IMPORT_CHUNK")
+    embed_batch_size: int = Field(64, alias="EMBED_BATCH_SIZE")
+    embed_batch_wait_ms: int = Field(10, alias="EMBED_BATCH_WAIT_MS")
+    embed_queue_size: int = Field(10000, alias="EMBED_QUEUE_SIZE")
+    embed_cache_size: int = Field(4096, alias="EMBED_CACHE_SIZE")
+    embed_cache_ttl: int = Field(604800, alias="EMBED_CACHE_TTL")
+    password_hash_workers: int = Field(4, alias="PASSWORD_HASH_WORKERS")
+    password_hash_queue_size: int = Field(64, alias="PASSWORD_HASH_QUEUE_SIZE")
+    token_cache_size: int = Field(10000, alias="TOKEN_CACHE_SIZE")
+    token_cache_ttl: int = Field(60, alias="TOKEN_CACHE_TTL")
+    company_cache_size: int = Field(1000, alias="COMPANY_CACHE_SIZE")
+    company_cache_ttl: int = Field(10, alias="COMPANY_CACHE_TTL")
+    vector_inline_payload: bool = Field(False, alias="VECTOR_INLINE_PAYLOAD")
     model_config = {
         "env_file": ".env",
         "env_file_encoding": "utf-8",
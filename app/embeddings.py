@@ -1,27 +1,143 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
 import os
-from sentence_transformers import SentenceTransformer
 from functools import lru_cache
+from typing import TYPE_CHECKING
+import numpy as np
+from app.cache import LRUCache
 from app.config import get_settings
 import logging
 
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
 logger = logging.getLogger(__name__)
 
 settings = get_settings()
 
 @lru_cache
 def get_model() -> SentenceTransformer:
+    from sentence_transformers import SentenceTransformer
+
     model_name = settings.hf_embed_model
     logger.info("Loading embedding model %s", model_name)
     return SentenceTransformer(model_name, device="cpu")
 
-@lru_cache(maxsize=1024)
-def _cached_embed(text: str) -> tuple[float, ...]:
+@lru_cache
+def _local_cache() -> LRUCache:
+    # float32 vectors keyed by the same content hash as the Redis tier
+    return LRUCache(maxsize=settings.embed_cache_size)
+
+def _cache_key(text: str) -> str:
+    digest = hashlib.sha256(
+        f"{settings.hf_embed_model}\0{text}".encode()
+    ).hexdigest()
+    return f"embcache:{digest}"
+
+def _encode(texts: list[str]) -> list[np.ndarray]:
     model = get_model()
-    return tuple(model.encode(text, convert_to_numpy=False))
+    vectors = model.encode(texts, batch_size=len(texts), convert_to_numpy=True)
+    return [np.asarray(v, dtype=np.float32) for v in vectors]
 
 def embed(text: str) -> list[float]:
     logger.debug("Embedding text of length %d", len(text))
-    return list(_cached_embed(text))
+    key = _cache_key(text)
+    vec = _local_cache().get(key)
+    if vec is None:
+        vec = _encode([text])[0]
+        _local_cache().set(key, vec)
+    return vec.tolist()
+
+async def aembed_many(rds, texts: list[str]) -> list[np.ndarray]:
+    """Embed ``texts`` through the in-process and Redis caches.
+
+    Texts missing from both tiers are encoded with one ``model.encode`` call
+    in the default executor and written back to both tiers. ``rds`` may be
+    ``None`` to use only the in-process tier.
+    """
+    local = _local_cache()
+    keys = [_cache_key(t) for t in texts]
+    result: list[np.ndarray | None] = [local.get(k) for k in keys]
+    missing = [i for i, v in enumerate(result) if v is None]
+    if missing and rds is not None:
+        try:
+            raw = await rds.mget([keys[i] for i in missing])
+        except Exception:
+            logger.exception("Embedding cache lookup failed")
+            raw = [None] * len(missing)
+        still_missing = []
+        for i, blob in zip(missing, raw):
+            if blob:
+                vec = np.frombuffer(blob, dtype=np.float32)
+                local.set(keys[i], vec)
+                result[i] = vec
+            else:
+                still_missing.append(i)
+        missing = still_missing
+    if missing:
+        unique = list(dict.fromkeys(texts[i] for i in missing))
+        vectors = await asyncio.get_running_loop().run_in_executor(
+            None, _encode, unique
+        )
+        computed = dict(zip(unique, vectors))
+        for i in missing:
+            result[i] = computed[texts[i]]
+        for text, vec in computed.items():
+            local.set(_cache_key(text), vec)
+        if rds is not None:
+            try:
+                pipe = rds.pipeline(transaction=False)
+                for text, vec in computed.items():
+                    pipe.set(
+                        _cache_key(text), vec.tobytes(), ex=settings.embed_cache_ttl
+                    )
+                await pipe.execute()
+            except Exception:
+                logger.exception("Embedding cache write failed")
+    return result
+
+async def aembed(rds, text: str) -> np.ndarray:
+    """Embed a single ``text`` through the two-tier cache."""
+    logger.debug("Embedding text of length %d", len(text))
+    return (await aembed_many(rds, [text]))[0]
+
+def _read_dimension(path: str) -> int | None:
+    try:
+        with open(path) as fh:
+            dim = json.load(fh).get(settings.hf_embed_model)
+    except (OSError, ValueError, AttributeError):
+        return None
+    return int(dim) if dim else None
 
+def _write_dimension(path: str, dim: int) -> None:
+    try:
+        try:
+            with open(path) as fh:
+                meta = json.load(fh)
+        except (OSError, ValueError):
+            meta = {}
+        meta[settings.hf_embed_model] = dim
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as fh:
+            json.dump(meta, fh)
+    except OSError:
+        logger.warning("Could not write embedding metadata to %s", path)
+
+@lru_cache
 def embedding_dimension() -> int:
-    return get_model().get_sentence_embedding_dimension()
+    """Return the vector size of the embedding model.
+
+    ``EMBED_DIMENSION`` wins when set; otherwise the size recorded in
+    ``EMBED_META_PATH`` for the configured model is used. The model is loaded
+    only when neither is available, and its size is recorded for next time.
+    """
+    if settings.embed_dimension:
+        return settings.embed_dimension
+    dim = _read_dimension(settings.embed_meta_path)
+    if dim is None:
+        dim = get_model().get_sentence_embedding_dimension()
+        _write_dimension(settings.embed_meta_path, dim)
+    return dim
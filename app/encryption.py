@@ -1,3 +1,5 @@
+import base64
+import os
 from typing import Optional
 from cryptography.fernet import Fernet, InvalidToken
 from app.config import get_settings
@@ -8,18 +10,43 @@ logger = logging.getLogger(__name__)
 settings = get_settings()
 
 _KEY: Optional[Fernet] = None
+_AEADS: Optional[dict] = None
+# AES-GCM nonce size recommended by NIST SP 800-38D
+NONCE_SIZE = 12
+# sealed data starts with the ID of the key it was encrypted with
+KEY_ID_SIZE = 4
+
+
+def _keys() -> list[str]:
+    """``ENCRYPTION_KEY`` followed by the previous keys still accepted."""
+    if settings.encryption_key is None:
+        return []
+    old = settings.encryption_old_keys or ""
+    return [settings.encryption_key] + [k.strip() for k in old.split(",") if k.strip()]
+
 
 def _fernet() -> Optional[Fernet]:
+    """Fernet for ``ENCRYPTION_KEY``; a MultiFernet when old keys are set.
+
+    MultiFernet encrypts with the first key and decrypts with any of them.
+    """
     global _KEY
-    if settings.encryption_key is None:
+    keys = _keys()
+    if not keys:
         return None
     if _KEY is None:
         logger.debug("Initializing Fernet")
         try:
-            _KEY = Fernet(settings.encryption_key.encode())
+            fernets = [Fernet(key.encode()) for key in keys]
         except (ValueError, TypeError) as exc:
             logger.error("Invalid encryption key: %s", exc)
             return None
+        if len(fernets) == 1:
+            _KEY = fernets[0]
+        else:
+            from cryptography.fernet import MultiFernet
+
+            _KEY = MultiFernet(fernets)
     return _KEY
 
 def encrypt_text(text: str) -> str:
@@ -39,3 +66,83 @@ def decrypt_text(token: str) -> str:
     except InvalidToken:
         logger.warning("Invalid encryption token")
         return token
+
+def _aeads() -> Optional[dict]:
+    """AES-256-GCM ciphers keyed by HKDF from every configured key, by key ID.
+
+    The binary history envelope uses them instead of Fernet: the ciphertext
+    is stored as raw bytes and authenticated together with the header. The
+    first entry belongs to ``ENCRYPTION_KEY`` and is used for encryption.
+    """
+    global _AEADS
+    keys = _keys()
+    if not keys:
+        return None
+    if _AEADS is None:
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+        from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+        aeads = {}
+        for key in keys:
+            try:
+                material = base64.urlsafe_b64decode(key.encode())
+            except (ValueError, TypeError) as exc:
+                logger.error("Invalid encryption key: %s", exc)
+                return None
+            # a separate key so the Fernet key is never used by two algorithms
+            derived = HKDF(
+                algorithm=hashes.SHA256(), length=32, salt=None, info=b"history-aead-v1"
+            ).derive(material)
+            key_id = HKDF(
+                algorithm=hashes.SHA256(),
+                length=KEY_ID_SIZE,
+                salt=None,
+                info=b"history-aead-key-id-v1",
+            ).derive(material)
+            aeads.setdefault(key_id, AESGCM(derived))
+        _AEADS = aeads
+    return _AEADS
+
+
+def current_key_id() -> Optional[bytes]:
+    """ID of the key new data is sealed with; ``None`` without a key."""
+    aeads = _aeads()
+    return next(iter(aeads)) if aeads else None
+
+
+def seal(data: bytes, aad: bytes) -> Optional[bytes]:
+    """Encrypt ``data`` as ``key ID + nonce + ciphertext``; ``None`` without a key."""
+    aeads = _aeads()
+    if not aeads:
+        return None
+    key_id, aead = next(iter(aeads.items()))
+    nonce = os.urandom(NONCE_SIZE)
+    return key_id + nonce + aead.encrypt(nonce, data, aad)
+
+
+def unseal(blob: bytes, aad: bytes, keyed: bool = True) -> bytes:
+    """Decrypt the output of :func:`seal`.
+
+    ``keyed=False`` reads data sealed before key IDs were stored: every
+    configured key is tried. Unlike :func:`decrypt_text` this raises
+    ``ValueError`` when no key is configured, the key is unknown or the
+    data does not authenticate.
+    """
+    aeads = _aeads()
+    if not aeads:
+        raise ValueError("ENCRYPTION_KEY is required to read encrypted messages")
+    if keyed:
+        aead = aeads.get(blob[:KEY_ID_SIZE])
+        if aead is None:
+            raise ValueError("message is encrypted with an unknown key")
+        candidates = [aead]
+        blob = blob[KEY_ID_SIZE:]
+    else:
+        candidates = list(aeads.values())
+    for aead in candidates:
+        try:
+            return aead.decrypt(blob[:NONCE_SIZE], blob[NONCE_SIZE:], aad)
+        except Exception:
+            continue
+    raise ValueError("message does not authenticate")
@@ -0,0 +1,177 @@
+"""Binary format of history stream entries.
+
+An entry is stored as raw bytes::
+
+    version (1 byte) | flags (1 byte) | body
+
+where ``body`` is ``key ID + nonce + AES-GCM(inner)`` when ``FLAG_ENCRYPTED``
+is set (the two header bytes are authenticated with it; entries without
+``FLAG_KEYED`` predate key IDs and have no key ID) and ``inner`` otherwise.
+With ``FLAG_FIELDS`` (``ENCRYPTION_MODE=fields``) the routing metadata
+(``ROUTING_FIELDS``) precedes the body in the clear and is authenticated
+together with the header, so it can be read without the key::
+
+    version | flags | length (4 bytes) | routing metadata | body
+
+``inner`` is::
+
+    metadata length (4 bytes, big endian) | metadata | content
+
+``metadata`` is the message without its content as compact JSON and
+``content`` the UTF-8 text, compressed with the codec named in
+``extra["compress_algo"]`` when ``extra["compressed"]`` is set. Neither is
+base64-encoded, unlike the legacy format (``encrypt_text`` of the message
+JSON with base64 compressed content), which is still read. The version byte
+can never start a legacy entry (a Fernet token or a JSON document).
+"""
+
+import json
+import struct
+
+from app.compression import MissingDictionary, get_codec
+from app.encryption import KEY_ID_SIZE, seal, unseal
+from app.models import Message
+
+VERSION = 1
+FLAG_ENCRYPTED = 0x01
+FLAG_CONTENT = 0x02
+FLAG_FIELDS = 0x04
+# the sealed body starts with the key ID (always set on new entries)
+FLAG_KEYED = 0x08
+
+# message fields kept readable by ENCRYPTION_MODE=fields; only the content
+# and ``extra`` are encrypted
+ROUTING_FIELDS = ("role", "type", "ts", "importance")
+
+_HEADER = struct.Struct(">BB")
+_LENGTH = struct.Struct(">I")
+
+
+def is_envelope(data: bytes | str) -> bool:
+    """Whether ``data`` is a binary entry rather than a legacy one.
+
+    Also accepts a ``str`` for entries that went through a client decoding
+    replies as UTF-8.
+    """
+    if isinstance(data, str):
+        return data[:1] == chr(VERSION)
+    return data[:1] == bytes((VERSION,))
+
+
+def _codec_args(msg: Message) -> tuple[str, int | None] | None:
+    extra = msg.extra or {}
+    if not extra.get("compressed"):
+        return None
+    return extra.get("compress_algo") or "gzip", extra.get("compress_dict")
+
+
+def pack_message(msg: Message, fields: bool = False) -> bytes:
+    """Serialize ``msg`` into a binary entry, encrypted when a key is set.
+
+    With ``fields`` the routing metadata stays in the clear.
+    """
+    flags = 0
+    content = b""
+    if msg.content is not None:
+        flags |= FLAG_CONTENT
+        content = msg.content.encode()
+        codec = _codec_args(msg)
+        if codec:
+            content = get_codec(codec[0]).compress(content, codec[1])
+    clear = b""
+    exclude = {"content"}
+    if fields:
+        flags |= FLAG_FIELDS
+        routing = msg.model_dump_json(include=set(ROUTING_FIELDS)).encode()
+        clear = _LENGTH.pack(len(routing)) + routing
+        exclude.update(ROUTING_FIELDS)
+    meta = msg.model_dump_json(exclude=exclude).encode()
+    inner = _LENGTH.pack(len(meta)) + meta + content
+    aad = _HEADER.pack(VERSION, flags | FLAG_ENCRYPTED | FLAG_KEYED) + clear
+    sealed = seal(inner, aad)
+    if sealed is None:
+        return _HEADER.pack(VERSION, flags) + clear + inner
+    return aad + sealed
+
+
+def _split(data: bytes) -> tuple[int, dict | None, int]:
+    """Return the flags, the clear routing metadata and the body offset."""
+    try:
+        version, flags = _HEADER.unpack_from(data)
+        if version != VERSION:
+            raise ValueError(f"unknown history entry version {version}")
+        if not flags & FLAG_FIELDS:
+            return flags, None, _HEADER.size
+        (size,) = _LENGTH.unpack_from(data, _HEADER.size)
+    except struct.error as exc:
+        raise ValueError(f"truncated history entry: {exc}") from exc
+    start = _HEADER.size + _LENGTH.size
+    return flags, json.loads(data[start : start + size]), start + size
+
+
+def peek_fields(data: bytes) -> dict | None:
+    """Routing metadata of an entry written with ``fields``, without decrypting.
+
+    Returns ``None`` for entries that keep all metadata encrypted.
+    """
+    return _split(data)[1]
+
+
+def key_id(data: bytes) -> bytes | None:
+    """ID of the key an entry is encrypted with.
+
+    ``None`` for unencrypted entries and for entries sealed before key IDs
+    were stored.
+    """
+    flags, _routing, offset = _split(data)
+    if flags & FLAG_ENCRYPTED and flags & FLAG_KEYED:
+        return bytes(data[offset : offset + KEY_ID_SIZE])
+    return None
+
+
+def unpack_message(data: bytes) -> Message:
+    """Inverse of :func:`pack_message`.
+
+    Raises ``ValueError`` for an unknown version, truncated or corrupt data
+    and data that does not authenticate, and ``MissingDictionary`` when the
+    content needs a zstd dictionary that is not loaded yet.
+    """
+    flags, routing, offset = _split(data)
+    body = memoryview(data)[offset:]
+    if flags & FLAG_ENCRYPTED:
+        keyed = bool(flags & FLAG_KEYED)
+        body = memoryview(unseal(bytes(body), bytes(data[:offset]), keyed))
+    try:
+        (size,) = _LENGTH.unpack_from(body)
+    except struct.error as exc:
+        raise ValueError(f"truncated history entry: {exc}") from exc
+    start = _LENGTH.size
+    meta = json.loads(bytes(body[start : start + size]))
+    if routing:
+        meta.update(routing)
+    msg = Message.model_validate(meta)
+    if flags & FLAG_CONTENT:
+        content = bytes(body[start + size :])
+        codec = _codec_args(msg)
+        if codec:
+            try:
+                content = get_codec(codec[0]).decompress(content, codec[1])
+            except MissingDictionary:
+                raise
+            except Exception as exc:
+                # zlib.error, OSError/EOFError (gzip), ZstdError, lz4's
+                # RuntimeError: the codecs share no base class
+                raise ValueError(f"corrupt compressed content: {exc}") from exc
+        msg.content = content.decode()
+    return msg
+
+
+__all__ = [
+    "ROUTING_FIELDS",
+    "VERSION",
+    "is_envelope",
+    "key_id",
+    "pack_message",
+    "peek_fields",
+    "unpack_message",
+]
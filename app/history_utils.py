@@ -1,21 +1,24 @@
 import base64
-import gzip
 import json
 import logging
 import re
+from collections import Counter
 
 from fastapi import HTTPException
 
+from app.compression import MissingDictionary, get_codec, load_dictionary
 from app.config import get_settings
-from app.encryption import encrypt_text
+from app.encryption import current_key_id, decrypt_text
+from app.envelope import is_envelope, key_id, pack_message, unpack_message
 from app.models import Message
+from app.services.calendar_feed import queue_calendar_feed
+from app.usage import queue_usage
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
 
-async def _get_tags(rds, uuid: str, mid: str) -> list[str] | None:
-    raw = await rds.hget(f"user:{uuid}:msg_tags", mid)
+def _parse_tags(raw) -> list[str] | None:
     if raw:
         if isinstance(raw, bytes):
             raw = raw.decode()
@@ -26,19 +29,211 @@ async def _get_tags(rds, uuid: str, mid: str) -> list[str] | None:
     return None
 
 
-def _compress_text(text: str) -> str:
-    data = text.encode()
-    if settings.compression_algorithm == "gzip":
-        data = gzip.compress(data)
-    return base64.b64encode(data).decode()
+async def _get_tags(rds, uuid: str, mid: str) -> list[str] | None:
+    raw = await rds.hget(f"user:{uuid}:msg_tags", mid)
+    return _parse_tags(raw)
+
+
+def _compress_text(
+    text: str, algo: str | None = None, dict_id: int | None = None
+) -> str:
+    codec = get_codec(algo or settings.compression_algorithm)
+    return base64.b64encode(codec.compress(text.encode(), dict_id)).decode()
+
+
+def _decompress_text(
+    data_b64: str, algo: str | None = None, dict_id: int | None = None
+) -> str:
+    codec = get_codec(algo or settings.compression_algorithm)
+    return codec.decompress(base64.b64decode(data_b64), dict_id).decode()
+
+
+def encode_message(msg: Message) -> bytes:
+    """Serialize ``msg`` into the binary entry stored in the stream.
+
+    ``msg.content`` is plain text; it is compressed on the way out when
+    ``extra["compressed"]`` is set (see :mod:`app.envelope`). With
+    ``ENCRYPTION_MODE=fields`` the routing metadata is left unencrypted.
+    """
+    return pack_message(msg, settings.encryption_mode == "fields")
+
+
+def stream_fields(msg: Message, data: bytes) -> dict:
+    """Fields of the stream entry holding ``msg`` encoded as ``data``.
+
+    With ``ENCRYPTION_MODE=fields`` the routing metadata is also stored as
+    plain fields next to ``data`` so it can be read (e.g. by ``XRANGE`` in a
+    script) without decrypting anything.
+    """
+    if settings.encryption_mode != "fields":
+        return {"data": data}
+    return {
+        "role": msg.role,
+        "type": msg.type,
+        "ts": msg.ts.isoformat(),
+        "importance": msg.importance,
+        "data": data,
+    }
+
+
+def _decode_data(data: str | bytes) -> Message:
+    """Decode a stored payload into a message with plain text content.
+
+    Binary entries are unpacked; legacy ones are decrypted with Fernet and
+    their base64 content decompressed.
+    """
+    if is_envelope(data):
+        return unpack_message(data.encode() if isinstance(data, str) else data)
+    if isinstance(data, bytes):
+        data = data.decode()
+    msg = Message.model_validate_json(decrypt_text(data))
+    if msg.extra and msg.extra.get("compressed") and msg.content:
+        msg.content = _decompress_text(
+            msg.content, msg.extra.get("compress_algo"), msg.extra.get("compress_dict")
+        )
+    return msg
+
+
+def needs_rewrap(data: str | bytes) -> bool:
+    """Whether a stored payload is not encrypted with the current key.
+
+    True for legacy entries, entries sealed with an old key or before key
+    IDs were stored, and unencrypted entries once a key is configured.
+    """
+    if not is_envelope(data):
+        return True
+    if isinstance(data, str):
+        data = data.encode()
+    try:
+        return key_id(data) != current_key_id()
+    except ValueError:
+        # corrupt; decoding skips it
+        return True
+
+
+def _decode_message(fields: dict) -> Message:
+    """Decrypt a stream entry and decompress its content if needed."""
+    return _decode_data(fields[b"data"])
 
 
-def _decompress_text(data_b64: str, algo: str | None = None) -> str:
-    raw = base64.b64decode(data_b64)
-    algorithm = algo or settings.compression_algorithm
-    if algorithm == "gzip":
-        raw = gzip.decompress(raw)
-    return raw.decode()
+async def decode_payload(rds, data: str | bytes) -> Message:
+    """Like :func:`_decode_data`, loading a missing zstd dictionary from Redis."""
+    try:
+        return _decode_data(data)
+    except MissingDictionary as exc:
+        if not await load_dictionary(rds, exc.dict_id):
+            raise
+        return _decode_data(data)
+
+
+async def decode_payloads(rds, payloads: list) -> list[Message | None]:
+    """Decode a batch of stored payloads in one pass.
+
+    Every missing zstd dictionary is loaded from Redis once for the whole
+    batch. Payloads that cannot be decoded (wrong key, tampered or corrupt
+    data) are logged and returned as ``None`` instead of failing the read.
+    """
+    out: list[Message | None] = [None] * len(payloads)
+    pending = range(len(payloads))
+    while pending:
+        missing: dict[int, list[int]] = {}
+        for i in pending:
+            try:
+                out[i] = _decode_data(payloads[i])
+            except MissingDictionary as exc:
+                missing.setdefault(exc.dict_id, []).append(i)
+            except ValueError as exc:
+                logger.warning("Skipping undecodable message: %s", exc)
+        pending = [
+            i
+            for dict_id, waiting in missing.items()
+            if await load_dictionary(rds, dict_id)
+            for i in waiting
+        ]
+    return out
+
+
+async def decode_entries(
+    rds, uuid: str, entries: list
+) -> list[tuple[str, Message]]:
+    """Decode ``(id, fields)`` stream rows and attach their tags.
+
+    Tags for all rows are fetched with a single ``HMGET``; rows that cannot
+    be decoded are skipped.
+    """
+
+    if not entries:
+        return []
+    ids = [mid.decode() if isinstance(mid, bytes) else mid for mid, _obj in entries]
+    raw_tags = await rds.hmget(f"user:{uuid}:msg_tags", ids)
+    msgs = await decode_payloads(rds, [obj[b"data"] for _id, obj in entries])
+    out = []
+    for mid, msg, raw in zip(ids, msgs, raw_tags):
+        if msg is None:
+            continue
+        msg.tags = _parse_tags(raw)
+        out.append((mid, msg))
+    return out
+
+
+async def hydrate_messages(
+    rds, uuid: str, ids: list, chat_id: str | None = None
+) -> list[tuple[str, Message]]:
+    """Load messages by stream ID together with their tags.
+
+    All entries and the tags hash are fetched in one pipelined round trip,
+    then decoded in a single pass. IDs missing from the stream or that
+    cannot be decoded are skipped; the order of ``ids`` is preserved.
+    """
+
+    ids = [mid.decode() if isinstance(mid, bytes) else mid for mid in ids]
+    if not ids:
+        return []
+    skey = stream_key(uuid, chat_id)
+    pipe = rds.pipeline(transaction=False)
+    for mid in ids:
+        pipe.xrange(skey, min=mid, max=mid)
+    pipe.hmget(f"user:{uuid}:msg_tags", ids)
+    *rows, raw_tags = await pipe.execute()
+    found = [(mid, row, raw) for mid, row, raw in zip(ids, rows, raw_tags) if row]
+    msgs = await decode_payloads(rds, [row[0][1][b"data"] for _mid, row, _raw in found])
+    out = []
+    for (mid, _row, raw), msg in zip(found, msgs):
+        if msg is None:
+            continue
+        msg.tags = _parse_tags(raw)
+        out.append((mid, msg))
+    return out
+
+
+async def decode_vector_hits(
+    rds, uuid: str, hits: list[dict], chat_id: str | None = None
+) -> list[tuple[str, Message]]:
+    """Decode search hits that carry their payload inline.
+
+    Hits stored for another stream than ``stream_key(uuid, chat_id)`` are
+    skipped. Hits without a payload (vectors written before the inline mode
+    was enabled) are loaded from the stream with :func:`hydrate_messages`.
+    The order of ``hits`` is preserved.
+    """
+
+    skey = stream_key(uuid, chat_id)
+    decoded: dict[str, Message] = {}
+    missing = [hit["message_id"] for hit in hits if not hit.get("blob")]
+    inline = [hit for hit in hits if hit.get("blob") and hit.get("stream") == skey]
+    msgs = await decode_payloads(rds, [hit["blob"] for hit in inline])
+    for hit, msg in zip(inline, msgs):
+        if msg is None:
+            continue
+        msg.tags = hit["tags"].split(",") if hit.get("tags") else None
+        decoded[hit["message_id"]] = msg
+    if missing:
+        decoded.update(await hydrate_messages(rds, uuid, missing, chat_id))
+    return [
+        (hit["message_id"], decoded[hit["message_id"]])
+        for hit in hits
+        if hit["message_id"] in decoded
+    ]
 
 
 def _count_tokens(text: str | None) -> int:
@@ -71,14 +266,96 @@ async def _add_to_stream(
     types. On failure a HTTP 500 error is raised.
     """
 
-    data = encrypt_text(msg.model_dump_json())
+    ids, _length = await _add_messages_to_stream(rds, uuid, [msg], chat_id)
+    return ids[0]
+
+
+def _queue_messages(
+    pipe,
+    uuid: str,
+    msgs: list[Message],
+    chat_id: str | None = None,
+    company: str | None = None,
+    tokens: int = 0,
+    last_seen: int | None = None,
+    payloads: list[bytes] | None = None,
+    ids: list[str] | None = None,
+    calendar_feed: bool = True,
+) -> None:
+    """Queue the commands of :func:`_add_messages_to_stream` on ``pipe``.
+
+    The ``XADD`` replies follow the ``last_seen`` ``SET`` when one is given;
+    the last reply is the stream length.
+    """
+    skey = stream_key(uuid, chat_id)
+    if payloads is None:
+        payloads = [encode_message(msg) for msg in msgs]
+    roles = Counter(msg.role for msg in msgs)
+    types = Counter(msg.type for msg in msgs)
+    if last_seen is not None:
+        pipe.set(f"user:{uuid}:last_seen", last_seen)
+    for i, (msg, data) in enumerate(zip(msgs, payloads)):
+        pipe.xadd(skey, stream_fields(msg, data), id=ids[i] if ids else "*")
+    if calendar_feed:
+        # calendar events belong to the user, whichever stream the message is in
+        queue_calendar_feed(pipe, uuid, msgs, payloads)
+    for role, count in roles.items():
+        pipe.hincrby(f"user:{uuid}:stats:role", role, count)
+    for typ, count in types.items():
+        pipe.hincrby(f"user:{uuid}:stats:type", typ, count)
+    if company:
+        queue_usage(pipe, company, len(msgs), tokens, uuid)
+        if last_seen is not None:
+            # scanned by the idle-user task
+            pipe.zadd(f"company:{company}:last_seen", {uuid: last_seen})
+    pipe.xlen(skey)
+
+
+async def _add_messages_to_stream(
+    rds,
+    uuid: str,
+    msgs: list[Message],
+    chat_id: str | None = None,
+    company: str | None = None,
+    tokens: int = 0,
+    last_seen: int | None = None,
+    payloads: list[bytes] | None = None,
+    ids: list[str] | None = None,
+    calendar_feed: bool = True,
+) -> tuple[list[str], int]:
+    """Append ``msgs`` to the stream using a single MULTI/EXEC round trip.
+
+    Besides the ``XADD`` for every message the transaction carries the role
+    and type statistics, the ``last_seen`` marker, the calendar feed entries
+    and, when ``company`` is given, the usage counters and the company's
+    ``last_seen`` sorted set. ``payloads`` may hold the already encoded
+    messages (see :func:`encode_message`) and ``ids`` explicit stream IDs;
+    ``calendar_feed=False`` keeps the messages off the calendar feed. Returns
+    the new stream IDs and the resulting stream length. On failure a HTTP 500
+    error is raised.
+    """
+
     try:
-        skey = stream_key(uuid, chat_id)
-        mid = await rds.xadd(skey, {"data": data})
-        await rds.sadd("calendar:streams", skey)
-        await rds.hincrby(f"user:{uuid}:stats:role", msg.role, 1)
-        await rds.hincrby(f"user:{uuid}:stats:type", msg.type, 1)
-        return mid
+        pipe = rds.pipeline(transaction=True)
+        _queue_messages(
+            pipe,
+            uuid,
+            msgs,
+            chat_id,
+            company=company,
+            tokens=tokens,
+            last_seen=last_seen,
+            payloads=payloads,
+            ids=ids,
+            calendar_feed=calendar_feed,
+        )
+        results = await pipe.execute()
     except Exception as exc:
         logger.exception("Failed to store message for %s", uuid)
         raise HTTPException(status_code=500, detail="storage error") from exc
+    start = 0 if last_seen is None else 1
+    ids = [
+        mid.decode() if isinstance(mid, bytes) else mid
+        for mid in results[start : start + len(msgs)]
+    ]
+    return ids, int(results[-1])
@@ -1,3 +1,4 @@
+import asyncio
 import json
 import logging
 import os
@@ -6,12 +7,12 @@ from datetime import datetime
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from redis import asyncio as redis
 
 from app.company_auth import router as company_auth_router
 from app.config import get_settings
 from app.history_utils import _add_to_stream, stream_key
 from app.models import Message
+from app.redis_pool import close_pool, get_client
 from app.services.llm import llm
 
 logger = logging.getLogger(__name__)
@@ -34,13 +35,31 @@ except Exception:
 @app.on_event("startup")
 async def startup():
     logger.info("Starting up application")
-    app.state.redis = redis.from_url(str(settings.redis_url), decode_responses=False)
+    app.state.redis = get_client()
+    from app.services.embedding_batcher import get_batcher
+
+    get_batcher().rds = app.state.redis
+    from app.token_cache import listen_for_invalidations
+
+    app.state.token_listener = asyncio.create_task(
+        listen_for_invalidations(app.state.redis)
+    )
+    from app.services.company import listen_for_company_changes
+
+    app.state.company_listener = asyncio.create_task(
+        listen_for_company_changes(app.state.redis)
+    )
 
 
 @app.on_event("shutdown")
 async def shutdown():
+    from app.services.embedding_batcher import get_batcher
+
     logger.info("Shutting down application")
-    await app.state.redis.close()
+    app.state.token_listener.cancel()
+    app.state.company_listener.cancel()
+    await get_batcher().stop()
+    await close_pool()
 
 
 from app.routes.admin import router as admin_router
@@ -50,6 +69,7 @@ from app.routes.facts import router as facts_router
 from app.routes.filtering import router as filtering_router
 from app.routes.history import router as history_router
 from app.routes.messages import router as messages_router
+from app.routes.metrics import router as metrics_router
 
 app.include_router(company_auth_router)
 app.include_router(auth_router)
@@ -59,3 +79,4 @@ app.include_router(messages_router)
 app.include_router(calendar_router)
 app.include_router(facts_router)
 app.include_router(filtering_router)
+app.include_router(metrics_router)
@@ -108,6 +108,7 @@ class CompanyFlagsResponse(BaseModel):
 
 
 class CalendarEvent(BaseModel):
+    id: str | None = None
     when: datetime
     text: str
     chat_id: str | None = None
@@ -117,6 +118,7 @@ class CalendarEvent(BaseModel):
 class CalendarResponse(BaseModel):
     uuid: str
     events: list[CalendarEvent]
+    next_cursor: str | None = None
 
 
 class CalendarUpdateRequest(BaseModel):
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import logging
+
+from redis import asyncio as redis
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+_pool: redis.BlockingConnectionPool | None = None
+
+
+def get_pool() -> redis.BlockingConnectionPool:
+    """Return the connection pool shared by the whole API process.
+
+    The pool is created on first use. When all ``REDIS_MAX_CONNECTIONS``
+    connections are busy a command waits up to ``REDIS_POOL_TIMEOUT`` seconds
+    for one to be released instead of opening a new socket.
+    """
+    global _pool
+    if _pool is None:
+        logger.info(
+            "Creating redis pool with %d connections", settings.redis_max_connections
+        )
+        _pool = redis.BlockingConnectionPool.from_url(
+            str(settings.redis_url),
+            decode_responses=False,
+            max_connections=settings.redis_max_connections,
+            timeout=settings.redis_pool_timeout,
+            socket_timeout=settings.redis_socket_timeout,
+            socket_connect_timeout=settings.redis_connect_timeout,
+            socket_keepalive=settings.redis_socket_keepalive,
+            health_check_interval=settings.redis_health_check_interval,
+        )
+    return _pool
+
+
+def get_client() -> redis.Redis:
+    """Return a client that borrows connections from the shared pool."""
+    return redis.Redis(connection_pool=get_pool())
+
+
+async def close_pool() -> None:
+    global _pool
+    if _pool is not None:
+        await _pool.disconnect()
+        _pool = None
+
+
+def pool_stats() -> dict:
+    """Return the utilization of the shared pool."""
+    if _pool is None:
+        return {
+            "max_connections": settings.redis_max_connections,
+            "in_use": 0,
+            "idle": 0,
+            "utilization": 0.0,
+        }
+    in_use = len(_pool._in_use_connections)
+    idle = len(_pool._available_connections)
+    return {
+        "max_connections": _pool.max_connections,
+        "in_use": in_use,
+        "idle": idle,
+        "utilization": in_use / _pool.max_connections,
+    }
+
+
+__all__ = ["close_pool", "get_client", "get_pool", "pool_stats"]
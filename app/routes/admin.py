@@ -213,7 +213,9 @@ async def admin_history(
 
 
 @router.get("/admin/calendar", response_class=HTMLResponse)
-async def admin_calendar(request: Request, uuid: str, token: str):
+async def admin_calendar(
+    request: Request, uuid: str, token: str, limit: int = 100, cursor: str | None = None
+):
     from app.main import templates
     from app.routes.calendar import get_calendar
     from app.services.company import _ensure_company
@@ -224,12 +226,22 @@ async def admin_calendar(request: Request, uuid: str, token: str):
     if user != uuid:
         raise HTTPException(status_code=403, detail="forbidden")
     await _ensure_company(user, company)
-    resp = await get_calendar(uuid=uuid, user=(user, company))
+    resp = await get_calendar(
+        uuid=uuid,
+        start=None,
+        end=None,
+        limit=limit,
+        cursor=cursor,
+        user=(user, company),
+    )
     return templates.TemplateResponse(
         "calendar.html",
         {
             "request": request,
             "events": resp["events"],
+            "next_cursor": resp["next_cursor"],
+            "token": token,
+            "limit": limit,
             "uuid": uuid,
             "title": "Calendar",
         },
@@ -364,6 +376,8 @@ async def company_summary(
 async def company_calendar(
     request: Request,
     uuid: str,
+    limit: int = 100,
+    cursor: str | None = None,
     company: str = Depends(get_current_company),
 ):
     from app.main import templates
@@ -373,12 +387,21 @@ async def company_calendar(
     if not templates:
         raise HTTPException(status_code=500, detail="templates not available")
     await _ensure_company(uuid, company)
-    resp = await get_calendar(uuid=uuid, user=(uuid, company))
+    resp = await get_calendar(
+        uuid=uuid,
+        start=None,
+        end=None,
+        limit=limit,
+        cursor=cursor,
+        user=(uuid, company),
+    )
     return templates.TemplateResponse(
         "user_calendar.html",
         {
             "request": request,
             "events": resp["events"],
+            "next_cursor": resp["next_cursor"],
+            "limit": limit,
             "uuid": uuid,
             "title": "Calendar",
         },
@@ -1,7 +1,6 @@
 import json
 import logging
 from datetime import datetime
-from zoneinfo import ZoneInfo
 
 from fastapi import APIRouter, Depends, HTTPException, Query
 
@@ -19,12 +18,14 @@ from app.services.calendar import (
     _add_event,
     _delete_event,
     _list_events,
+    _page_events,
+    _store_event,
     _to_utc,
     _update_event,
+    _zone,
 )
 from app.services.company import _ensure_company
 from app.services.llm import llm
-from worker.tasks import send_notification
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -33,25 +34,44 @@ logger = logging.getLogger(__name__)
 @router.get("/calendar", response_model=CalendarResponse)
 async def get_calendar(
     uuid: str = Query(...),
+    start: datetime | None = Query(None, alias="from"),
+    end: datetime | None = Query(None, alias="to"),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: str | None = Query(None),
     user: tuple[str, str] = Depends(get_current_user),
 ):
+    """List up to ``limit`` events between ``from`` and ``to``, oldest first.
+
+    Naive bounds are read as UTC. Pass the returned ``next_cursor`` as
+    ``cursor`` with the same ``to`` to get the following page.
+    """
     uid, company = user
     if uuid != uid:
         raise HTTPException(status_code=403, detail="forbidden")
     await _ensure_company(uid, company)
     rds = app.state.redis
-    rows = await rds.zrange(f"user:{uuid}:calendar", 0, -1, withscores=True)
-    events = []
-    for raw, ts in rows:
-        data = json.loads(raw.decode() if isinstance(raw, bytes) else raw)
-        tz = data.get("tz", "UTC")
-        when = datetime.fromtimestamp(ts, tz=ZoneInfo("UTC")).astimezone(ZoneInfo(tz))
-        events.append(
-            CalendarEvent(
-                when=when, text=data["text"], chat_id=data.get("chat_id"), tz=tz
-            )
+    try:
+        rows, next_cursor = await _page_events(
+            rds,
+            uuid,
+            _to_utc(start, "UTC").timestamp() if start else "-inf",
+            _to_utc(end, "UTC").timestamp() if end else "+inf",
+            limit,
+            cursor,
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="invalid cursor")
+    events = [
+        CalendarEvent(
+            id=row["id"],
+            when=datetime.fromtimestamp(row["ts"], tz=_zone(row["tz"])),
+            text=row["text"],
+            chat_id=row["chat_id"],
+            tz=row["tz"],
         )
-    return {"uuid": uuid, "events": events}
+        for row in rows
+    ]
+    return {"uuid": uuid, "events": events, "next_cursor": next_cursor}
 
 
 @router.post("/reminder")
@@ -67,18 +87,13 @@ async def set_reminder(
         raise HTTPException(status_code=403, detail="forbidden")
     await _ensure_company(uid, company)
     rds = app.state.redis
-    when_utc = _to_utc(when, tz)
-    await rds.zadd(
-        f"user:{uuid}:calendar",
-        {json.dumps({"text": text, "tz": tz}): int(when_utc.timestamp())},
-    )
-    send_notification.apply_async(args=[uuid, text], eta=when_utc)
+    await _store_event(rds, uuid, text, tz, _to_utc(when, tz))
     return {"status": "scheduled"}
 
 
-@router.put("/calendar/{index}")
+@router.put("/calendar/{event_id}")
 async def update_calendar(
-    index: int,
+    event_id: str,
     req: CalendarUpdateRequest,
     user: tuple[str, str] = Depends(get_current_user),
 ):
@@ -87,22 +102,21 @@ async def update_calendar(
         raise HTTPException(status_code=403, detail="forbidden")
     await _ensure_company(uid, company)
     rds = app.state.redis
-    rows = await rds.zrange(f"user:{req.uuid}:calendar", index, index, withscores=True)
-    if not rows:
+    result = await _update_event(
+        rds,
+        req.uuid,
+        event_id,
+        req.when.isoformat() if req.when else None,
+        req.text,
+    )
+    if result["status"] == "not_found":
         raise HTTPException(status_code=404, detail="not found")
-    raw, score = rows[0]
-    data = json.loads(raw.decode() if isinstance(raw, bytes) else raw)
-    if req.text is not None:
-        data["text"] = req.text
-    ts = int(req.when.timestamp()) if req.when else int(score)
-    await rds.zremrangebyrank(f"user:{req.uuid}:calendar", index, index)
-    await rds.zadd(f"user:{req.uuid}:calendar", {json.dumps(data): ts})
-    return {"status": "updated"}
+    return result
 
 
-@router.delete("/calendar/{index}")
+@router.delete("/calendar/{event_id}")
 async def delete_calendar(
-    index: int,
+    event_id: str,
     req: CalendarDeleteRequest,
     user: tuple[str, str] = Depends(get_current_user),
 ):
@@ -111,8 +125,10 @@ async def delete_calendar(
         raise HTTPException(status_code=403, detail="forbidden")
     await _ensure_company(uid, company)
     rds = app.state.redis
-    await rds.zremrangebyrank(f"user:{req.uuid}:calendar", index, index)
-    return {"status": "deleted"}
+    result = await _delete_event(rds, req.uuid, event_id)
+    if result["status"] == "not_found":
+        raise HTTPException(status_code=404, detail="not found")
+    return result
 
 
 @router.post("/calendar/assistant", response_model=Message)
@@ -138,8 +154,17 @@ async def calendar_assistant(
             "type": "function",
             "function": {
                 "name": "list_events",
-                "description": "Получить все события календаря пользователя",
-                "parameters": {"type": "object", "properties": {}},
+                "description": (
+                    "Получить события календаря пользователя, при необходимости "
+                    "только в интервале from–to"
+                ),
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "from": {"type": "string", "description": "ISO8601 datetime"},
+                        "to": {"type": "string", "description": "ISO8601 datetime"},
+                    },
+                },
             },
         },
         {
@@ -162,16 +187,16 @@ async def calendar_assistant(
             "type": "function",
             "function": {
                 "name": "update_event",
-                "description": "Изменить событие по индексу",
+                "description": "Изменить событие по id",
                 "parameters": {
                     "type": "object",
                     "properties": {
-                        "index": {"type": "integer"},
+                        "id": {"type": "string"},
                         "when": {"type": "string"},
                         "text": {"type": "string"},
                         "tz": {"type": "string"},
                     },
-                    "required": ["index"],
+                    "required": ["id"],
                 },
             },
         },
@@ -179,11 +204,11 @@ async def calendar_assistant(
             "type": "function",
             "function": {
                 "name": "delete_event",
-                "description": "Удалить событие по индексу",
+                "description": "Удалить событие по id",
                 "parameters": {
                     "type": "object",
-                    "properties": {"index": {"type": "integer"}},
-                    "required": ["index"],
+                    "properties": {"id": {"type": "string"}},
+                    "required": ["id"],
                 },
             },
         },
@@ -201,7 +226,9 @@ async def calendar_assistant(
             for call in msg.tool_calls:
                 args = json.loads(call.function.arguments or "{}")
                 if call.function.name == "list_events":
-                    result = await _list_events(rds, req.uuid)
+                    result = await _list_events(
+                        rds, req.uuid, args.get("from"), args.get("to"), req.tz or "UTC"
+                    )
                 elif call.function.name == "add_event":
                     result = await _add_event(
                         rds,
@@ -214,13 +241,13 @@ async def calendar_assistant(
                     result = await _update_event(
                         rds,
                         req.uuid,
-                        args.get("index"),
+                        str(args.get("id")),
                         args.get("when"),
                         args.get("text"),
                         args.get("tz"),
                     )
                 elif call.function.name == "delete_event":
-                    result = await _delete_event(rds, req.uuid, args.get("index"))
+                    result = await _delete_event(rds, req.uuid, str(args.get("id")))
                 else:
                     result = {"status": "unknown"}
                 messages.append(
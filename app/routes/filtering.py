@@ -1,4 +1,3 @@
-import asyncio
 import json
 import logging
 from typing import List, Tuple
@@ -6,15 +5,15 @@ from typing import List, Tuple
 from fastapi import APIRouter, Depends, HTTPException
 
 from app.auth import get_current_user
-from app.embeddings import embed
-from app.encryption import decrypt_text
-from app.history_utils import _count_tokens, _decompress_text, _get_tags, stream_key
+from app.embeddings import aembed
+from app.history_utils import _count_tokens, stream_key
 from app.main import app, settings
 from app.models import FilterRequest, FilterResponse, Message
 from app.services.company import _ensure_company
 from app.services.llm import llm
+from app.services.messages import search_messages
 from app.usage import increment_messages, increment_tokens
-from app.vector import semantic_search
+from app.vector import vector_key
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -47,29 +46,14 @@ async def filter_messages(
     if req.uuid != uid:
         raise HTTPException(status_code=403, detail="forbidden")
     await _ensure_company(uid, company)
-    q_vec = await asyncio.get_running_loop().run_in_executor(
-        None, lambda: embed(req.query)
+    rds = app.state.redis
+    q_vec = await aembed(rds, req.query)
+    cand: List[Tuple[str, Message]] = await search_messages(
+        rds, req.uuid, q_vec, k=req.top_k, chat_id=req.chat_id
     )
-    ids = await semantic_search(req.uuid, q_vec, k=req.top_k)
-    if not ids:
+    if not cand:
         return {"uuid": req.uuid, "kept": [], "removed": []}
 
-    rds = app.state.redis
-    cand: List[Tuple[str, Message]] = []
-    for mid in ids:
-        row = await rds.xrange(stream_key(req.uuid, req.chat_id), min=mid, max=mid)
-        if row:
-            cmsg = Message.model_validate_json(
-                decrypt_text(row[0][1][b"data"].decode())
-            )
-            if cmsg.extra and cmsg.extra.get("compressed") and cmsg.content:
-                cmsg.content = _decompress_text(
-                    cmsg.content, cmsg.extra.get("compress_algo")
-                )
-            mid_str = mid.decode() if isinstance(mid, bytes) else mid
-            cmsg.tags = await _get_tags(rds, req.uuid, mid_str)
-            cand.append((mid, cmsg))
-
     sys = {
         "role": "system",
         "content": (
@@ -112,6 +96,8 @@ async def filter_messages(
             removed.append(mid)
             if req.delete_irrelevant:
                 await rds.xdel(stream_key(req.uuid, req.chat_id), mid)
+                # an inline payload would keep serving the deleted entry
+                await rds.hdel(vector_key(req.uuid, mid), "blob", "stream")
     await increment_messages(rds, company, user_id=uid)
     await increment_tokens(rds, company, _count_tokens(req.query), uid)
 
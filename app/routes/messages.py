@@ -1,41 +1,51 @@
 import asyncio
 import base64
-import json
 import logging
+import uuid as uuid_mod
 from datetime import datetime
-from typing import Any, Dict
 
-from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, UploadFile
 
 from app.auth import get_current_user
-from app.embeddings import embed
-from app.encryption import decrypt_text
+from app.embeddings import aembed
 from app.history_utils import (
-    _add_to_stream,
-    _compress_text,
+    _add_messages_to_stream,
     _count_tokens,
-    _decompress_text,
-    _get_tags,
+    encode_message,
+    hydrate_messages,
     stream_key,
 )
 from app.main import app, settings
 from app.models import (
     AddRequest,
-    Message,
     SearchRequest,
     SearchResponse,
     SummaryResponse,
 )
-from app.services.calendar import _check_and_store_calendar_event
-from app.services.company import _company_feature_enabled, _ensure_company
+from app.services.bulk_import import (
+    ImportConflict,
+    get_progress,
+    import_messages,
+    iter_lines,
+)
+from app.services.company import (
+    _company_feature_enabled,
+    _company_features,
+    _ensure_company,
+)
 from app.services.facts import _check_and_store_fact
 from app.services.llm import llm
-from app.services.messages import _embed_and_insert
+from app.services.messages import _embed_and_insert, _mark_compressed, search_messages
+from app.services.summary import update_summary
 from app.storage import upload_file
 from app.transcriber import transcriber
 from app.usage import increment_messages, increment_tokens
-from app.vector import semantic_search
-from worker.tasks import generate_tags, summarize_if_needed, update_facts
+from worker.tasks import (
+    generate_tags,
+    index_imported,
+    summarize_if_needed,
+    update_facts,
+)
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -50,11 +60,9 @@ async def add_history(
         raise HTTPException(status_code=403, detail="forbidden")
     await _ensure_company(uid, company)
     rds = app.state.redis
-    summary_enabled = await _company_feature_enabled(company, "enable_summary")
-    facts_enabled = await _company_feature_enabled(company, "enable_facts")
-    calendar_enabled = await _company_feature_enabled(company, "enable_calendar")
-    await rds.set(f"user:{req.uuid}:last_seen", int(datetime.utcnow().timestamp()))
-    ids = []
+    summary_enabled, facts_enabled, calendar_enabled = await _company_features(
+        company, "enable_summary", "enable_facts", "enable_calendar"
+    )
     token_count = 0
     for msg in req.messages:
         if msg.extra and "file" in msg.extra:
@@ -86,32 +94,42 @@ async def add_history(
                 msg.extra["transcribed_from"] = "audio"
             else:
                 msg.content = url
-        if (
-            msg.type == "text"
-            and msg.content
-            and len(msg.content) > settings.compression_threshold
-            and msg.importance < 5
-        ):
-            msg.content = _compress_text(msg.content)
-            if msg.extra is None:
-                msg.extra = {}
-            msg.extra["compressed"] = True
-            msg.extra["compress_algo"] = settings.compression_algorithm
-        _id = await _add_to_stream(rds, req.uuid, msg, req.chat_id)
-        ids.append(_id)
+        try:
+            await _mark_compressed(rds, company, msg)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
         if msg.type == "text" and msg.content:
-            asyncio.create_task(_embed_and_insert(req.uuid, _id, msg.content))
-            if facts_enabled:
-                asyncio.create_task(_check_and_store_fact(rds, req.uuid, msg))
-            if calendar_enabled:
-                asyncio.create_task(_check_and_store_calendar_event(rds, req.uuid, msg))
             token_count += _count_tokens(msg.content)
 
-    await increment_messages(rds, company, len(req.messages), req.uuid)
-    if token_count:
-        await increment_tokens(rds, company, token_count, req.uuid)
+    # with inline payloads the vector stores the same blob as the stream entry
+    inline = settings.vector_inline_payload
+    payloads = [encode_message(msg) for msg in req.messages] if inline else None
+    skey = stream_key(req.uuid, req.chat_id) if inline else None
+    # messages, stats, usage counters and the stream length in one round trip
+    ids, length = await _add_messages_to_stream(
+        rds,
+        req.uuid,
+        req.messages,
+        req.chat_id,
+        company=company,
+        tokens=token_count,
+        last_seen=int(datetime.utcnow().timestamp()),
+        payloads=payloads,
+        # calendar commands are extracted by the worker reading the feed
+        calendar_feed=calendar_enabled,
+    )
+    for i, (_id, msg) in enumerate(zip(ids, req.messages)):
+        if msg.type == "text" and msg.content:
+            await _embed_and_insert(
+                req.uuid,
+                _id,
+                msg.content,
+                payloads[i] if inline else None,
+                skey,
+            )
+            if facts_enabled:
+                asyncio.create_task(_check_and_store_fact(rds, req.uuid, msg))
 
-    length = await rds.xlen(stream_key(req.uuid, req.chat_id))
     if length % 10 == 0:
         if summary_enabled:
             summarize_if_needed.delay(req.uuid, settings.summary_token_threshold)
@@ -121,6 +139,57 @@ async def add_history(
     return {"stream_ids": ids}
 
 
+@router.post("/bulk_import")
+async def bulk_import(
+    request: Request,
+    uuid: str = Query(...),
+    chat_id: str | None = Query(None),
+    import_id: str | None = Query(None, pattern=r"^[\w-]{1,64}$"),
+    user: tuple[str, str] = Depends(get_current_user),
+):
+    """Import messages from an NDJSON body, one message per line.
+
+    The body may be gzip-compressed. Invalid lines are skipped and reported;
+    the progress can be polled with ``GET /bulk_import/{import_id}`` while
+    the import runs and until embedding and tagging of the imported
+    messages, queued once they are stored, has finished.
+    """
+    uid, company = user
+    if uuid != uid:
+        raise HTTPException(status_code=403, detail="forbidden")
+    await _ensure_company(uid, company)
+    rds = app.state.redis
+    import_id = import_id or uuid_mod.uuid4().hex
+    existing = await get_progress(rds, import_id)
+    if existing and existing.get("uuid") != uid:
+        raise HTTPException(status_code=409, detail="import_id in use")
+    try:
+        result = await import_messages(
+            rds, uuid, company, iter_lines(request.stream()), chat_id, import_id
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    except ImportConflict as exc:
+        # the chunks before the conflict are stored; see the progress counters
+        raise HTTPException(status_code=409, detail=str(exc))
+    if result["first_id"]:
+        index_imported.delay(
+            uuid, chat_id, result["first_id"], result["last_id"], import_id
+        )
+    return result
+
+
+@router.get("/bulk_import/{import_id}")
+async def bulk_import_progress(
+    import_id: str, user: tuple[str, str] = Depends(get_current_user)
+):
+    uid, _company = user
+    progress = await get_progress(app.state.redis, import_id)
+    if not progress or progress.pop("uuid", None) != uid:
+        raise HTTPException(status_code=404, detail="import not found")
+    return {"import_id": import_id, **progress}
+
+
 @router.post("/summary", response_model=SummaryResponse)
 async def summarize(
     uuid: str = Query(...),
@@ -134,30 +203,14 @@ async def summarize(
     if not await _company_feature_enabled(company, "enable_summary"):
         raise HTTPException(status_code=403, detail="summary disabled")
     rds = app.state.redis
-    entries = await rds.xrange(stream_key(uuid, chat_id))
-    full_history = [
-        json.loads(decrypt_text(obj[b"data"].decode())) for _id, obj in entries
-    ]
-    token_count = sum(_count_tokens(m.get("content")) for m in full_history)
-    messages: list[Dict[str, Any]] = []
-    prompt = (
-        "Summarize the following user chat history so that an LLM assistant "
-        "can quickly recall the user's background, preferences, and key facts.\n\n"
-        + json.dumps(full_history, ensure_ascii=False)
-    )
-
-    messages.append({"role": "user", "content": prompt})
     logger.info("Summarizing history for %s", uuid)
     try:
-        resp = await llm.chat.completions.create(
-            model=settings.openai_chat_model, messages=messages, max_tokens=13000
-        )
-        summary = resp.choices[0].message.content.strip()
-        await rds.hset("summary", uuid, summary)
+        # only messages after the stored watermark are sent to the LLM
+        summary, token_count = await update_summary(rds, llm, uuid, chat_id)
         await increment_messages(rds, company, user_id=uuid)
         if token_count:
             await increment_tokens(rds, company, token_count, uuid)
-        return {"uuid": uuid, "summary": summary}
+        return {"uuid": uuid, "summary": summary or ""}
     except Exception as exc:
         logger.exception("summary failed for %s", uuid)
         raise HTTPException(status_code=500, detail="summary error") from exc
@@ -170,29 +223,11 @@ async def search(req: SearchRequest, user: tuple[str, str] = Depends(get_current
         raise HTTPException(status_code=403, detail="forbidden")
     await _ensure_company(uid, company)
     rds = app.state.redis
-    q_vec = await asyncio.get_running_loop().run_in_executor(
-        None, lambda: embed(req.query)
+    q_vec = await aembed(rds, req.query)
+    hits = await search_messages(
+        rds, req.uuid, q_vec, k=req.top_k, tags=req.tags, chat_id=req.chat_id
     )
-    ids = await semantic_search(req.uuid, q_vec, k=req.top_k, tags=req.tags)
-    if not ids:
-        await increment_messages(rds, company, user_id=uid)
-        await increment_tokens(rds, company, _count_tokens(req.query), uid)
-        return {"uuid": req.uuid, "hits": []}
-
-    msgs = []
-    for mid in ids:
-        data = await rds.xrange(stream_key(req.uuid, req.chat_id), min=mid, max=mid)
-        if data:
-            msg = Message.model_validate_json(
-                decrypt_text(data[0][1][b"data"].decode())
-            )
-            if msg.extra and msg.extra.get("compressed") and msg.content:
-                msg.content = _decompress_text(
-                    msg.content, msg.extra.get("compress_algo")
-                )
-            mid_str = mid.decode() if isinstance(mid, bytes) else mid
-            msg.tags = await _get_tags(rds, req.uuid, mid_str)
-            msgs.append(msg)
+    msgs = [msg for _mid, msg in hits]
     await increment_messages(rds, company, user_id=uid)
     await increment_tokens(rds, company, _count_tokens(req.query), uid)
     return {"uuid": req.uuid, "hits": msgs}
@@ -214,16 +249,5 @@ async def search_by_tag(
     ids = await rds.smembers(f"user:{uuid}:tags:{tag}")
     if not ids:
         return {"uuid": uuid, "hits": []}
-    msgs: list[Message] = []
-    for mid_b in list(ids)[:limit]:
-        mid = mid_b.decode() if isinstance(mid_b, bytes) else mid_b
-        row = await rds.xrange(stream_key(uuid, chat_id), min=mid, max=mid)
-        if row:
-            msg = Message.model_validate_json(decrypt_text(row[0][1][b"data"].decode()))
-            if msg.extra and msg.extra.get("compressed") and msg.content:
-                msg.content = _decompress_text(
-                    msg.content, msg.extra.get("compress_algo")
-                )
-            msg.tags = await _get_tags(rds, uuid, mid)
-            msgs.append(msg)
-    return {"uuid": uuid, "hits": msgs}
+    hits = await hydrate_messages(rds, uuid, list(ids)[:limit], chat_id)
+    return {"uuid": uuid, "hits": [msg for _mid, msg in hits]}
@@ -0,0 +1,31 @@
+import logging
+
+from fastapi import APIRouter, Header, HTTPException
+
+from app.auth import password_hash_stats
+from app.config import get_settings
+from app.redis_pool import get_client, pool_stats
+from app.services.company import company_cache
+from app.services.embedding_batcher import get_batcher
+from app.services.reminders import reminder_stats
+from app.token_cache import token_cache
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+async def metrics(x_admin_key: str | None = Header(None)):
+    """Return performance counters of the API worker and the reminder queue."""
+    if settings.admin_key and x_admin_key != settings.admin_key:
+        raise HTTPException(status_code=403, detail="admin key required")
+    return {
+        "embeddings": get_batcher().stats(),
+        "token_cache": token_cache().stats(),
+        "company_cache": company_cache().stats(),
+        "redis_pool": pool_stats(),
+        "password_hashing": password_hash_stats(),
+        "reminders": await reminder_stats(get_client()),
+    }
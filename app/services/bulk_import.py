@@ -0,0 +1,345 @@
+"""Bulk import of historical messages from an NDJSON stream.
+
+The request body is read chunk by chunk (gzip is detected by its magic
+bytes) and every line is validated as a :class:`~app.models.Message` on its
+own, so invalid lines are reported and skipped without failing the import
+and memory use does not depend on the size of the body. Valid messages are
+written ``BULK_IMPORT_CHUNK`` at a time in one MULTI/EXEC each and are
+appended to the stream: the stream ID is derived from the message's ``ts``
+while that is newer than the stream's last entry, otherwise it follows that
+entry, so messages older than the stored history land after it (in file
+order) rather than being merged in. Embedding and tagging are left to
+:func:`index_imported`, run by a worker once the import is written.
+
+Progress is kept in the ``import:{id}`` hash for a day; a failed import
+records why in its ``error`` field.
+"""
+
+import logging
+import zlib
+from datetime import datetime, timezone
+from typing import AsyncIterator
+
+from app.config import get_settings
+from app.history_utils import (
+    _count_tokens,
+    _queue_messages,
+    decode_payloads,
+    encode_message,
+    stream_key,
+)
+from app.models import Message
+from app.services.messages import _mark_compressed
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+PROGRESS_TTL = 86400
+# longest accepted line of the decompressed body
+MAX_LINE = 1 << 20
+# invalid lines listed in the response; all of them are counted
+MAX_ERRORS = 20
+# attempts at writing a chunk while the stream keeps changing under WATCH
+WRITE_RETRIES = 10
+_GZIP_MAGIC = b"\x1f\x8b"
+_COUNTERS = ("lines", "imported", "invalid", "indexed")
+
+
+class ImportConflict(RuntimeError):
+    """The stream kept changing and a chunk could not be written."""
+
+
+def progress_key(import_id: str) -> str:
+    return f"import:{import_id}"
+
+
+def _inflate(decomp, data: bytes):
+    """Decompress ``data`` in pieces of at most ``MAX_LINE`` bytes.
+
+    Bounding the output keeps a small, highly compressed body from
+    expanding into one huge buffer.
+    """
+    try:
+        while data:
+            yield decomp.decompress(data, MAX_LINE)
+            data = decomp.unconsumed_tail
+    except zlib.error as exc:
+        raise ValueError(f"invalid gzip data: {exc}") from exc
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[int, bytes]]:
+    """Yield ``(line number, line)`` from a plain or gzip-compressed body.
+
+    Raises ``ValueError`` for broken gzip data and lines over ``MAX_LINE``.
+    """
+    decomp = None
+    started = False
+    buf = b""
+    lineno = 0
+    async for chunk in chunks:
+        if not started and chunk:
+            started = True
+            if chunk.startswith(_GZIP_MAGIC):
+                decomp = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        for piece in _inflate(decomp, chunk) if decomp else (chunk,):
+            buf += piece
+            *lines, buf = buf.split(b"\n")
+            for line in lines:
+                lineno += 1
+                yield lineno, line
+            if len(buf) > MAX_LINE:
+                raise ValueError(f"line {lineno + 1} is too long")
+    if decomp is not None and not decomp.eof:
+        raise ValueError("invalid gzip data: truncated stream")
+    if buf.strip():
+        yield lineno + 1, buf
+
+
+def _next_id(ts: datetime, last: tuple[int, int]) -> tuple[int, int]:
+    """Stream ID for a message sent at ``ts`` following ID ``last``.
+
+    The ID is the timestamp in milliseconds; messages that are not newer
+    than ``last`` (same millisecond, out of order, or older than the stored
+    history) get the next sequence number after it instead, since stream
+    IDs must grow.
+    """
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    ms = int(ts.timestamp() * 1000)
+    if ms > last[0]:
+        return ms, 0
+    return last[0], last[1] + 1
+
+
+async def _stream_tail(rds, skey: str) -> tuple[int, int]:
+    rows = await rds.xrevrange(skey, count=1)
+    if not rows:
+        return 0, 0
+    mid = rows[0][0]
+    ms, seq = (mid.decode() if isinstance(mid, bytes) else mid).split("-")
+    return int(ms), int(seq)
+
+
+async def _write_chunk(
+    rds, uuid: str, company: str, msgs: list[Message], chat_id: str | None
+) -> list[str]:
+    """Append ``msgs`` with IDs following the stream's tail; return the IDs.
+
+    The tail is read under ``WATCH`` and the chunk is written again when the
+    stream changed before ``EXEC`` (e.g. a concurrent ``POST /add``), so an
+    explicit ID can never be rejected after the counters were applied.
+    Raises :class:`ImportConflict` after ``WRITE_RETRIES`` lost races.
+    """
+    from redis.exceptions import WatchError
+
+    skey = stream_key(uuid, chat_id)
+    payloads = [encode_message(msg) for msg in msgs]
+    tokens = sum(_count_tokens(m.content) for m in msgs if m.type == "text")
+    async with rds.pipeline(transaction=True) as pipe:
+        for _attempt in range(WRITE_RETRIES):
+            try:
+                await pipe.watch(skey)
+                last = await _stream_tail(pipe, skey)
+                ids = []
+                for msg in msgs:
+                    last = _next_id(msg.ts, last)
+                    ids.append(f"{last[0]}-{last[1]}")
+                pipe.multi()
+                # historical messages must not fire reminders
+                _queue_messages(
+                    pipe,
+                    uuid,
+                    msgs,
+                    chat_id,
+                    company=company,
+                    tokens=tokens,
+                    payloads=payloads,
+                    ids=ids,
+                    calendar_feed=False,
+                )
+                await pipe.execute()
+                return ids
+            except WatchError:
+                logger.info("%s changed during the import, retrying chunk", skey)
+    raise ImportConflict(
+        f"{skey} kept changing, gave up after {WRITE_RETRIES} attempts"
+    )
+
+
+async def import_messages(
+    rds,
+    uuid: str,
+    company: str,
+    lines: AsyncIterator[tuple[int, bytes]],
+    chat_id: str | None = None,
+    import_id: str | None = None,
+) -> dict:
+    """Validate and store the messages from ``lines``.
+
+    Returns the counters of the import, the first ``MAX_ERRORS`` invalid
+    lines and the first and last stream IDs written. With ``import_id`` the
+    counters are also stored in :func:`progress_key` after every chunk.
+    """
+    skey = stream_key(uuid, chat_id)
+    key = progress_key(import_id) if import_id else None
+    progress = {"lines": 0, "imported": 0, "invalid": 0}
+    errors: list[dict] = []
+    span: dict[str, str] = {}
+    chunk: list[Message] = []
+
+    async def save(status: str, error: str | None = None) -> None:
+        if key:
+            mapping = {"uuid": uuid, "status": status, **progress}
+            if error:
+                mapping["error"] = error
+            pipe = rds.pipeline(transaction=False)
+            pipe.hset(key, mapping=mapping)
+            pipe.expire(key, PROGRESS_TTL)
+            await pipe.execute()
+
+    async def flush() -> None:
+        if not chunk:
+            return
+        written = await _write_chunk(rds, uuid, company, chunk, chat_id)
+        span.setdefault("first_id", written[0])
+        span["last_id"] = written[-1]
+        progress["imported"] += len(chunk)
+        chunk.clear()
+        await save("running")
+
+    await save("running")
+    try:
+        async for lineno, line in lines:
+            progress["lines"] = lineno
+            if not line.strip():
+                continue
+            try:
+                msg = Message.model_validate_json(line)
+                await _mark_compressed(rds, company, msg)
+            except ValueError as exc:
+                progress["invalid"] += 1
+                if len(errors) < MAX_ERRORS:
+                    errors.append({"line": lineno, "error": str(exc)[:300]})
+                continue
+            chunk.append(msg)
+            if len(chunk) >= settings.bulk_import_chunk:
+                await flush()
+        await flush()
+    except (ValueError, ImportConflict) as exc:
+        # reported to the client as well
+        logger.warning("Bulk import into %s failed: %s", skey, exc)
+        await save("failed", str(exc)[:300])
+        raise
+    except Exception:
+        logger.exception("Bulk import into %s failed", skey)
+        await save("failed")
+        raise
+    await save("written")
+    logger.info(
+        "Imported %d messages into %s (%d invalid lines)",
+        progress["imported"],
+        skey,
+        progress["invalid"],
+    )
+    return {
+        "import_id": import_id,
+        **progress,
+        "errors": errors,
+        "first_id": span.get("first_id"),
+        "last_id": span.get("last_id"),
+    }
+
+
+async def get_progress(rds, import_id: str) -> dict | None:
+    raw = await rds.hgetall(progress_key(import_id))
+    if not raw:
+        return None
+    out = {}
+    for k, v in raw.items():
+        k = k.decode() if isinstance(k, bytes) else k
+        v = v.decode() if isinstance(v, bytes) else v
+        out[k] = int(v) if k in _COUNTERS else v
+    return out
+
+
+async def index_imported(
+    rds,
+    client,
+    uuid: str,
+    chat_id: str | None,
+    start: str,
+    end: str,
+    import_id: str | None = None,
+    batch: int = 256,
+) -> int:
+    """Embed and tag the messages of stream ``uuid``/``chat_id`` in ``[start, end]``.
+
+    Messages are embedded ``batch`` at a time with one model call and one
+    index write per batch; only the per-user history is tagged, as with
+    ``generate_tags``, reusing those embeddings. Returns the number of embedded messages.
+    """
+    from app.embeddings import aembed_many
+    from app.services.tagging import tag_messages
+    from app.vector import upsert_embeddings
+
+    skey = stream_key(uuid, chat_id)
+    inline = settings.vector_inline_payload
+    key = progress_key(import_id) if import_id else None
+    indexed = 0
+    low = start
+    while True:
+        rows = await rds.xrange(skey, min=low, max=end, count=batch)
+        if not rows:
+            break
+        msgs = await decode_payloads(rds, [obj[b"data"] for _mid, obj in rows])
+        todo = [
+            (mid.decode() if isinstance(mid, bytes) else mid, obj[b"data"], msg)
+            for (mid, obj), msg in zip(rows, msgs)
+            if msg is not None and msg.type == "text" and msg.content
+        ]
+        if todo:
+            vectors = await aembed_many(rds, [msg.content for _m, _d, msg in todo])
+            await upsert_embeddings(
+                [
+                    {
+                        "uuid": uuid,
+                        "message_id": mid,
+                        "embedding": vec,
+                        "blob": data if inline else None,
+                        "stream": skey if inline else None,
+                    }
+                    for (mid, data, _msg), vec in zip(todo, vectors)
+                ]
+            )
+            if chat_id is None:
+                # reuse the vectors so tagged messages are not embedded twice
+                await tag_messages(
+                    rds,
+                    client,
+                    uuid,
+                    entries=[(mid, {b"data": data}) for mid, data, _msg in todo],
+                    embeddings={
+                        mid: vec for (mid, _data, _msg), vec in zip(todo, vectors)
+                    },
+                )
+            indexed += len(todo)
+            if key:
+                await rds.hincrby(key, "indexed", len(todo))
+        if len(rows) < batch:
+            break
+        last = rows[-1][0]
+        low = "(" + (last.decode() if isinstance(last, bytes) else last)
+    if key:
+        await rds.hset(key, "status", "done")
+    logger.info("Indexed %d imported messages of %s", indexed, skey)
+    return indexed
+
+
+__all__ = [
+    "ImportConflict",
+    "get_progress",
+    "import_messages",
+    "index_imported",
+    "iter_lines",
+    "progress_key",
+]
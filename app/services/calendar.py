@@ -1,97 +1,331 @@
 import json
 import logging
+import uuid as uuid_mod
 from datetime import datetime
+from functools import lru_cache
 from zoneinfo import ZoneInfo
 
 from app.models import Message
-from worker.tasks import send_notification
+from app.services.reminders import cancel_reminder, queue_reminder, update_reminder
+from app.services.timeparse import parse_temporal
 
 logger = logging.getLogger(__name__)
 
 
-def _to_utc(dt: datetime, tz: str) -> datetime:
-    """Convert naive or tz-aware datetime from tz to UTC."""
+UTC = ZoneInfo("UTC")
+
+
+@lru_cache(maxsize=256)
+def _zone(tz: str | None) -> ZoneInfo:
+    """ZoneInfo for ``tz``; unknown or empty names fall back to UTC."""
     try:
-        tzinfo = ZoneInfo(tz)
+        return ZoneInfo(tz) if tz else UTC
     except Exception:
-        tzinfo = ZoneInfo("UTC")
+        return UTC
+
+
+def _to_utc(dt: datetime, tz: str) -> datetime:
+    """Convert naive or tz-aware datetime from tz to UTC."""
+    tzinfo = _zone(tz)
     if dt.tzinfo is None:
         local = dt.replace(tzinfo=tzinfo)
     else:
         local = dt.astimezone(tzinfo)
-    return local.astimezone(ZoneInfo("UTC"))
+    return local.astimezone(UTC)
+
+
+_REMINDER_WORDS = ("напомн", "remind")
+# requests to change existing events need the LLM and its tools
+_EDIT_WORDS = (
+    "удал", "измен", "перенес", "отмен", "покаж",
+    "delete", "remove", "cancel", "change", "move", "reschedul", "show", "list",
+)  # fmt: skip
+
+
+def _is_reminder(low: str) -> bool:
+    return any(w in low for w in _REMINDER_WORDS) and not any(
+        w in low for w in _EDIT_WORDS
+    )
+
+
+def _local_time(ts: datetime, tz: str) -> datetime:
+    """Naive wall-clock time in ``tz`` of a (naive UTC or aware) timestamp."""
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=UTC)
+    return ts.astimezone(_zone(tz)).replace(tzinfo=None)
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _calendar_key(uuid: str) -> str:
+    """Sorted set of the user's event IDs scored by UTC timestamp."""
+    return f"user:{uuid}:calendar"
+
+
+def _event_key(uuid: str, event_id: str) -> str:
+    return f"user:{uuid}:event:{event_id}"
+
 
+# Members written by older versions are JSON documents instead of IDs. They
+# are moved into event hashes the first time they are read; ZREM decides the
+# winner when two readers migrate the same member.
+_MIGRATE_SCRIPT = """
+local out = {}
+for i = 2, #ARGV, 3 do
+    local member, id, score = ARGV[i], ARGV[i + 1], ARGV[i + 2]
+    if redis.call('ZREM', KEYS[1], member) == 1 then
+        local ok, data = pcall(cjson.decode, member)
+        if not ok or type(data) ~= 'table' then data = {} end
+        local key = ARGV[1] .. id
+        redis.call('HSET', key, 'ts', score,
+            'text', type(data['text']) == 'string' and data['text'] or '',
+            'tz', type(data['tz']) == 'string' and data['tz'] or 'UTC')
+        for _, field in ipairs({'chat_id', 'reminder'}) do
+            if type(data[field]) == 'string' then
+                redis.call('HSET', key, field, data[field])
+            end
+        end
+        redis.call('ZADD', KEYS[1], score, id)
+        table.insert(out, id)
+    end
+end
+return out
+"""
 
-async def _list_events(rds, uuid: str):
-    rows = await rds.zrange(f"user:{uuid}:calendar", 0, -1, withscores=True)
+# Empty arguments leave a field unchanged. Returns the updated
+# (text, ts, reminder) or nil when the event does not exist.
+_UPDATE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return nil
+end
+if ARGV[2] ~= '' then redis.call('HSET', KEYS[1], 'text', ARGV[2]) end
+if ARGV[4] ~= '' then redis.call('HSET', KEYS[1], 'tz', ARGV[4]) end
+if ARGV[3] ~= '' then
+    redis.call('HSET', KEYS[1], 'ts', ARGV[3])
+    redis.call('ZADD', KEYS[2], ARGV[3], ARGV[1])
+end
+return redis.call('HMGET', KEYS[1], 'text', 'ts', 'reminder')
+"""
+
+# Returns the reminder ID of the removed event ('' if none) or nil.
+_DELETE_SCRIPT = """
+local reminder = redis.call('HGET', KEYS[1], 'reminder')
+redis.call('ZREM', KEYS[2], ARGV[1])
+if redis.call('DEL', KEYS[1]) == 0 then
+    return nil
+end
+return reminder or ''
+"""
+
+
+async def _store_event(
+    rds, uuid: str, text: str, tz: str, when_utc: datetime
+) -> str:
+    """Save a calendar event, schedule its reminder and return the event ID.
+
+    The reminder is written in the same MULTI as the event, so a failed write
+    cannot leave a reminder for an event that does not exist.
+    """
+    event_id = uuid_mod.uuid4().hex
+    ts = int(when_utc.timestamp())
+    pipe = rds.pipeline(transaction=True)
+    rid = queue_reminder(pipe, uuid, text, when_utc)
+    pipe.hset(
+        _event_key(uuid, event_id),
+        mapping={"text": text, "tz": tz, "ts": ts, "reminder": rid},
+    )
+    pipe.zadd(_calendar_key(uuid), {event_id: ts})
+    await pipe.execute()
+    return event_id
+
+
+async def _migrate_legacy(rds, uuid: str, rows: list) -> list[tuple[str, float]]:
+    legacy = [(m, ts) for m, ts in rows if m.startswith("{")]
+    if not legacy:
+        return rows
+    ids = {m: uuid_mod.uuid4().hex for m, _ts in legacy}
+    args = [_event_key(uuid, "")]
+    for member, ts in legacy:
+        args += [member, ids[member], int(ts)]
+    migrated = {
+        _decode(i)
+        for i in await rds.eval(_MIGRATE_SCRIPT, 1, _calendar_key(uuid), *args)
+    }
+    logger.info("Migrated %d legacy calendar events of %s", len(migrated), uuid)
+    out = []
+    for member, ts in rows:
+        if not member.startswith("{"):
+            out.append((member, ts))
+        elif ids[member] in migrated:
+            out.append((ids[member], ts))
+    return out
+
+
+async def _read_index(
+    rds, uuid: str, start, end, offset: int = 0, count: int | None = None
+) -> list[tuple[str, float]]:
+    """``(event_id, ts)`` pairs in ``[start, end]``, ``count`` from ``offset``."""
+    key = _calendar_key(uuid)
+    if count is None:
+        rows = await rds.zrangebyscore(key, start, end, withscores=True)
+    else:
+        rows = await rds.zrangebyscore(
+            key, start, end, start=offset, num=count, withscores=True
+        )
+    return await _migrate_legacy(rds, uuid, [(_decode(m), ts) for m, ts in rows])
+
+
+async def _load_events(rds, uuid: str, rows: list[tuple[str, float]]) -> list[dict]:
+    if not rows:
+        return []
+    pipe = rds.pipeline(transaction=False)
+    for event_id, _ts in rows:
+        pipe.hgetall(_event_key(uuid, event_id))
     events = []
-    for i, (raw, ts) in enumerate(rows):
-        data = json.loads(raw.decode() if isinstance(raw, bytes) else raw)
+    for (event_id, ts), data in zip(rows, await pipe.execute()):
+        if not data:
+            # deleted between the two reads
+            continue
+        data = {_decode(k): _decode(v) for k, v in data.items()}
         events.append(
             {
-                "index": i,
-                "when": datetime.fromtimestamp(ts, tz=ZoneInfo("UTC")).isoformat(),
-                "text": data.get("text"),
+                "id": event_id,
+                "ts": int(ts),
+                "text": data.get("text", ""),
                 "tz": data.get("tz", "UTC"),
+                "chat_id": data.get("chat_id"),
             }
         )
     return events
 
 
+async def _fetch_events(
+    rds, uuid: str, start: float | str = "-inf", end: float | str = "+inf"
+) -> list[dict]:
+    """Events of ``uuid`` with timestamps in ``[start, end]``, oldest first."""
+    return await _load_events(rds, uuid, await _read_index(rds, uuid, start, end))
+
+
+def _parse_cursor(cursor: str) -> tuple[int, int]:
+    """Split a ``{ts}:{skip}`` cursor; raises ``ValueError`` if malformed."""
+    ts, skip = cursor.split(":")
+    ts, skip = int(ts), int(skip)
+    if skip < 0:
+        raise ValueError(cursor)
+    return ts, skip
+
+
+async def _page_events(
+    rds,
+    uuid: str,
+    start: float | str = "-inf",
+    end: float | str = "+inf",
+    limit: int = 100,
+    cursor: str | None = None,
+) -> tuple[list[dict], str | None]:
+    """Return up to ``limit`` events in ``[start, end]`` and the next cursor.
+
+    The cursor is the timestamp of the last returned event and how many
+    events with that timestamp were already returned, so each page is a
+    ``ZRANGEBYSCORE ... LIMIT`` that starts at that score instead of an
+    offset into the whole calendar. ``None`` means there are no more events.
+    """
+    skip = 0
+    if cursor:
+        start, skip = _parse_cursor(cursor)
+    rows = await _read_index(rds, uuid, start, end, skip, limit + 1)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1][1]
+        seen = sum(1 for _id, ts in rows if ts == last)
+        if cursor and last == start:
+            # the whole page shares the score the cursor started at
+            seen += skip
+        next_cursor = f"{int(last)}:{seen}"
+    return await _load_events(rds, uuid, rows), next_cursor
+
+
+def _bound(value: str | None, default: str, tz: str) -> float | str:
+    if not value:
+        return default
+    return _to_utc(datetime.fromisoformat(value), tz).timestamp()
+
+
+async def _list_events(
+    rds, uuid: str, start: str | None = None, end: str | None = None, tz: str = "UTC"
+):
+    events = await _fetch_events(
+        rds, uuid, _bound(start, "-inf", tz), _bound(end, "+inf", tz)
+    )
+    return [
+        {
+            "id": e["id"],
+            "when": datetime.fromtimestamp(e["ts"], tz=UTC).isoformat(),
+            "text": e["text"],
+            "tz": e["tz"],
+        }
+        for e in events
+    ]
+
+
 async def _add_event(rds, uuid: str, when: str, text: str, tz: str = "UTC"):
     dt = datetime.fromisoformat(when)
-    when_utc = _to_utc(dt, tz)
-    await rds.zadd(
-        f"user:{uuid}:calendar",
-        {json.dumps({"text": text, "tz": tz}): int(when_utc.timestamp())},
-    )
-    send_notification.apply_async(args=[uuid, text], eta=when_utc)
-    return {"status": "added"}
+    event_id = await _store_event(rds, uuid, text, tz, _to_utc(dt, tz))
+    return {"status": "added", "id": event_id}
 
 
 async def _update_event(
     rds,
     uuid: str,
-    index: int,
+    event_id: str,
     when: str | None = None,
     text: str | None = None,
     tz: str | None = None,
 ):
-    rows = await rds.zrange(f"user:{uuid}:calendar", index, index, withscores=True)
-    if not rows:
-        return {"status": "not_found"}
-    raw, score = rows[0]
-    data = json.loads(raw.decode() if isinstance(raw, bytes) else raw)
-    if text is not None:
-        data["text"] = text
-    if tz is not None:
-        data["tz"] = tz
-    ts = int(score)
+    ekey = _event_key(uuid, event_id)
+    ts = ""
     if when:
-        ts = int(
-            _to_utc(
-                datetime.fromisoformat(when), data.get("tz", tz or "UTC")
-            ).timestamp()
-        )
-    await rds.zremrangebyrank(f"user:{uuid}:calendar", index, index)
-    await rds.zadd(f"user:{uuid}:calendar", {json.dumps(data): ts})
+        zone = tz or _decode(await rds.hget(ekey, "tz")) or "UTC"
+        ts = int(_to_utc(datetime.fromisoformat(when), zone).timestamp())
+    row = await rds.eval(
+        _UPDATE_SCRIPT, 2, ekey, _calendar_key(uuid), event_id, text or "", ts, tz or ""
+    )
+    if not row:
+        return {"status": "not_found"}
+    new_text, new_ts, rid = (_decode(v) for v in row)
+    if rid:
+        await update_reminder(rds, rid, uuid, new_text or "", int(new_ts))
     return {"status": "updated"}
 
 
-async def _delete_event(rds, uuid: str, index: int):
-    await rds.zremrangebyrank(f"user:{uuid}:calendar", index, index)
+async def _delete_event(rds, uuid: str, event_id: str):
+    rid = await rds.eval(
+        _DELETE_SCRIPT, 2, _event_key(uuid, event_id), _calendar_key(uuid), event_id
+    )
+    if rid is None:
+        return {"status": "not_found"}
+    if _decode(rid):
+        await cancel_reminder(rds, _decode(rid))
     return {"status": "deleted"}
 
 
 async def _check_and_store_calendar_event(
-    rds, uuid: str, msg: Message, tz: str = "UTC"
-) -> None:
-    """Analyze a user message and manage calendar events."""
+    rds, uuid: str, msg: Message, tz: str = "UTC", allow_default_time: bool = True
+) -> bool:
+    """Analyze a user message and manage calendar events.
+
+    Reminders whose time :func:`parse_temporal` can read are stored without
+    calling the LLM; everything else goes to the tool-calling extractor.
+    Returns ``True`` when the message was resolved by that fast path.
+    """
     from app.main import settings
     from app.services.llm import llm
 
     if msg.role != "user" or not msg.content:
-        return
+        return False
 
     text = msg.content.strip()
     low = text.lower()
@@ -108,39 +342,21 @@ async def _check_and_store_calendar_event(
             "\u043f\u043e\u043a\u0430\u0436",
         ]
     ):
-        return
+        return False
 
-    when: datetime | None = None
-    if "\u043d\u0430\u043f\u043e\u043c\u043d\u0438" in low or "remind" in low:
-        import re
-        from datetime import time, timedelta
-
-        m = re.search(
-            r"(\u0437\u0430\u0432\u0442\u0440\u0430|\u0441\u0435\u0433\u043e\u0434\u043d\u044f).*?(\d{1,2})[:.](\d{2})",
-            low,
-        )
-        if m:
-            hour = int(m.group(2))
-            minute = int(m.group(3))
-            base_day = datetime.utcnow().date()
-            if m.group(1) == "\u0437\u0430\u0432\u0442\u0440\u0430":
-                base_day += timedelta(days=1)
-            when = datetime.combine(base_day, time(hour=hour, minute=minute))
-
-    if when:
-        when_utc = _to_utc(when, tz)
-        await rds.zadd(
-            f"user:{uuid}:calendar",
-            {json.dumps({"text": text, "tz": tz}): int(when_utc.timestamp())},
-        )
-        send_notification.apply_async(args=[uuid, text], eta=when_utc)
-        return
+    if _is_reminder(low):
+        match = parse_temporal(text, _local_time(msg.ts, tz))
+        # a bare day ("remind me tomorrow") may get its time from the next
+        # message of a batch, so it only counts for a standalone message
+        if match and (match.explicit_time or allow_default_time):
+            await _store_event(rds, uuid, text, tz, _to_utc(match.when, tz))
+            return True
 
     try:
-        now = datetime.utcnow().replace(tzinfo=ZoneInfo("UTC"))
+        now = datetime.utcnow().replace(tzinfo=UTC)
         msg_ts = msg.ts
         if msg_ts.tzinfo is None:
-            msg_ts = msg_ts.replace(tzinfo=ZoneInfo("UTC"))
+            msg_ts = msg_ts.replace(tzinfo=UTC)
         sys_msg = {
             "role": "system",
             "content": (
@@ -155,8 +371,20 @@ async def _check_and_store_calendar_event(
                 "type": "function",
                 "function": {
                     "name": "list_events",
-                    "description": "List calendar events",
-                    "parameters": {"type": "object", "properties": {}},
+                    "description": "List calendar events, optionally in a time window",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "from": {
+                                "type": "string",
+                                "description": "ISO8601 datetime",
+                            },
+                            "to": {
+                                "type": "string",
+                                "description": "ISO8601 datetime",
+                            },
+                        },
+                    },
                 },
             },
             {
@@ -182,16 +410,16 @@ async def _check_and_store_calendar_event(
                 "type": "function",
                 "function": {
                     "name": "update_event",
-                    "description": "Update event by index",
+                    "description": "Update event by id",
                     "parameters": {
                         "type": "object",
                         "properties": {
-                            "index": {"type": "integer"},
+                            "id": {"type": "string"},
                             "when": {"type": "string"},
                             "text": {"type": "string"},
                             "tz": {"type": "string"},
                         },
-                        "required": ["index"],
+                        "required": ["id"],
                     },
                 },
             },
@@ -199,11 +427,11 @@ async def _check_and_store_calendar_event(
                 "type": "function",
                 "function": {
                     "name": "delete_event",
-                    "description": "Delete event by index",
+                    "description": "Delete event by id",
                     "parameters": {
                         "type": "object",
-                        "properties": {"index": {"type": "integer"}},
-                        "required": ["index"],
+                        "properties": {"id": {"type": "string"}},
+                        "required": ["id"],
                     },
                 },
             },
@@ -223,30 +451,25 @@ async def _check_and_store_calendar_event(
                     when = datetime.fromisoformat(args["when"])
                     text = args.get("text", text)
                     tz = args.get("tz", tz)
-                    when_utc = _to_utc(when, tz)
-                    await rds.zadd(
-                        f"user:{uuid}:calendar",
-                        {
-                            json.dumps({"text": text, "tz": tz}): int(
-                                when_utc.timestamp()
-                            )
-                        },
+                    event_id = await _store_event(
+                        rds, uuid, text, tz, _to_utc(when, tz)
                     )
-                    send_notification.apply_async(args=[uuid, text], eta=when_utc)
-                    result = {"status": "added"}
+                    result = {"status": "added", "id": event_id}
                 elif call.function.name == "update_event":
                     result = await _update_event(
                         rds,
                         uuid,
-                        args.get("index"),
+                        str(args.get("id")),
                         args.get("when"),
                         args.get("text"),
                         args.get("tz"),
                     )
                 elif call.function.name == "delete_event":
-                    result = await _delete_event(rds, uuid, args.get("index"))
+                    result = await _delete_event(rds, uuid, str(args.get("id")))
                 elif call.function.name == "list_events":
-                    result = await _list_events(rds, uuid)
+                    result = await _list_events(
+                        rds, uuid, args.get("from"), args.get("to"), tz
+                    )
                 else:
                     result = {"status": "unknown"}
                 messages.append(
@@ -259,21 +482,29 @@ async def _check_and_store_calendar_event(
                 )
     except Exception:
         logger.exception("calendar extraction failed")
+    return False
 
 
 async def _batch_check_calendar_events(
     rds, uuid: str, messages: list[Message], tz: str = "UTC"
 ) -> None:
-    """Process multiple messages for calendar commands."""
+    """Process multiple messages for calendar commands.
+
+    Messages the fast path could not resolve are checked once more joined
+    together, for commands split across messages.
+    """
 
     if not messages:
         return
+    standalone = sum(1 for m in messages if m.role == "user" and m.content) == 1
+    pending = []
     for m in messages:
-        await _check_and_store_calendar_event(rds, uuid, m, tz=tz)
+        if not await _check_and_store_calendar_event(
+            rds, uuid, m, tz=tz, allow_default_time=standalone
+        ):
+            pending.append(m)
 
-    combined = " ".join(
-        m.content.strip() for m in messages if m.role == "user" and m.content
-    )
-    if combined:
-        combo_msg = Message(role="user", content=combined, ts=messages[-1].ts)
+    parts = [m.content.strip() for m in pending if m.role == "user" and m.content]
+    if len(parts) > 1:
+        combo_msg = Message(role="user", content=" ".join(parts), ts=messages[-1].ts)
         await _check_and_store_calendar_event(rds, uuid, combo_msg, tz=tz)
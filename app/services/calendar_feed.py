@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import time
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+FEED_KEY = "calendar:feed"
+GROUP = "calendar"
+# written by versions that scanned every stream on a cron
+LEGACY_STREAMS_KEY = "calendar:streams"
+
+_group_ready = False
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def queue_calendar_feed(pipe, uuid: str, msgs: list, payloads: list[bytes]) -> None:
+    """Queue the user messages of a write on the shared calendar feed.
+
+    Only user messages with text can hold calendar commands. The feed is
+    capped at ``CALENDAR_FEED_MAXLEN`` entries.
+    """
+    for msg, data in zip(msgs, payloads):
+        if msg.role == "user" and msg.content:
+            pipe.xadd(
+                FEED_KEY,
+                {"uuid": uuid, "data": data},
+                maxlen=settings.calendar_feed_maxlen,
+                approximate=True,
+            )
+
+
+async def _ensure_group(rds) -> None:
+    global _group_ready
+    if _group_ready:
+        return
+    try:
+        # "0" so entries written before the first consumer started are read
+        await rds.xgroup_create(FEED_KEY, GROUP, id="0", mkstream=True)
+    except Exception as exc:
+        if "BUSYGROUP" not in str(exc):
+            raise
+    _group_ready = True
+
+
+async def _process(rds, entries: list, concurrency: int) -> int:
+    """Run the calendar extractor per user and acknowledge what succeeded."""
+    from app.history_utils import decode_payload
+    from app.services.calendar import _batch_check_calendar_events
+
+    ack: list = []
+    by_user: dict[str, list] = {}
+    for mid, fields in entries:
+        try:
+            uuid = _decode(fields[b"uuid"])
+            msg = await decode_payload(rds, fields[b"data"])
+        except Exception:
+            # trimmed (claimed entries without fields) or undecodable
+            logger.warning("Dropping calendar feed entry %s", _decode(mid))
+            ack.append(mid)
+            continue
+        by_user.setdefault(uuid, []).append((mid, msg))
+
+    sem = asyncio.Semaphore(concurrency)
+
+    async def run(uuid: str, rows: list) -> list:
+        async with sem:
+            try:
+                await _batch_check_calendar_events(rds, uuid, [m for _mid, m in rows])
+            except Exception:
+                # left pending; reclaimed once idle for CALENDAR_CLAIM_IDLE_MS
+                logger.exception("Calendar extraction failed for %s", uuid)
+                return []
+        return [mid for mid, _msg in rows]
+
+    for done in await asyncio.gather(*(run(u, r) for u, r in by_user.items())):
+        ack += done
+    if ack:
+        await rds.xack(FEED_KEY, GROUP, *ack)
+    return len(ack)
+
+
+async def _drain_legacy_streams(rds) -> None:
+    """Process what the cron scan had not reached before the feed existed."""
+    from app.history_utils import decode_payloads
+    from app.services.calendar import _batch_check_calendar_events
+
+    draining = f"{LEGACY_STREAMS_KEY}:draining"
+    try:
+        # only one worker wins the rename
+        await rds.rename(LEGACY_STREAMS_KEY, draining)
+    except Exception:
+        return
+    first = await rds.xrange(FEED_KEY, count=1)
+    # newer messages are on the feed
+    before = _decode(first[0][0]) if first else f"{int(time.time() * 1000)}-0"
+    for skey in await rds.smembers(draining):
+        skey = _decode(skey)
+        if not skey.startswith("user:"):
+            continue
+        last = _decode(await rds.get(f"calendar:last:{skey}"))
+        rng = await rds.xrange(skey, min=f"({last}" if last else "-", max=f"({before}")
+        if rng:
+            msgs = await decode_payloads(rds, [obj[b"data"] for _mid, obj in rng])
+            await _batch_check_calendar_events(
+                rds, skey.split(":")[1], [m for m in msgs if m is not None]
+            )
+        await rds.delete(f"calendar:last:{skey}")
+    await rds.delete(draining)
+    logger.info("Drained legacy calendar streams")
+
+
+async def consume_calendar_feed(
+    rds, consumer: str, batch: int = 100, concurrency: int = 8
+) -> int:
+    """Process new calendar feed entries as ``consumer`` of the feed's group.
+
+    Entries another consumer read but did not acknowledge within
+    ``CALENDAR_CLAIM_IDLE_MS`` are claimed first. Several workers may call
+    this at once; the consumer group hands each entry to only one of them.
+    Returns the number of acknowledged entries.
+    """
+    await _ensure_group(rds)
+    await _drain_legacy_streams(rds)
+    handled = 0
+    claimed = await rds.xautoclaim(
+        FEED_KEY, GROUP, consumer, settings.calendar_claim_idle_ms, "0-0", count=batch
+    )
+    if claimed[1]:
+        logger.info("Reclaimed %d calendar feed entries", len(claimed[1]))
+        handled += await _process(rds, claimed[1], concurrency)
+    while True:
+        resp = await rds.xreadgroup(GROUP, consumer, {FEED_KEY: ">"}, count=batch)
+        entries = resp[0][1] if resp else []
+        if not entries:
+            break
+        handled += await _process(rds, entries, concurrency)
+    return handled
+
+
+__all__ = ["consume_calendar_feed", "queue_calendar_feed"]
@@ -1,8 +1,29 @@
+import asyncio
+import logging
+from functools import lru_cache
+
+from app.cache import LRUCache
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+# channel used to evict company settings from the caches of all processes
+INVALIDATION_CHANNEL = "company:invalidate"
+# credentials stay in Redis only
+_PRIVATE_FIELDS = {"password", "token"}
+
+
 async def _ensure_company(uuid: str, company_id: str) -> None:
     from fastapi import HTTPException
 
     from app.main import app
+    from app.token_cache import token_cache
 
+    # get_current_user already verified this pair for the token's owner
+    if token_cache().get(f"identity:{uuid}") == company_id:
+        return
     rds = app.state.redis
     stored = await rds.hget(f"user:{uuid}:data", "company_id")
     if isinstance(stored, bytes):
@@ -11,13 +32,7 @@ async def _ensure_company(uuid: str, company_id: str) -> None:
         raise HTTPException(status_code=403, detail="forbidden")
 
 
-async def _company_feature_enabled(
-    company: str, feature: str, default: bool = True
-) -> bool:
-    from app.main import app
-
-    rds = app.state.redis
-    val = await rds.hget(f"company:{company}:data", feature)
+def _flag_value(val, default: bool = True) -> bool:
     if val is None:
         return default
     if isinstance(val, bytes):
@@ -28,4 +43,107 @@ async def _company_feature_enabled(
         return val.lower() in {"true", "yes"}
 
 
-__all__ = ["_ensure_company", "_company_feature_enabled"]
+@lru_cache
+def company_cache() -> LRUCache:
+    """Decoded ``company:{name}:data`` hashes (without credentials) by name."""
+    return LRUCache(
+        maxsize=settings.company_cache_size, ttl=settings.company_cache_ttl
+    )
+
+
+async def company_settings(company: str) -> dict[str, str]:
+    """Return the settings of ``company``, loading them with one HGETALL.
+
+    Entries live for ``COMPANY_CACHE_TTL`` seconds and are evicted earlier
+    when a process announces a change with :func:`invalidate_company`.
+    """
+    from app.main import app
+
+    cache = company_cache()
+    data = cache.get(company)
+    if data is not None:
+        return data
+    raw = await app.state.redis.hgetall(f"company:{company}:data")
+    data = {}
+    for key, val in raw.items():
+        key = key.decode() if isinstance(key, bytes) else key
+        if key not in _PRIVATE_FIELDS:
+            data[key] = val.decode() if isinstance(val, bytes) else val
+    cache.set(company, data)
+    return data
+
+
+async def invalidate_company(rds, company: str) -> None:
+    """Evict ``company`` locally and tell the other processes to do the same."""
+    company_cache().pop(company)
+    try:
+        await rds.publish(INVALIDATION_CHANNEL, company)
+    except Exception:
+        logger.exception("Failed to publish company invalidation")
+
+
+async def listen_for_company_changes(rds) -> None:
+    """Evict companies announced on the invalidation channel.
+
+    Runs until cancelled and reconnects after connection errors; the cache
+    is cleared on every (re)subscribe because messages published while
+    disconnected are lost.
+    """
+    while True:
+        pubsub = rds.pubsub()
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            company_cache().clear()
+            async for message in pubsub.listen():
+                if message.get("type") != "message":
+                    continue
+                name = message.get("data")
+                company_cache().pop(name.decode() if isinstance(name, bytes) else name)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Company invalidation listener failed, retrying")
+            await asyncio.sleep(1)
+        finally:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
+
+
+async def _company_feature_enabled(
+    company: str, feature: str, default: bool = True
+) -> bool:
+    data = await company_settings(company)
+    return _flag_value(data.get(feature), default)
+
+
+async def _company_features(
+    company: str, *features: str, default: bool = True
+) -> list[bool]:
+    """Return several feature flags of ``company`` from its cached settings."""
+    data = await company_settings(company)
+    return [_flag_value(data.get(f), default) for f in features]
+
+
+async def _zstd_dictionary(rds, company: str) -> int | None:
+    """ID of the company's zstd dictionary, loaded into the process, if any."""
+    from app.compression import load_dictionary
+
+    dict_id = (await company_settings(company)).get("zstd_dict")
+    if dict_id and await load_dictionary(rds, int(dict_id)):
+        return int(dict_id)
+    return None
+
+
+__all__ = [
+    "INVALIDATION_CHANNEL",
+    "_company_feature_enabled",
+    "_company_features",
+    "_ensure_company",
+    "_zstd_dictionary",
+    "company_cache",
+    "company_settings",
+    "invalidate_company",
+    "listen_for_company_changes",
+]
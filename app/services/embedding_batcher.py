@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+# upper bounds of the batch size histogram buckets
+_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, float("inf"))
+
+
+@dataclass
+class _Item:
+    uuid: str
+    message_id: str
+    text: str
+    payload: bytes | None = None
+    stream: str | None = None
+
+
+class EmbeddingBatcher:
+    """Collect texts from concurrent requests and embed them in batches.
+
+    Texts are queued by :meth:`submit`. A background task takes up to
+    ``max_batch`` items, waiting at most ``max_wait_ms`` for the batch to
+    fill, embeds them through the two-tier embedding cache (one
+    ``model.encode`` call for all cache misses) and stores all vectors with a
+    single bulk ``load``.
+    """
+
+    def __init__(
+        self,
+        max_batch: int = 64,
+        max_wait_ms: int = 10,
+        queue_size: int = 10000,
+        rds=None,
+    ) -> None:
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0, max_wait_ms) / 1000
+        self.queue_size = queue_size
+        # Redis client for the shared embedding cache tier
+        self.rds = rds
+        self._queue: asyncio.Queue[_Item] | None = None
+        self._task: asyncio.Task | None = None
+        self._started = time.monotonic()
+        self._texts = 0
+        self._batches = 0
+        self._failed = 0
+        self._embed_seconds = 0.0
+        self._histogram = {b: 0 for b in _BUCKETS}
+
+    def _ensure_started(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return self._queue
+
+    async def submit(
+        self,
+        uuid: str,
+        message_id: str,
+        text: str,
+        payload: bytes | None = None,
+        stream: str | None = None,
+    ) -> None:
+        """Queue ``text`` for embedding, waiting if the queue is full.
+
+        ``payload`` and ``stream`` are stored next to the vector when the
+        inline payload mode is enabled.
+        """
+        queue = self._ensure_started()
+        await queue.put(_Item(uuid, message_id, text, payload, stream))
+
+    async def stop(self) -> None:
+        """Flush queued texts and stop the background task."""
+        if self._queue is not None and self._task is not None:
+            await self._queue.join()
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    async def _collect(self, queue: asyncio.Queue) -> list[_Item]:
+        batch = [await queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        while len(batch) < self.max_batch and not queue.empty():
+            batch.append(queue.get_nowait())
+        return batch
+
+    async def _run(self) -> None:
+        queue = self._queue
+        while True:
+            batch = await self._collect(queue)
+            try:
+                await self._flush(batch)
+            except Exception:
+                self._failed += len(batch)
+                logger.exception("Embedding batch of %d failed", len(batch))
+            finally:
+                for _ in batch:
+                    queue.task_done()
+
+    async def _flush(self, batch: list[_Item]) -> None:
+        from app.embeddings import aembed_many
+        from app.vector import upsert_embeddings
+
+        texts = [item.text for item in batch]
+        start = time.perf_counter()
+        vectors = await aembed_many(self.rds, texts)
+        self._embed_seconds += time.perf_counter() - start
+        await upsert_embeddings(
+            [
+                {
+                    "uuid": item.uuid,
+                    "message_id": item.message_id,
+                    "embedding": vec,
+                    "blob": item.payload,
+                    "stream": item.stream,
+                }
+                for item, vec in zip(batch, vectors)
+            ]
+        )
+        self._texts += len(batch)
+        self._batches += 1
+        for bound in _BUCKETS:
+            if len(batch) <= bound:
+                self._histogram[bound] += 1
+                break
+
+    def stats(self) -> dict:
+        """Return throughput counters and the batch size histogram."""
+        uptime = time.monotonic() - self._started
+        return {
+            "texts": self._texts,
+            "batches": self._batches,
+            "failed": self._failed,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "avg_batch_size": self._texts / self._batches if self._batches else 0.0,
+            "texts_per_sec": self._texts / uptime if uptime else 0.0,
+            "embed_texts_per_sec": (
+                self._texts / self._embed_seconds if self._embed_seconds else 0.0
+            ),
+            "batch_size_histogram": {
+                f"le_{bound:g}": count for bound, count in self._histogram.items()
+            },
+        }
+
+
+@lru_cache
+def get_batcher() -> EmbeddingBatcher:
+    return EmbeddingBatcher(
+        max_batch=settings.embed_batch_size,
+        max_wait_ms=settings.embed_batch_wait_ms,
+        queue_size=settings.embed_queue_size,
+    )
+
+
+__all__ = ["EmbeddingBatcher", "get_batcher"]
@@ -1,16 +1,37 @@
 import logging
 
-from openai import AsyncOpenAI
-
 from app.config import get_settings
 
 logger = logging.getLogger(__name__)
 
 settings = get_settings()
 
-llm = AsyncOpenAI(
-    api_key=str(settings.openai_api_key),
-    base_url=str(settings.openai_base_url),
-)
 
-__all__ = ["llm"]
+class LazyClient:
+    """Proxy that builds the wrapped client on first attribute access.
+
+    Keeps heavy SDK imports out of module import time.
+    """
+
+    def __init__(self, factory) -> None:
+        self._factory = factory
+        self._client = None
+
+    def __getattr__(self, name: str):
+        if self._client is None:
+            self._client = self._factory()
+        return getattr(self._client, name)
+
+
+def _create_llm():
+    from openai import AsyncOpenAI
+
+    return AsyncOpenAI(
+        api_key=str(settings.openai_api_key),
+        base_url=str(settings.openai_base_url),
+    )
+
+
+llm = LazyClient(_create_llm)
+
+__all__ = ["LazyClient", "llm"]
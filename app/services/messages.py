@@ -1,10 +1,73 @@
-import asyncio
+from app.compression import get_codec
+from app.config import get_settings
+from app.history_utils import decode_vector_hits, hydrate_messages
+from app.models import Message
+from app.services.company import _zstd_dictionary
+from app.services.embedding_batcher import get_batcher
+from app.vector import semantic_search, semantic_search_payloads
 
-from app.embeddings import embed
-from app.vector import upsert_embedding
+settings = get_settings()
 
 
-async def _embed_and_insert(uuid: str, message_id: str, text: str) -> None:
-    loop = asyncio.get_running_loop()
-    emb = await loop.run_in_executor(None, lambda: embed(text))
-    await upsert_embedding(uuid, message_id, emb)
+async def _embed_and_insert(
+    uuid: str,
+    message_id: str,
+    text: str,
+    payload: bytes | None = None,
+    stream: str | None = None,
+) -> None:
+    """Queue ``text`` on the shared embedding batcher."""
+    await get_batcher().submit(uuid, message_id, text, payload, stream)
+
+
+async def _mark_compressed(rds, company: str, msg: Message) -> None:
+    """Flag long, unimportant text for compression when it is encoded.
+
+    A client may pick the codec per message in ``extra["compress_algo"]``;
+    the content stays plain text here and is compressed by
+    :func:`app.history_utils.encode_message`. Raises ``ValueError`` for an
+    unknown or unavailable codec.
+    """
+    if (
+        msg.type != "text"
+        or not msg.content
+        or len(msg.content) <= settings.compression_threshold
+        or msg.importance >= 5
+    ):
+        return
+    algo = (msg.extra or {}).get("compress_algo") or settings.compression_algorithm
+    get_codec(algo)
+    dict_id = await _zstd_dictionary(rds, company) if algo == "zstd" else None
+    if msg.extra is None:
+        msg.extra = {}
+    msg.extra["compressed"] = True
+    msg.extra["compress_algo"] = algo
+    if dict_id:
+        msg.extra["compress_dict"] = dict_id
+
+
+async def search_messages(
+    rds,
+    uuid: str,
+    query_vec,
+    k: int = 5,
+    tags: list[str] | None = None,
+    chat_id: str | None = None,
+    exclude: set[str] | None = None,
+) -> list[tuple[str, Message]]:
+    """Run a semantic search and return the decoded ``(id, message)`` hits.
+
+    With ``VECTOR_INLINE_PAYLOAD`` enabled the messages are decoded from the
+    payload returned by ``FT.SEARCH``; otherwise they are loaded from the
+    stream. IDs in ``exclude`` are dropped before any message is loaded.
+    """
+    exclude = exclude or set()
+    if settings.vector_inline_payload:
+        hits = await semantic_search_payloads(uuid, query_vec, k=k, tags=tags)
+        hits = [h for h in hits if h["message_id"] not in exclude]
+        return await decode_vector_hits(rds, uuid, hits, chat_id)
+    ids = await semantic_search(uuid, query_vec, k=k, tags=tags)
+    ids = [mid.decode() if isinstance(mid, bytes) else mid for mid in ids]
+    return await hydrate_messages(
+        rds, uuid, [mid for mid in ids if mid not in exclude], chat_id
+    )
@@ -0,0 +1,234 @@
+import logging
+import time
+import uuid as uuid_mod
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+DUE_KEY = "reminders:due"
+STATS_KEY = "reminders:stats"
+LAG_KEY = "reminders:lag"
+LEADER_KEY = "reminders:leader"
+# dispatch lags kept for the percentiles reported by ``reminder_stats``
+LAG_SAMPLES = 1000
+
+INFLIGHT_KEY = "reminders:inflight"
+# claimed reminders not acknowledged within this many seconds are sent again
+INFLIGHT_TIMEOUT = 60
+
+# Moves the candidate reminders ARGV[3..] (hashes KEYS[3..]) that are due at
+# ARGV[1] in KEYS[1], or stuck in the in-flight set KEYS[2] since ARGV[2],
+# into the in-flight set and returns their rows, so two pollers can never
+# dispatch the same reminder. The hashes stay until :func:`ack_claimed`.
+_CLAIM_SCRIPT = """
+local out = {}
+for i = 3, #ARGV do
+    local id = ARGV[i]
+    local score = redis.call('ZSCORE', KEYS[1], id)
+    local take = score and tonumber(score) <= tonumber(ARGV[1])
+    if not take then
+        local since = redis.call('ZSCORE', KEYS[2], id)
+        take = since and tonumber(since) <= tonumber(ARGV[2])
+    end
+    if take then
+        redis.call('ZREM', KEYS[1], id)
+        local row = redis.call('HMGET', KEYS[i], 'uuid', 'text', 'due')
+        if row[1] then
+            redis.call('ZADD', KEYS[2], ARGV[1], id)
+            table.insert(out, id)
+            table.insert(out, row[1])
+            table.insert(out, row[2])
+            table.insert(out, row[3])
+        else
+            redis.call('ZREM', KEYS[2], id)
+        end
+    end
+end
+return out
+"""
+
+# Takes the reminders ARGV[1..] (hashes KEYS[3..]) out of the in-flight set
+# KEYS[2]; a hash is kept when the reminder was re-armed in KEYS[1] meanwhile.
+_ACK_SCRIPT = """
+for i = 1, #ARGV do
+    redis.call('ZREM', KEYS[2], ARGV[i])
+    if not redis.call('ZSCORE', KEYS[1], ARGV[i]) then
+        redis.call('DEL', KEYS[i + 2])
+    end
+end
+return #ARGV
+"""
+
+_RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _timestamp(when: datetime | float) -> float:
+    return when.timestamp() if isinstance(when, datetime) else float(when)
+
+
+def queue_reminder(
+    pipe, uuid: str, text: str, when: datetime | float, rid: str | None = None
+) -> str:
+    """Queue the writes of :func:`schedule_reminder` on ``pipe``; returns the ID.
+
+    Lets a caller schedule the reminder in the same MULTI as the rows that
+    refer to it.
+    """
+    rid = rid or uuid_mod.uuid4().hex
+    due = _timestamp(when)
+    pipe.hset(f"reminder:{rid}", mapping={"uuid": uuid, "text": text, "due": due})
+    pipe.zadd(DUE_KEY, {rid: due})
+    return rid
+
+
+async def schedule_reminder(
+    rds, uuid: str, text: str, when: datetime | float, rid: str | None = None
+) -> str:
+    """Schedule a notification for ``uuid`` at ``when`` and return its ID.
+
+    The reminder is a ``reminder:{id}`` hash plus a member of the global
+    ``reminders:due`` sorted set scored by its due time, so pending
+    reminders cost no worker memory. Both are written in one MULTI so the
+    sorted set never points at a missing row. Passing an existing ``rid``
+    moves it.
+    """
+    pipe = rds.pipeline(transaction=True)
+    rid = queue_reminder(pipe, uuid, text, when, rid)
+    await pipe.execute()
+    return rid
+
+
+async def update_reminder(
+    rds, rid: str, uuid: str, text: str, when: datetime | float
+) -> None:
+    """Move or reword a reminder; a fired one is only re-armed for the future."""
+    due = _timestamp(when)
+    if await rds.zscore(DUE_KEY, rid) is None and due <= time.time():
+        return
+    await schedule_reminder(rds, uuid, text, due, rid=rid)
+
+
+async def cancel_reminder(rds, rid: str) -> None:
+    await rds.zrem(DUE_KEY, rid)
+    await rds.zrem(INFLIGHT_KEY, rid)
+    await rds.delete(f"reminder:{rid}")
+
+
+async def claim_due(rds, now: float | None = None, limit: int = 500) -> list[dict]:
+    """Atomically move up to ``limit`` reminders due at ``now`` to in-flight.
+
+    Reminders claimed more than ``INFLIGHT_TIMEOUT`` seconds ago and never
+    acknowledged with :func:`ack_claimed` (the dispatcher died before
+    enqueueing them) are claimed again, so delivery is at least once.
+    """
+    now = time.time() if now is None else now
+    stale = now - INFLIGHT_TIMEOUT
+    pipe = rds.pipeline(transaction=False)
+    pipe.zrangebyscore(DUE_KEY, "-inf", now, start=0, num=limit)
+    pipe.zrangebyscore(INFLIGHT_KEY, "-inf", stale, start=0, num=limit)
+    due, stuck = await pipe.execute()
+    ids = list(dict.fromkeys(_decode(v) for v in due + stuck))
+    if not ids:
+        return []
+    keys = [DUE_KEY, INFLIGHT_KEY] + [f"reminder:{rid}" for rid in ids]
+    raw = await rds.eval(_CLAIM_SCRIPT, len(keys), *keys, now, stale, *ids)
+    claimed = []
+    for i in range(0, len(raw), 4):
+        rid, uuid, text, due = (_decode(v) for v in raw[i : i + 4])
+        claimed.append({"id": rid, "uuid": uuid, "text": text, "due": float(due)})
+    return claimed
+
+
+async def ack_claimed(rds, ids: list[str]) -> None:
+    """Mark claimed reminders as enqueued and drop their hashes."""
+    if not ids:
+        return
+    keys = [DUE_KEY, INFLIGHT_KEY] + [f"reminder:{rid}" for rid in ids]
+    await rds.eval(_ACK_SCRIPT, len(keys), *keys, *ids)
+
+
+async def acquire_leader(rds, token: str, ttl: int) -> bool:
+    """Become the single dispatcher for ``ttl`` seconds unless another holds it."""
+    return bool(await rds.set(LEADER_KEY, token, nx=True, ex=ttl))
+
+
+async def renew_leader(rds, token: str, ttl: int) -> bool:
+    """Extend the dispatcher lock to ``ttl`` seconds if ``token`` still holds it."""
+    return bool(await rds.eval(_RENEW_SCRIPT, 1, LEADER_KEY, token, ttl))
+
+
+async def release_leader(rds, token: str) -> None:
+    await rds.eval(_RELEASE_SCRIPT, 1, LEADER_KEY, token)
+
+
+async def record_dispatch(rds, claimed: list[dict], now: float | None = None) -> None:
+    """Store how late the ``claimed`` reminders were dispatched, in milliseconds."""
+    if not claimed:
+        return
+    now = time.time() if now is None else now
+    lags = [max(0, int((now - r["due"]) * 1000)) for r in claimed]
+    pipe = rds.pipeline(transaction=False)
+    pipe.hincrby(STATS_KEY, "dispatched", len(lags))
+    pipe.hincrby(STATS_KEY, "lag_ms_total", sum(lags))
+    pipe.lpush(LAG_KEY, *lags)
+    pipe.ltrim(LAG_KEY, 0, LAG_SAMPLES - 1)
+    await pipe.execute()
+
+
+async def reminder_stats(rds) -> dict:
+    """Queue depth and dispatch lag of the reminder scheduler."""
+    now = time.time()
+    pipe = rds.pipeline(transaction=False)
+    pipe.zcard(DUE_KEY)
+    pipe.zcount(DUE_KEY, "-inf", now)
+    pipe.hgetall(STATS_KEY)
+    pipe.lrange(LAG_KEY, 0, -1)
+    pending, overdue, stats, lags = await pipe.execute()
+    stats = {_decode(k): int(v) for k, v in stats.items()}
+    lags = sorted(int(v) for v in lags)
+    dispatched = stats.get("dispatched", 0)
+
+    def pct(p: float) -> int | None:
+        return lags[min(len(lags) - 1, int(len(lags) * p))] if lags else None
+
+    return {
+        "pending": pending,
+        "overdue": overdue,
+        "dispatched": dispatched,
+        "lag_ms_avg": (
+            stats.get("lag_ms_total", 0) / dispatched if dispatched else None
+        ),
+        "lag_ms_p50": pct(0.5),
+        "lag_ms_p99": pct(0.99),
+    }
+
+
+__all__ = [
+    "ack_claimed",
+    "acquire_leader",
+    "cancel_reminder",
+    "claim_due",
+    "queue_reminder",
+    "record_dispatch",
+    "release_leader",
+    "reminder_stats",
+    "renew_leader",
+    "schedule_reminder",
+    "update_reminder",
+]
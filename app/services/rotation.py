@@ -0,0 +1,220 @@
+"""Re-encryption of stored messages after an ``ENCRYPTION_KEY`` rotation.
+
+Rotation works without downtime: the new key becomes ``ENCRYPTION_KEY`` and
+the previous one moves to ``ENCRYPTION_OLD_KEYS``, so new messages are
+encrypted with the new key while old ones stay readable. The job below then
+rewrites every message that is not encrypted with the current key; once it
+has finished the old key can be removed.
+
+Stream entries cannot be modified in place, so every ``user:*:history`` and
+``chat:*:history`` stream holding such entries (found by a first pass that
+only reads the entry headers) is copied in batches into ``{key}:reencrypt``
+with the same entry IDs (re-encrypting the entries that need it) and the
+copy replaces the stream in a short Lua script that first appends the
+entries added meanwhile. If entries were deleted during the copy the lengths differ
+and the stream is left for the next run. Progress (SCAN cursor, stream and
+last copied ID) is kept in the ``reencrypt:state`` hash so an interrupted
+run resumes where it stopped.
+"""
+
+import asyncio
+import logging
+import time
+
+from app.history_utils import (
+    decode_payloads,
+    encode_message,
+    needs_rewrap,
+    stream_fields,
+)
+
+logger = logging.getLogger(__name__)
+
+STATE_KEY = "reencrypt:state"
+LOCK_KEY = "reencrypt:lock"
+LOCK_TTL = 600
+_COPY_SUFFIX = ":reencrypt"
+
+# KEYS[1] stream, KEYS[2] copy; ARGV[1] last copied ID
+_SWAP_SCRIPT = """
+local tail = redis.call('XRANGE', KEYS[1], '(' .. ARGV[1], '+')
+for _, entry in ipairs(tail) do
+    redis.call('XADD', KEYS[2], entry[1], unpack(entry[2]))
+end
+if redis.call('XLEN', KEYS[1]) ~= redis.call('XLEN', KEYS[2]) then
+    redis.call('DEL', KEYS[2])
+    return 0
+end
+local info = redis.call('XINFO', 'STREAM', KEYS[1])
+for i = 1, #info, 2 do
+    if info[i] == 'last-generated-id' then
+        redis.call('XSETID', KEYS[2], info[i + 1])
+    end
+end
+redis.call('RENAME', KEYS[2], KEYS[1])
+return 1
+"""
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _is_history(key: str) -> bool:
+    return key.startswith(("user:", "chat:")) and key.endswith(":history")
+
+
+async def _throttle(started: float, count: int, rate: int) -> None:
+    """Sleep so that ``count`` items take at least ``count / rate`` seconds."""
+    if rate:
+        delay = count / rate - (time.monotonic() - started)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+async def _rewrap(rds, payloads: list) -> dict[int, bytes]:
+    """Re-encoded payloads by index, for those not using the current key.
+
+    Payloads that cannot be decoded are left out and keep their old form.
+    """
+    stale = [i for i, data in enumerate(payloads) if needs_rewrap(data)]
+    msgs = await decode_payloads(rds, [payloads[i] for i in stale])
+    return {i: msg for i, msg in zip(stale, msgs) if msg is not None}
+
+
+async def _has_stale(rds, key: str, batch: int) -> bool:
+    """Whether any entry of stream ``key`` is not sealed with the current key.
+
+    Only reads the stream and checks the entry headers, so streams that are
+    already up to date are skipped without being copied.
+    """
+    low = "-"
+    while True:
+        rows = await rds.xrange(key, min=low, max="+", count=batch)
+        if any(needs_rewrap(obj[b"data"]) for _mid, obj in rows):
+            return True
+        if len(rows) < batch:
+            return False
+        low = "(" + _decode(rows[-1][0])
+
+
+async def reencrypt_stream(
+    rds, key: str, batch: int = 500, rate: int = 0, last: str | None = None
+) -> int:
+    """Rewrite stream ``key`` so every entry uses the current key.
+
+    ``last`` resumes a copy interrupted after that entry ID. At most
+    ``rate`` entries per second are processed (0 for no limit). Returns the
+    number of re-encrypted entries; 0 also when nothing needed it or the
+    stream changed too much during the copy.
+    """
+    copy = key + _COPY_SUFFIX
+    if last is None:
+        if not await _has_stale(rds, key, batch):
+            return 0
+        await rds.delete(copy)
+        await rds.hset(STATE_KEY, mapping={"key": key, "last": "", "rewrapped": 0})
+    while True:
+        started = time.monotonic()
+        rows = await rds.xrange(
+            key, min=f"({last}" if last else "-", max="+", count=batch
+        )
+        if not rows:
+            break
+        msgs = await _rewrap(rds, [obj[b"data"] for _mid, obj in rows])
+        last = _decode(rows[-1][0])
+        pipe = rds.pipeline(transaction=True)
+        for i, (mid, obj) in enumerate(rows):
+            fields = obj
+            if i in msgs:
+                fields = stream_fields(msgs[i], encode_message(msgs[i]))
+            pipe.xadd(copy, fields, id=mid)
+        pipe.hset(STATE_KEY, "last", last)
+        pipe.hincrby(STATE_KEY, "rewrapped", len(msgs))
+        pipe.expire(LOCK_KEY, LOCK_TTL)
+        await pipe.execute()
+        await _throttle(started, len(rows), rate)
+        if len(rows) < batch:
+            break
+    rewrapped = int(await rds.hget(STATE_KEY, "rewrapped") or 0)
+    swapped = 0
+    if rewrapped and last:
+        swapped = await rds.eval(_SWAP_SCRIPT, 2, key, copy, last)
+        if not swapped:
+            logger.warning("%s changed during re-encryption, retry later", key)
+    else:
+        await rds.delete(copy)
+    await rds.hdel(STATE_KEY, "key", "last", "rewrapped")
+    return rewrapped if swapped else 0
+
+
+async def reencrypt_vector_payloads(rds, batch: int = 500, rate: int = 0) -> int:
+    """Re-encrypt the inline payloads stored with the message vectors."""
+    cursor = int(await rds.hget(STATE_KEY, "vectors") or 0)
+    updated = 0
+    while True:
+        started = time.monotonic()
+        cursor, keys = await rds.scan(cursor, match="history_vectors:*", count=batch)
+        if keys:
+            pipe = rds.pipeline(transaction=False)
+            for key in keys:
+                pipe.hget(key, "blob")
+            payloads = await pipe.execute()
+            found = [(k, p) for k, p in zip(keys, payloads) if p]
+            msgs = await _rewrap(rds, [p for _k, p in found])
+            if msgs:
+                pipe = rds.pipeline(transaction=False)
+                for i, msg in msgs.items():
+                    pipe.hset(found[i][0], "blob", encode_message(msg))
+                await pipe.execute()
+                updated += len(msgs)
+            await _throttle(started, len(found), rate)
+        if not cursor:
+            break
+        await rds.hset(STATE_KEY, "vectors", cursor)
+        await rds.expire(LOCK_KEY, LOCK_TTL)
+    await rds.hdel(STATE_KEY, "vectors")
+    return updated
+
+
+async def reencrypt_history(rds, batch: int = 500, rate: int = 2000) -> int | None:
+    """Re-encrypt all history streams and vector payloads with the current key.
+
+    Returns the number of re-encrypted messages, or ``None`` when another
+    run holds the lock.
+    """
+    if not await rds.set(LOCK_KEY, 1, nx=True, ex=LOCK_TTL):
+        logger.info("Re-encryption already running")
+        return None
+    try:
+        state = {
+            _decode(k): _decode(v) for k, v in (await rds.hgetall(STATE_KEY)).items()
+        }
+        total = 0
+        if state.get("key"):
+            # finish the stream an interrupted run was copying
+            logger.info("Resuming re-encryption of %s", state["key"])
+            total += await reencrypt_stream(
+                rds, state["key"], batch, rate, state.get("last") or None
+            )
+        cursor = int(state.get("scan") or 0)
+        if cursor >= 0:
+            while True:
+                cursor, keys = await rds.scan(cursor, match="*:history", count=batch)
+                for key in map(_decode, keys):
+                    if _is_history(key):
+                        total += await reencrypt_stream(rds, key, batch, rate)
+                if not cursor:
+                    break
+                await rds.hset(STATE_KEY, "scan", cursor)
+            # streams are done; a resumed run only handles the vectors
+            await rds.hset(STATE_KEY, "scan", -1)
+        total += await reencrypt_vector_payloads(rds, batch, rate)
+        await rds.delete(STATE_KEY)
+    finally:
+        await rds.delete(LOCK_KEY)
+    logger.info("Re-encrypted %d messages", total)
+    return total
+
+
+__all__ = ["reencrypt_history", "reencrypt_stream", "reencrypt_vector_payloads"]
@@ -0,0 +1,230 @@
+import asyncio
+import json
+import logging
+import uuid as uuid_mod
+
+from app.config import get_settings
+from app.history_utils import decode_payloads, stream_key
+from app.tokens import count_tokens as _count_llm_tokens
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+SUMMARY_PROMPT = (
+    "Summarize the following user chat history so that an LLM assistant "
+    "can quickly recall the user's background, preferences, and key facts.\n\n"
+)
+FOLD_PROMPT = (
+    "Below is the current summary of a user's chat history followed by new "
+    "messages. Return the updated summary so that an LLM assistant can quickly "
+    "recall the user's background, preferences, and key facts. Keep everything "
+    "from the current summary that is still relevant.\n\n"
+)
+REDUCE_PROMPT = (
+    "The following are summaries of consecutive parts of one user's chat "
+    "history, oldest first. Merge them into a single summary so that an LLM "
+    "assistant can quickly recall the user's background, preferences, and key "
+    "facts. Prefer the later parts where they contradict earlier ones.\n\n"
+)
+_PART_SEPARATOR = "\n\n---\n\n"
+
+# deletes the lock only while it still holds our token, so a run that
+# outlived ``SUMMARY_LOCK_TTL`` cannot release the lock of the next one
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def summary_field(uuid: str, chat_id: str | None = None) -> str:
+    """Field of the ``summary`` hash holding the summary of a stream."""
+    return f"{uuid}:chat:{chat_id}" if chat_id else uuid
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+async def get_summary(rds, uuid: str, chat_id: str | None = None) -> str | None:
+    return _decode(await rds.hget("summary", summary_field(uuid, chat_id)))
+
+
+async def _complete(client, prompt: str) -> str:
+    resp = await client.chat.completions.create(
+        model=settings.openai_chat_model,
+        messages=[{"role": "user", "content": prompt}],
+        max_tokens=settings.summary_max_tokens,
+    )
+    return resp.choices[0].message.content.strip()
+
+
+def _chunk_messages(
+    messages: list[tuple[str, dict, int]], budget: int
+) -> list[list[tuple[str, dict, int]]]:
+    """Split ``(id, message, tokens)`` rows into runs of at most ``budget`` tokens.
+
+    A message larger than the budget forms a chunk of its own. Chunks are
+    built greedily from the oldest message, so appending messages never
+    changes the boundaries of the earlier chunks.
+    """
+    chunks: list[list] = []
+    current: list = []
+    used = 0
+    for row in messages:
+        if current and used + row[2] > budget:
+            chunks.append(current)
+            current, used = [], 0
+        current.append(row)
+        used += row[2]
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _group_parts(parts: list[str], budget: int, count_tokens) -> list[list[str]]:
+    # every group holds at least two parts so each reduce round shrinks the list
+    groups: list[list[str]] = []
+    current: list[str] = []
+    used = 0
+    for part in parts:
+        tokens = count_tokens(part)
+        if len(current) >= 2 and used + tokens > budget:
+            groups.append(current)
+            current, used = [], 0
+        current.append(part)
+        used += tokens
+    if current:
+        if len(current) == 1 and groups:
+            groups[-1].extend(current)
+        else:
+            groups.append(current)
+    return groups
+
+
+async def _chunk_summary(rds, client, field: str, chunk: list, sem) -> str:
+    """Summarize one chunk, reusing the result cached for the same ID range."""
+    cache_key = f"summary:chunks:{field}"
+    # the message count changes if an entry inside the range was deleted
+    range_key = f"{chunk[0][0]}:{chunk[-1][0]}:{len(chunk)}"
+    cached = _decode(await rds.hget(cache_key, range_key))
+    if cached:
+        return cached
+    history = json.dumps([msg for _id, msg, _tokens in chunk], ensure_ascii=False)
+    async with sem:
+        part = await _complete(client, SUMMARY_PROMPT + history)
+    pipe = rds.pipeline(transaction=False)
+    pipe.hset(cache_key, range_key, part)
+    pipe.expire(cache_key, settings.summary_chunk_ttl)
+    await pipe.execute()
+    return part
+
+
+async def _reduce(client, parts: list[str], count_tokens, sem) -> str:
+    async def merge(group: list[str]) -> str:
+        async with sem:
+            return await _complete(client, REDUCE_PROMPT + _PART_SEPARATOR.join(group))
+
+    budget = settings.summary_chunk_tokens
+    groups = _group_parts(parts, budget, count_tokens)
+    while len(groups) > 1:
+        parts = await asyncio.gather(*(merge(group) for group in groups))
+        groups = _group_parts(parts, budget, count_tokens)
+    return await merge(groups[0])
+
+
+async def _summarize(
+    rds, client, field: str, summary: str | None, new: list, count_tokens
+) -> str:
+    chunks = _chunk_messages(new, settings.summary_chunk_tokens)
+    if len(chunks) == 1:
+        history = json.dumps([msg for _id, msg, _tokens in new], ensure_ascii=False)
+        if summary:
+            prompt = (
+                FOLD_PROMPT + f"Current summary:\n{summary}\n\nNew messages:\n{history}"
+            )
+        else:
+            prompt = SUMMARY_PROMPT + history
+        return await _complete(client, prompt)
+
+    # map: summarize the chunks concurrently; reduce: merge the partial
+    # summaries, oldest first, starting with the existing summary
+    logger.info("Summarizing %d chunks of %s", len(chunks), field)
+    sem = asyncio.Semaphore(settings.summary_concurrency)
+    partials = await asyncio.gather(
+        *(_chunk_summary(rds, client, field, chunk, sem) for chunk in chunks)
+    )
+    parts = ([summary] if summary else []) + list(partials)
+    return await _reduce(client, parts, count_tokens, sem)
+
+
+async def update_summary(
+    rds,
+    client,
+    uuid: str,
+    chat_id: str | None = None,
+    min_tokens: int = 0,
+    count_tokens=_count_llm_tokens,
+) -> tuple[str | None, int]:
+    """Fold messages newer than the stored watermark into the summary.
+
+    Only entries after ``summary:last:{field}`` are read and sent to the LLM
+    together with the current summary, so the cost of an update depends on
+    the number of new messages rather than on the length of the history.
+    New messages exceeding ``SUMMARY_CHUNK_TOKENS`` are summarized with a
+    map-reduce over token-bounded chunks. Nothing is sent while the new
+    messages hold fewer than ``min_tokens`` tokens or another update of the
+    same stream is running. Returns the current summary and the number of
+    tokens that were folded in.
+    """
+    field = summary_field(uuid, chat_id)
+    watermark_key = f"summary:last:{field}"
+    pipe = rds.pipeline(transaction=False)
+    pipe.get(watermark_key)
+    pipe.hget("summary", field)
+    watermark, summary = [_decode(v) for v in await pipe.execute()]
+
+    start = f"({watermark}" if watermark else "-"
+    entries = await rds.xrange(stream_key(uuid, chat_id), min=start)
+    if not entries:
+        return summary, 0
+    new = []
+    msgs = await decode_payloads(rds, [obj[b"data"] for _mid, obj in entries])
+    for (mid, _obj), msg in zip(entries, msgs):
+        if msg is not None and msg.content:
+            new.append(
+                (
+                    _decode(mid),
+                    {"role": msg.role, "content": msg.content},
+                    count_tokens(msg.content),
+                )
+            )
+    tokens = sum(row[2] for row in new)
+    latest_id = _decode(entries[-1][0])
+    if tokens < min_tokens:
+        return summary, 0
+
+    lock_key = f"summary:lock:{field}"
+    token = uuid_mod.uuid4().hex
+    if not await rds.set(lock_key, token, nx=True, ex=settings.summary_lock_ttl):
+        logger.info("Summary update for %s already running", field)
+        return summary, 0
+    try:
+        if new:
+            logger.info("Folding %d messages into summary of %s", len(new), field)
+            summary = await _summarize(rds, client, field, summary, new, count_tokens)
+        pipe = rds.pipeline(transaction=True)
+        if summary is not None:
+            pipe.hset("summary", field, summary)
+        pipe.set(watermark_key, latest_id)
+        # chunk summaries are only needed to resume a failed run
+        pipe.delete(f"summary:chunks:{field}")
+        await pipe.execute()
+    finally:
+        await rds.eval(_RELEASE_SCRIPT, 1, lock_key, token)
+    return summary, tokens
+
+
+__all__ = ["get_summary", "summary_field", "update_summary"]
@@ -0,0 +1,156 @@
+import json
+import logging
+
+from app.config import get_settings
+from app.embeddings import aembed_many
+from app.history_utils import decode_payloads, stream_key
+from app.vector import _vector_doc, vector_key
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+TAG_PROMPT = (
+    "Generate up to 5 short topic tags for every numbered message. Return the "
+    "arguments of set_tags with one item per message index."
+)
+# completion budget per message in a batch (the old one-message call used 30)
+_TOKENS_PER_MESSAGE = 40
+
+tag_fn = {
+    "name": "set_tags",
+    "description": "Assign topic tags to the numbered messages",
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "items": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "index": {"type": "integer"},
+                        "tags": {"type": "array", "items": {"type": "string"}},
+                    },
+                    "required": ["index", "tags"],
+                },
+            }
+        },
+        "required": ["items"],
+    },
+}
+
+
+def _normalize(tags) -> list[str]:
+    if isinstance(tags, str):
+        tags = tags.split(",")
+    out = []
+    for t in tags or []:
+        t = str(t).strip().lower().replace(" ", "_")
+        if t and t not in out:
+            out.append(t)
+    return out[:5]
+
+
+async def _request_tags(client, texts: list[str]) -> list[list[str]]:
+    """Tag ``texts`` with one tool call; returns one (maybe empty) list per text."""
+    usr = "\n".join(
+        f"{i}. {json.dumps(text, ensure_ascii=False)}" for i, text in enumerate(texts)
+    )
+    resp = await client.chat.completions.create(
+        model=settings.openai_chat_model,
+        messages=[
+            {"role": "system", "content": TAG_PROMPT},
+            {"role": "user", "content": usr},
+        ],
+        tools=[{"type": "function", "function": tag_fn}],
+        tool_choice={"type": "function", "function": {"name": "set_tags"}},
+        max_tokens=_TOKENS_PER_MESSAGE * len(texts),
+        temperature=0.2,
+    )
+    args = json.loads(resp.choices[0].message.tool_calls[0].function.arguments)
+    result: list[list[str]] = [[] for _ in texts]
+    for item in args.get("items", []):
+        try:
+            index = int(item["index"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if 0 <= index < len(texts):
+            result[index] = _normalize(item.get("tags"))
+    return result
+
+
+async def tag_messages(
+    rds,
+    client,
+    uuid: str,
+    limit: int = 20,
+    entries: list | None = None,
+    embeddings: dict[str, list[float]] | None = None,
+) -> int:
+    """Tag the latest ``limit`` untagged text messages of ``uuid``.
+
+    ``entries`` may hold the ``(id, fields)`` stream rows to consider
+    instead, e.g. a range of imported messages. ``embeddings`` maps message
+    IDs to vectors the caller already computed; only the others are embedded.
+
+    Existing tags are checked with one ``HMGET``; the untagged messages are
+    sent to the LLM in batches of ``TAG_BATCH_SIZE`` per tool call, embedded
+    with one ``encode`` call, and the tags and vector rows are written back
+    in a single pipeline. Returns the number of messages that were tagged.
+    """
+    if entries is None:
+        entries = await rds.xrevrange(stream_key(uuid), count=limit)
+    if not entries:
+        return 0
+    ids = [mid.decode() if isinstance(mid, bytes) else mid for mid, _obj in entries]
+    existing = await rds.hmget(f"user:{uuid}:msg_tags", ids)
+    untagged = [
+        (mid, obj)
+        for mid, (_id, obj), tagged in zip(ids, entries, existing)
+        if not tagged
+    ]
+    msgs = await decode_payloads(rds, [obj[b"data"] for _mid, obj in untagged])
+    todo: list[tuple[str, str]] = [
+        (mid, msg.content)
+        for (mid, _obj), msg in zip(untagged, msgs)
+        if msg is not None and msg.type == "text" and msg.content
+    ]
+    if not todo:
+        return 0
+
+    batch = max(1, settings.tag_batch_size)
+    tagged: list[tuple[str, str, list[str]]] = []
+    for start in range(0, len(todo), batch):
+        chunk = todo[start : start + batch]
+        try:
+            tags = await _request_tags(client, [text for _mid, text in chunk])
+        except Exception:
+            logger.exception("tag generation failed for %s", uuid)
+            continue
+        tagged += [(mid, text, t) for (mid, text), t in zip(chunk, tags) if t]
+    if not tagged:
+        return 0
+
+    vectors = dict(embeddings or {})
+    missing = [(mid, text) for mid, text, _tags in tagged if mid not in vectors]
+    if missing:
+        fresh = await aembed_many(rds, [text for _mid, text in missing])
+        vectors.update(zip((mid for mid, _text in missing), fresh))
+    pipe = rds.pipeline(transaction=False)
+    pipe.hset(
+        f"user:{uuid}:msg_tags",
+        mapping={mid: json.dumps(tags) for mid, _text, tags in tagged},
+    )
+    for mid, _text, tags in tagged:
+        for t in tags:
+            pipe.sadd(f"user:{uuid}:tags:{t}", mid)
+        # HSET keeps an inline payload stored next to the vector
+        pipe.hset(
+            vector_key(uuid, mid), mapping=_vector_doc(uuid, mid, vectors[mid], tags)
+        )
+    await pipe.execute()
+    logger.info("Tagged %d messages of %s", len(tagged), uuid)
+    return len(tagged)
+
+
+__all__ = ["tag_messages"]
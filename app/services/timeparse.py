@@ -0,0 +1,281 @@
+"""Rule-based parser for Russian and English time expressions.
+
+Used by the calendar extractor as a fast path in front of the LLM. It
+understands relative days ("завтра", "day after tomorrow"), weekdays
+("в пятницу", "next monday"), dates ("15.03", "2025-03-15", "15 марта",
+"March 15th"), durations ("через 2 часа", "in 30 minutes") and clock times
+("в 18:00", "at 6pm", "в 7 вечера", "noon"). Anything it cannot read
+unambiguously is left to the LLM.
+"""
+
+import re
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta
+
+# time used when a day is named without a clock time
+DEFAULT_TIME = time(9, 0)
+
+_NUMBERS = {
+    "один": 1, "одну": 1, "одна": 1, "два": 2, "две": 2, "три": 3, "четыре": 4,
+    "пять": 5, "шесть": 6, "семь": 7, "восемь": 8, "девять": 9, "десять": 10,
+    "пятнадцать": 15, "двадцать": 20, "тридцать": 30, "сорок": 40,
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10, "fifteen": 15,
+    "twenty": 20, "thirty": 30, "forty": 40,
+}  # fmt: skip
+
+_MONTHS = {
+    "январ": 1, "феврал": 2, "март": 3, "апрел": 4, "ма": 5, "июн": 6,
+    "июл": 7, "август": 8, "сентябр": 9, "октябр": 10, "ноябр": 11, "декабр": 12,
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6, "jul": 7,
+    "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12,
+}  # fmt: skip
+
+_WEEKDAYS = {
+    "понедельн": 0, "вторн": 1, "сред": 2, "четверг": 3, "пятниц": 4,
+    "суббот": 5, "воскресен": 6, "mon": 0, "tue": 1, "wed": 2, "thu": 3,
+    "fri": 4, "sat": 5, "sun": 6,
+}  # fmt: skip
+
+_PARTS_OF_DAY = {
+    "утром": time(9), "morning": time(9), "днем": time(14),
+    "afternoon": time(14), "вечером": time(19), "evening": time(19),
+    "tonight": time(20), "ночью": time(23),
+}  # fmt: skip
+
+_B = r"(?<![\w])"  # word start that also works for Cyrillic
+_E = r"(?![\w])"
+
+# the count is matched loosely ("1.5", "несколько") so that a duration that
+# cannot be read is left to the LLM instead of being parsed as something else
+_DURATION = re.compile(
+    _B + r"(?:через|in)\s+(?:(\d+(?:[.,]\d+)?|\w+)\s+)?(полчаса|half an hour|"
+    r"минут\w*|мин|minutes?|mins?|час\w*|hours?|hrs?|"
+    r"дн\w*|день|days?|недел\w*|weeks?|месяц\w*|months?)" + _E
+)
+_RELATIVE_DAY = re.compile(
+    _B + r"(послезавтра|day after tomorrow|завтра|tomorrow|сегодня|today|tonight)"
+    + _E
+)
+_WEEKDAY = re.compile(
+    _B + r"(?:(?:в|во|on)\s+)?(?:(следующ\w*|next|this|эт\w*)\s+)?"
+    r"(понедельник|вторник|сред[уа]|четверг|пятниц[уа]|суббот[уа]|воскресенье|"
+    r"monday|tuesday|wednesday|thursday|friday|saturday|sunday)" + _E
+)
+_ISO_DATE = re.compile(_B + r"(\d{4})-(\d{2})-(\d{2})" + _E)
+# "2.1.3" and the like are not dates; see _numeric_date for decimals
+_NUMERIC_DATE = re.compile(
+    r"(?<![\w.,])(\d{1,2})([./])(\d{1,2})(?:[./](\d{4}|\d{2}))?(?![\w]|[.,]\d)"
+)
+_VERSION = re.compile(_B + r"(?:верси\w*|version|ver\.?|v)\s*$")
+_MONTH_NAME = (
+    r"(январ[яь]|феврал[яь]|март[а]?|апрел[яь]|ма[яй]|июн[яь]|июл[яь]|"
+    r"август[а]?|сентябр[яь]|октябр[яь]|ноябр[яь]|декабр[яь]|"
+    r"jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|"
+    r"aug(?:ust)?|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)"
+)
+_DAY_MONTH = re.compile(
+    _B + r"(\d{1,2})(?:st|nd|rd|th|-?го)?\s+(?:of\s+)?" + _MONTH_NAME
+    + r"(?:\s+(\d{4}))?" + _E
+)
+_MONTH_DAY = re.compile(
+    _B + _MONTH_NAME + r"\s+(\d{1,2})(?:st|nd|rd|th)?(?:,?\s+(\d{4}))?" + _E
+)
+_CLOCK = re.compile(
+    _B + r"(\d{1,2}):(\d{2})(?:\s*(am|pm|a\.m\.|p\.m\.))?" + _E
+)
+# "в 18.30" / "at 6.30": dotted times need the preposition to differ from dates
+_DOTTED_CLOCK = re.compile(
+    _B + r"(?:в|at)\s+(\d{1,2})\.(\d{2})(?:\s*(am|pm|a\.m\.|p\.m\.))?" + _E
+)
+_HOUR_MARKER = re.compile(
+    _B + r"(?:(?:в|at)\s+)?(\d{1,2})\s*(?:час\w*\s+)?"
+    r"(am|pm|a\.m\.|p\.m\.|утра|дня|вечера|ночи)" + _E
+)
+_BARE_HOUR = re.compile(
+    _B + r"(?:в|at)\s+(\d{1,2})(?:\s*(?:час\w*|o'clock))?"
+    r"(?=\s*(?:$|[,!?;:]|\.(?!\d)))"
+)
+_NAMED_TIME = re.compile(_B + r"(полдень|noon|полночь|midnight)" + _E)
+_PART_OF_DAY = re.compile(_B + r"(" + "|".join(_PARTS_OF_DAY) + r")" + _E)
+
+
+@dataclass
+class TemporalMatch:
+    """A resolved time expression.
+
+    ``when`` is naive and in the same frame as the ``now`` passed to
+    :func:`parse_temporal`. ``explicit_time`` is false when only a day was
+    named and ``DEFAULT_TIME`` was filled in.
+    """
+
+    when: datetime
+    explicit_time: bool
+
+
+def _number(token: str | None) -> int | None:
+    if not token:
+        return 1
+    return int(token) if token.isdigit() else _NUMBERS.get(token)
+
+
+def _lookup(table: dict, word: str) -> int:
+    # longest prefix wins so "ма" (May) does not shadow "март"
+    for prefix in sorted(table, key=len, reverse=True):
+        if word.startswith(prefix):
+            return table[prefix]
+    raise KeyError(word)
+
+
+def _blank(text: str, m: re.Match) -> str:
+    return text[: m.start()] + " " * (m.end() - m.start()) + text[m.end() :]
+
+
+def _hour(hour: int, marker: str | None) -> int:
+    if marker in ("pm", "p.m.", "дня", "вечера") and hour < 12:
+        return hour + 12
+    if marker in ("am", "a.m.", "утра", "ночи") and hour == 12:
+        return 0
+    return hour
+
+
+def _parse_time(text: str) -> tuple[time | None, str]:
+    m = _CLOCK.search(text)
+    if m:
+        hour, minute = _hour(int(m.group(1)), m.group(3)), int(m.group(2))
+        if hour < 24 and minute < 60:
+            return time(hour, minute), _blank(text, m)
+    m = _DOTTED_CLOCK.search(text)
+    if m:
+        hour, minute = _hour(int(m.group(1)), m.group(3)), int(m.group(2))
+        if hour < 24 and minute < 60:
+            return time(hour, minute), _blank(text, m)
+    m = _HOUR_MARKER.search(text)
+    if m and int(m.group(1)) <= 12:
+        return time(_hour(int(m.group(1)), m.group(2))), _blank(text, m)
+    m = _BARE_HOUR.search(text)
+    if m and int(m.group(1)) < 24:
+        return time(int(m.group(1))), _blank(text, m)
+    m = _NAMED_TIME.search(text)
+    if m:
+        return time(12 if m.group(1) in ("полдень", "noon") else 0), _blank(text, m)
+    m = _PART_OF_DAY.search(text)
+    if m:
+        return _PARTS_OF_DAY[m.group(1)], text
+    return None, text
+
+
+def _date(year: int, month: int, day: int):
+    try:
+        return datetime(year, month, day).date()
+    except ValueError:
+        return None
+
+
+def _parse_date(text: str, now: datetime):
+    """Return ``(date, weekday_offset_was_zero)`` for the first date found."""
+    today = now.date()
+    m = _RELATIVE_DAY.search(text)
+    if m:
+        word = m.group(1)
+        if word in ("послезавтра", "day after tomorrow"):
+            return today + timedelta(days=2), False
+        if word in ("завтра", "tomorrow"):
+            return today + timedelta(days=1), False
+        return today, False
+    m = _WEEKDAY.search(text)
+    if m:
+        ahead = (_lookup(_WEEKDAYS, m.group(2)) - today.weekday()) % 7
+        if ahead == 0 and m.group(1) and m.group(1).startswith(("следующ", "next")):
+            ahead = 7
+        return today + timedelta(days=ahead), ahead == 0
+    m = _ISO_DATE.search(text)
+    if m:
+        return _date(*(int(g) for g in m.groups())), False
+    for pattern, day_group, month_group, year_group in (
+        (_DAY_MONTH, 1, 2, 3),
+        (_MONTH_DAY, 2, 1, 3),
+    ):
+        m = pattern.search(text)
+        if m:
+            month = _lookup(_MONTHS, m.group(month_group))
+            return _resolve_year(
+                today, m.group(year_group), month, int(m.group(day_group))
+            ), False
+    m = _NUMERIC_DATE.search(text)
+    if m:
+        return _numeric_date(text, m, today), False
+    return None, False
+
+
+def _numeric_date(text: str, m: re.Match, today):
+    """Read "15.03" / "15/03/2025" unless it looks like a decimal or version.
+
+    A dotted date needs a two-digit month ("1.5" is a number, "1.05" a date)
+    and must not follow a word like "версия" or "v".
+    """
+    day, sep, month, year = m.groups()
+    if sep == "." and len(month) == 1 and not year:
+        return None
+    if _VERSION.search(text[: m.start()]):
+        return None
+    return _resolve_year(today, year, int(month), int(day))
+
+
+def _resolve_year(today, year: str | None, month: int, day: int):
+    if year:
+        return _date(int(year) + (2000 if len(year) == 2 else 0), month, day)
+    date = _date(today.year, month, day)
+    # a date without a year that already passed means next year
+    if date and date < today:
+        date = _date(today.year + 1, month, day)
+    return date
+
+
+def parse_temporal(text: str, now: datetime) -> TemporalMatch | None:
+    """Find the first time expression in ``text`` relative to ``now``.
+
+    ``now`` should be naive local time of the user; the result is in the
+    same frame. Returns ``None`` when no expression is recognised.
+    """
+    low = text.lower().replace("ё", "е")
+    m = _DURATION.search(low)
+    day_shift = None
+    if m:
+        count, unit = _number(m.group(1)), m.group(2)
+        if count is None:
+            # "через 1,5 часа", "in a few days": not worth guessing
+            return None
+        if unit in ("полчаса", "half an hour"):
+            return TemporalMatch(now + timedelta(minutes=30), True)
+        if unit.startswith(("мин", "min")):
+            return TemporalMatch(now + timedelta(minutes=count), True)
+        if unit.startswith(("час", "hour", "hr")):
+            return TemporalMatch(now + timedelta(hours=count), True)
+        if unit.startswith(("недел", "week")):
+            day_shift = 7 * count
+        elif unit.startswith(("месяц", "month")):
+            day_shift = 30 * count
+        else:
+            day_shift = count
+        low = _blank(low, m)
+
+    clock, rest = _parse_time(low)
+    if day_shift is not None:
+        date, same_weekday = now.date() + timedelta(days=day_shift), False
+    else:
+        date, same_weekday = _parse_date(rest, now)
+    if date is None and clock is None:
+        return None
+    if date is None:
+        when = datetime.combine(now.date(), clock)
+        if when <= now:
+            when += timedelta(days=1)
+        return TemporalMatch(when, True)
+    when = datetime.combine(date, clock or DEFAULT_TIME)
+    if same_weekday and when <= now:
+        when += timedelta(days=7)
+    return TemporalMatch(when, clock is not None)
+
+
+__all__ = ["DEFAULT_TIME", "TemporalMatch", "parse_temporal"]
@@ -1,14 +1,19 @@
-import aioboto3
+from functools import lru_cache
 from app.config import get_settings
 import logging
 
 logger = logging.getLogger(__name__)
 
 settings = get_settings()
-session = aioboto3.Session()
+
+@lru_cache
+def _session():
+    import aioboto3
+
+    return aioboto3.Session()
 
 async def upload_file(obj: bytes, key: str, content_type: str) -> str:
-    async with session.client(
+    async with _session().client(
         "s3",
         endpoint_url=f"http://{settings.minio_endpoint}",
         aws_secret_access_key=settings.minio_secret_key,
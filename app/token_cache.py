@@ -0,0 +1,94 @@
+import asyncio
+import logging
+from functools import lru_cache
+
+from app.cache import LRUCache
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+# channel used to evict token entries from the caches of all API processes
+INVALIDATION_CHANNEL = "auth:invalidate"
+# keyspace notifications for the token keys, delivered when the server runs
+# with ``notify-keyspace-events`` enabled (covers expirations as well)
+_KEYSPACE_PATTERNS = ("__keyspace@*__:token:*", "__keyspace@*__:company_token:*")
+
+
+@lru_cache
+def token_cache() -> LRUCache:
+    """Resolved tokens keyed by their Redis key.
+
+    ``token:{token}`` maps to the verified ``(username, company_id)`` pair,
+    ``company_token:{token}`` to the company name and ``identity:{username}``
+    to the company the user was verified against.
+    """
+    return LRUCache(maxsize=settings.token_cache_size, ttl=settings.token_cache_ttl)
+
+
+def evict(key: str) -> None:
+    token_cache().pop(key)
+
+
+async def invalidate(rds, *keys: str) -> None:
+    """Evict ``keys`` locally and tell the other processes to do the same."""
+    for key in keys:
+        evict(key)
+        try:
+            await rds.publish(INVALIDATION_CHANNEL, key)
+        except Exception:
+            logger.exception("Failed to publish token invalidation")
+
+
+def _key_from_message(message: dict) -> str | None:
+    channel = message.get("channel")
+    data = message.get("data")
+    if isinstance(channel, bytes):
+        channel = channel.decode()
+    if isinstance(data, bytes):
+        data = data.decode()
+    if message.get("type") == "pmessage":
+        # __keyspace@0__:token:abc -> token:abc
+        return channel.split("__:", 1)[1] if channel and "__:" in channel else None
+    if message.get("type") == "message":
+        return data
+    return None
+
+
+async def listen_for_invalidations(rds) -> None:
+    """Evict cache entries announced on the invalidation channel.
+
+    Runs until cancelled and reconnects after connection errors. The whole
+    cache is cleared on every (re)subscribe because messages published while
+    disconnected are lost.
+    """
+    while True:
+        pubsub = rds.pubsub()
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            await pubsub.psubscribe(*_KEYSPACE_PATTERNS)
+            token_cache().clear()
+            async for message in pubsub.listen():
+                key = _key_from_message(message)
+                if key:
+                    evict(key)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Token invalidation listener failed, retrying")
+            await asyncio.sleep(1)
+        finally:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
+
+
+__all__ = [
+    "INVALIDATION_CHANNEL",
+    "evict",
+    "invalidate",
+    "listen_for_invalidations",
+    "token_cache",
+]
@@ -0,0 +1,26 @@
+import logging
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache
+def _encoding():
+    try:
+        from tiktoken import get_encoding
+
+        return get_encoding("cl100k_base")
+    except Exception:  # pragma: no cover - optional dependency
+        logger.warning("tiktoken unavailable, using fallback token counter")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Count ``cl100k_base`` tokens, or words when tiktoken is unavailable."""
+    enc = _encoding()
+    if enc is None:
+        return len(text.split())
+    return len(enc.encode(text))
+
+
+__all__ = ["count_tokens"]
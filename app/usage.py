@@ -5,6 +5,7 @@ from app.config import Settings, get_settings
 __all__ = [
     "increment_messages",
     "increment_tokens",
+    "queue_usage",
     "get_usage",
     "get_user_usage",
     "calculate_cost",
@@ -30,6 +31,24 @@ async def increment_tokens(
         await rds.incrby(f"company:{company_id}:user:{user_id}:usage:tokens", count)
 
 
+def queue_usage(
+    pipe,
+    company_id: str,
+    messages: int = 0,
+    tokens: int = 0,
+    user_id: str | None = None,
+) -> None:
+    """Queue usage counter increments on a Redis pipeline without executing it."""
+    if messages:
+        pipe.incrby(f"company:{company_id}:usage:messages", messages)
+        if user_id:
+            pipe.incrby(f"company:{company_id}:user:{user_id}:usage:messages", messages)
+    if tokens:
+        pipe.incrby(f"company:{company_id}:usage:tokens", tokens)
+        if user_id:
+            pipe.incrby(f"company:{company_id}:user:{user_id}:usage:tokens", tokens)
+
+
 async def get_usage(rds, company_id: str) -> Dict[str, int]:
     """Return usage counters for a company."""
     msgs = await rds.get(f"company:{company_id}:usage:messages") or 0
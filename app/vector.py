@@ -1,41 +1,49 @@
+from __future__ import annotations
+
 import logging
+from typing import TYPE_CHECKING
 
 import numpy as np
-from redisvl.index import AsyncSearchIndex
-from redisvl.query import VectorQuery
-from redisvl.query.filter import Tag
-from redisvl.schema import IndexSchema
 
 from app.config import get_settings
 from app.embeddings import embedding_dimension
+from app.redis_pool import get_client
+
+if TYPE_CHECKING:
+    from redisvl.index import AsyncSearchIndex
 
 logger = logging.getLogger(__name__)
 
 settings = get_settings()
 
 ALGO = settings.redis_index_algorithm
-_SCHEMA_DICT = {
-    "index": {
-        "name": "history_vectors",
-        "prefix": "history_vectors",
-        "storage_type": "hash",
-    },
-    "fields": [
-        {"name": "uuid", "type": "tag"},
-        {"name": "message_id", "type": "tag"},
-        {"name": "tags", "type": "tag"},
-        {
-            "name": "embedding",
-            "type": "vector",
-            "attrs": {
-                "algorithm": ALGO,
-                "datatype": "float32",
-                "dims": embedding_dimension(),
-                "distance_metric": "cosine",
-            },
+
+
+def _schema_dict() -> dict:
+    # built on first use so importing this module never loads the model
+    return {
+        "index": {
+            "name": "history_vectors",
+            "prefix": "history_vectors",
+            "storage_type": "hash",
         },
-    ],
-}
+        "fields": [
+            {"name": "uuid", "type": "tag"},
+            {"name": "message_id", "type": "tag"},
+            {"name": "tags", "type": "tag"},
+            {
+                "name": "embedding",
+                "type": "vector",
+                "attrs": {
+                    "algorithm": ALGO,
+                    "datatype": "float32",
+                    "dims": embedding_dimension(),
+                    "distance_metric": "cosine",
+                },
+            },
+        ],
+    }
+
 
 _idx: AsyncSearchIndex | None = None
 
@@ -43,46 +51,137 @@ _idx: AsyncSearchIndex | None = None
 async def _index() -> AsyncSearchIndex:
     global _idx
     if _idx is None:
+        from redisvl.index import AsyncSearchIndex
+        from redisvl.schema import IndexSchema
+
         logger.info("Creating vector index")
-        schema = IndexSchema.from_dict(_SCHEMA_DICT)
-        _idx = AsyncSearchIndex(schema, redis_url=settings.redis_url)
+        schema = IndexSchema.from_dict(_schema_dict())
+        _idx = AsyncSearchIndex(schema, redis_client=get_client())
         await _idx.create(overwrite=False)
     return _idx
 
 
-async def upsert_embedding(
+def vector_key(uuid: str, message_id: str) -> str:
+    """Key of the hash holding the vector row of ``uuid``'s ``message_id``.
+
+    Stream IDs are only unique within a stream, so the user is part of it.
+    """
+    return f"history_vectors:{uuid}:{message_id}"
+
+
+def _vector_doc(
     uuid: str,
     message_id: str,
     embedding: list[float],
     tags: list[str] | None = None,
-) -> None:
-    logger.debug("Upserting embedding for %s", message_id)
-    idx = await _index()
+    blob: bytes | None = None,
+    stream: str | None = None,
+) -> dict:
     vec_bytes = np.asarray(embedding, dtype=np.float32).tobytes()
     doc = {"uuid": uuid, "message_id": message_id, "embedding": vec_bytes}
     if tags:
         doc["tags"] = ",".join(tags)
-    await idx.load([doc], id_field="message_id")
+    # inline payload mode: the stored (encrypted) stream entry and its stream
+    # key live next to the vector so search results need no stream lookup.
+    # Not called "payload": redis-py passes that name to Document itself.
+    if blob is not None:
+        doc["blob"] = blob
+    if stream is not None:
+        doc["stream"] = stream
+    return doc
 
 
-async def semantic_search(
+async def upsert_embedding(
     uuid: str,
-    query_embedding: list[float],
-    k: int = 5,
+    message_id: str,
+    embedding: list[float],
     tags: list[str] | None = None,
-) -> list[str]:
-    logger.debug("Semantic search for %s", uuid)
+) -> None:
+    logger.debug("Upserting embedding for %s", message_id)
+    idx = await _index()
+    await idx.load(
+        [_vector_doc(uuid, message_id, embedding, tags)],
+        keys=[vector_key(uuid, message_id)],
+    )
+
+
+async def upsert_embeddings(items: list[dict]) -> None:
+    """Load several rows in one call.
+
+    Each item holds the keyword arguments of :func:`_vector_doc`.
+    """
+    if not items:
+        return
+    logger.debug("Upserting %d embeddings", len(items))
+    idx = await _index()
+    await idx.load(
+        [_vector_doc(**item) for item in items],
+        keys=[vector_key(item["uuid"], item["message_id"]) for item in items],
+    )
+
+
+async def _search(
+    uuid: str,
+    query_embedding: list[float],
+    k: int,
+    tags: list[str] | None,
+    return_fields: list[str],
+    raw_fields: tuple[str, ...] = (),
+) -> list[dict]:
+    """Run a KNN query; ``raw_fields`` are returned as bytes, not decoded."""
+    from redisvl.query import VectorQuery
+    from redisvl.query.filter import Tag
+
     idx = await _index()
     qvec = np.asarray(query_embedding, dtype=np.float32).tobytes()
     query = VectorQuery(
         vector=qvec,
         vector_field_name="embedding",
         num_results=k,
-        return_fields=["message_id"],
+        return_fields=return_fields,
     )
+    for field in raw_fields:
+        query.return_field(field, decode_field=False)
     flt = Tag("uuid") == uuid
     if tags:
         flt &= Tag("tags").any(tags)
     query.set_filter(flt)
-    results = await idx.query(query)
+    return await idx.query(query)
+
+
+async def semantic_search(
+    uuid: str,
+    query_embedding: list[float],
+    k: int = 5,
+    tags: list[str] | None = None,
+) -> list[str]:
+    logger.debug("Semantic search for %s", uuid)
+    results = await _search(uuid, query_embedding, k, tags, ["message_id"])
     return [r["message_id"] for r in results]
+
+
+async def semantic_search_payloads(
+    uuid: str,
+    query_embedding: list[float],
+    k: int = 5,
+    tags: list[str] | None = None,
+) -> list[dict]:
+    """Semantic search returning the inline payload of every hit.
+
+    Each result holds ``message_id`` plus ``blob`` (the raw stream entry),
+    ``stream`` and ``tags`` (``None`` when the vector has no inline payload
+    yet), so the hits can be decoded from a single ``FT.SEARCH`` round trip.
+    """
+    logger.debug("Semantic payload search for %s", uuid)
+    results = await _search(
+        uuid, query_embedding, k, tags, ["message_id", "stream", "tags"], ("blob",)
+    )
+    return [
+        {
+            "message_id": r["message_id"],
+            "blob": r.get("blob"),
+            "stream": r.get("stream"),
+            "tags": r.get("tags"),
+        }
+        for r in results
+    ]
@@ -0,0 +1,31 @@
+"""Helpers shared by the benchmark scripts."""
+
+import os
+import sys
+
+from redis import asyncio as redis
+from redis.asyncio.connection import Connection
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+DEFAULT_REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+
+class CountingConnection(Connection):
+    """Connection that counts the packets written to Redis (one per round trip)."""
+
+    round_trips = 0
+
+    async def send_packed_command(self, command, check_health=True):
+        CountingConnection.round_trips += 1
+        await super().send_packed_command(command, check_health)
+
+
+def counting_client(url: str = DEFAULT_REDIS_URL) -> redis.Redis:
+    pool = redis.ConnectionPool.from_url(url, connection_class=CountingConnection)
+    return redis.Redis(connection_pool=pool)
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
@@ -0,0 +1,98 @@
+"""Benchmark the Redis write path of ``POST /add``.
+
+Compares the legacy per-command write path (one awaited command per step)
+with the pipelined ``_add_messages_to_stream`` batch for 1, 10 and 100
+message batches. Round trips are counted at the connection level.
+
+Requires a running Redis (``REDIS_URL``)::
+
+    python benchmarks/bench_add_history.py --iterations 200
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import datetime
+
+from _common import (
+    DEFAULT_REDIS_URL,
+    CountingConnection,
+    counting_client,
+    percentile,
+)
+
+from app.encryption import encrypt_text
+from app.history_utils import _add_messages_to_stream, stream_key
+from app.models import Message
+
+
+async def legacy_add(rds, uuid: str, company: str, msgs: list[Message]) -> list:
+    """Replicates the pre-pipeline command sequence of ``add_history``."""
+    for feature in ("enable_summary", "enable_facts", "enable_calendar"):
+        await rds.hget(f"company:{company}:data", feature)
+    await rds.hget(f"user:{uuid}:data", "company_id")
+    await rds.set(f"user:{uuid}:last_seen", int(datetime.utcnow().timestamp()))
+    skey = stream_key(uuid)
+    ids = []
+    for msg in msgs:
+        ids.append(await rds.xadd(skey, {"data": encrypt_text(msg.model_dump_json())}))
+        await rds.sadd("calendar:streams", skey)
+        await rds.hincrby(f"user:{uuid}:stats:role", msg.role, 1)
+        await rds.hincrby(f"user:{uuid}:stats:type", msg.type, 1)
+    await rds.incrby(f"company:{company}:usage:messages", len(msgs))
+    await rds.incrby(f"company:{company}:user:{uuid}:usage:messages", len(msgs))
+    await rds.incrby(f"company:{company}:usage:tokens", len(msgs))
+    await rds.incrby(f"company:{company}:user:{uuid}:usage:tokens", len(msgs))
+    await rds.xlen(skey)
+    return ids
+
+
+async def batched_add(rds, uuid: str, company: str, msgs: list[Message]) -> list:
+    await rds.hmget(
+        f"company:{company}:data", ["enable_summary", "enable_facts", "enable_calendar"]
+    )
+    await rds.hget(f"user:{uuid}:data", "company_id")
+    ids, _length = await _add_messages_to_stream(
+        rds,
+        uuid,
+        msgs,
+        company=company,
+        tokens=len(msgs),
+        last_seen=int(datetime.utcnow().timestamp()),
+    )
+    return ids
+
+
+async def measure(rds, fn, batch: int, iterations: int) -> tuple[float, float, float]:
+    msgs = [Message(role="user", content=f"benchmark message {i}") for i in range(batch)]
+    uuid = f"bench-{fn.__name__}-{batch}"
+    timings = []
+    CountingConnection.round_trips = 0
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await fn(rds, uuid, "bench", msgs)
+        timings.append((time.perf_counter() - start) * 1000)
+    trips = CountingConnection.round_trips / iterations
+    await rds.delete(stream_key(uuid))
+    return trips, statistics.median(timings), percentile(timings, 99)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--redis-url", default=DEFAULT_REDIS_URL)
+    args = parser.parse_args()
+
+    rds = counting_client(args.redis_url)
+    print(f"{'batch':>5} {'path':>8} {'round trips':>12} {'p50 ms':>8} {'p99 ms':>8}")
+    for batch in (1, 10, 100):
+        for fn in (legacy_add, batched_add):
+            trips, p50, p99 = await measure(rds, fn, batch, args.iterations)
+            name = fn.__name__.split("_")[0]
+            print(f"{batch:>5} {name:>8} {trips:>12.0f} {p50:>8.2f} {p99:>8.2f}")
+    await rds.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,119 @@
+"""Benchmark the throughput of ``POST /bulk_import`` against ``POST /add``.
+
+Generates ``--messages`` chat messages as an NDJSON body (gzip-compressed
+with ``--gzip``) and stores them in a fresh stream
+
+- one message per ``_add_messages_to_stream`` call, the Redis work of a
+  client replaying the history through ``POST /add``,
+- with ``import_messages`` reading the body in 64 KiB chunks, for each
+  ``--chunks`` size,
+
+and prints messages per second and Redis round trips. Embedding and tagging
+are not included: ``/add`` queues them per message and the import defers
+them to a worker.
+
+Requires a running Redis (``REDIS_URL``)::
+
+    python benchmarks/bench_bulk_import.py --messages 20000 --gzip
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from _common import DEFAULT_REDIS_URL, CountingConnection, counting_client
+
+from app.history_utils import _add_messages_to_stream
+from app.models import Message
+from app.services import bulk_import
+
+UUID = "bench-import"
+COMPANY = "bench"
+PHRASES = [
+    "Привет! Как дела с отчётом по продажам за прошлый месяц?",
+    "Созвон перенесли на завтра в 15:00, ссылка та же.",
+    "Hi, the deployment finished and all health checks are green.",
+    "Let's move the review to Thursday, I'm out on Wednesday.",
+]
+
+
+def ndjson(count: int) -> bytes:
+    rng = random.Random(0)
+    start = datetime(2023, 1, 1)
+    lines = []
+    for i in range(count):
+        lines.append(
+            json.dumps(
+                {
+                    "role": rng.choice(["user", "assistant"]),
+                    "content": " ".join(rng.choices(PHRASES, k=rng.randint(1, 3))),
+                    "ts": (start + timedelta(seconds=30 * i)).isoformat(),
+                },
+                ensure_ascii=False,
+            )
+        )
+    return "\n".join(lines).encode()
+
+
+async def chunked(data: bytes, size: int = 64 * 1024):
+    for i in range(0, len(data), size):
+        yield data[i : i + size]
+
+
+async def reset(rds) -> None:
+    await rds.delete(f"user:{UUID}:history", "import:bench")
+
+
+async def per_message(rds, data: bytes) -> int:
+    lines = data.splitlines()
+    for line in lines:
+        await _add_messages_to_stream(
+            rds, UUID, [Message.model_validate_json(line)], company=COMPANY
+        )
+    return len(lines)
+
+
+async def bulk(rds, body: bytes, size: int) -> int:
+    bulk_import.settings.bulk_import_chunk = size
+    result = await bulk_import.import_messages(
+        rds, UUID, COMPANY, bulk_import.iter_lines(chunked(body)), import_id="bench"
+    )
+    return result["imported"]
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--chunks", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--gzip", action="store_true")
+    parser.add_argument("--redis-url", default=DEFAULT_REDIS_URL)
+    args = parser.parse_args()
+
+    rds = counting_client(args.redis_url)
+    data = ndjson(args.messages)
+    body = gzip.compress(data) if args.gzip else data
+    print(f"body: {len(body) / 1024:.0f} KiB{' (gzip)' if args.gzip else ''}")
+    print(f"{'path':>14} {'msg/s':>10} {'round trips':>12}")
+    runs = [("add", lambda: per_message(rds, data))]
+    for size in args.chunks:
+        runs.append((f"bulk {size}", lambda size=size: bulk(rds, body, size)))
+    for name, run in runs:
+        await reset(rds)
+        CountingConnection.round_trips = 0
+        start = time.perf_counter()
+        count = await run()
+        elapsed = time.perf_counter() - start
+        print(
+            f"{name:>14} {count / elapsed:>10.0f} "
+            f"{CountingConnection.round_trips:>12}"
+        )
+    await reset(rds)
+    await rds.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,96 @@
+"""Benchmark the message compression codecs on chat-sized texts.
+
+For every available codec (and zstd with a dictionary trained on a
+synthetic corpus when ``zstandard`` is installed) and message sizes typical
+for chat, prints the stored size relative to the raw UTF-8 text, both for
+the base64 content alone and for the whole Fernet-encrypted message JSON,
+together with the encode and decode time per message.
+
+No Redis is required::
+
+    python benchmarks/bench_compression.py --iterations 2000
+"""
+
+import argparse
+import json
+import random
+import time
+
+import _common  # noqa: F401  (adds the repository root to sys.path)
+from cryptography.fernet import Fernet
+
+from app import compression
+from app.history_utils import _compress_text, _decompress_text
+
+SIZES = (200, 500, 1000, 4000)
+PHRASES = [
+    "Привет! Как дела с отчётом по продажам за прошлый месяц?",
+    "Созвон перенесли на завтра в 15:00, ссылка та же.",
+    "Можешь прислать обновлённую презентацию для клиента?",
+    "Напомни, пожалуйста, какие задачи остались в спринте.",
+    "Hi, the deployment finished and all health checks are green.",
+    "Let's move the review to Thursday, I'm out on Wednesday.",
+    "Я проверил логи, ошибка воспроизводится только на staging.",
+    "Thanks! I'll update the ticket and ping the team in the channel.",
+    "Счёт оплачен, закрывающие документы пришлём до конца недели.",
+    "Can you share the numbers for the Q3 forecast before the call?",
+]
+
+
+def message(rng: random.Random, size: int) -> str:
+    parts = []
+    while sum(len(p) + 1 for p in parts) < size:
+        parts.append(rng.choice(PHRASES))
+    return " ".join(parts)[:size]
+
+
+def timed(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    fernet = Fernet(Fernet.generate_key())
+    variants = [(name, None) for name in compression.available_codecs()]
+    if "zstd" in compression.available_codecs():
+        corpus = [message(rng, rng.choice(SIZES)).encode() for _ in range(2000)]
+        dict_id, raw = compression.train_dictionary(corpus, compression.DICT_SIZE)
+        compression.add_dictionary(dict_id, raw)
+        variants.append(("zstd", dict_id))
+    missing = {"gzip", "zstd", "lz4", "none"} - set(compression.available_codecs())
+    if missing:
+        print(f"skipped (package not installed): {', '.join(sorted(missing))}")
+
+    print(
+        f"{'codec':>10} {'chars':>6} {'content x':>10} {'stored x':>9} "
+        f"{'encode us':>10} {'decode us':>10}"
+    )
+    for size in SIZES:
+        text = message(rng, size)
+        raw_len = len(text.encode())
+        for name, dict_id in variants:
+            label = f"{name}+dict" if dict_id else name
+            packed = _compress_text(text, name, dict_id)
+            extra = {"compressed": True, "compress_algo": name}
+            doc = json.dumps({"role": "user", "content": packed, "extra": extra})
+            stored = fernet.encrypt(doc.encode())
+            encode = timed(lambda: _compress_text(text, name, dict_id), args.iterations)
+            decode = timed(
+                lambda: _decompress_text(packed, name, dict_id), args.iterations
+            )
+            print(
+                f"{label:>10} {size:>6} {len(packed) / raw_len:>10.2f} "
+                f"{len(stored) / raw_len:>9.2f} "
+                f"{encode:>10.1f} {decode:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
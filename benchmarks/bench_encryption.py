@@ -0,0 +1,107 @@
+"""Benchmark message encryption: Fernet over JSON against AES-GCM envelopes.
+
+Encodes and decodes ``--messages`` chat messages (1k by default) with
+
+- ``fernet``: the legacy format, Fernet over the whole message JSON,
+- ``aesgcm``: the binary envelope with everything encrypted
+  (``ENCRYPTION_MODE=message``),
+- ``fields``: the binary envelope with the routing metadata in the clear
+  (``ENCRYPTION_MODE=fields``),
+
+and prints the time per 1k messages to encode, to decode one by one and to
+decode with the batched ``decode_payloads``, plus the time to read just the
+role of every message (which ``fields`` does without decrypting).
+
+No Redis is required. A random ``ENCRYPTION_KEY`` is used unless one is
+set::
+
+    python benchmarks/bench_encryption.py --messages 1000 --repeat 5
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import time
+
+from cryptography.fernet import Fernet
+
+os.environ.setdefault("ENCRYPTION_KEY", Fernet.generate_key().decode())
+
+import _common  # noqa: F401,E402  (adds the repository root to sys.path)
+
+from app.encryption import decrypt_text, encrypt_text  # noqa: E402
+from app.envelope import pack_message, peek_fields  # noqa: E402
+from app.history_utils import _decode_data, decode_payloads  # noqa: E402
+from app.models import Message  # noqa: E402
+
+PHRASES = [
+    "Привет! Как дела с отчётом по продажам за прошлый месяц?",
+    "Созвон перенесли на завтра в 15:00, ссылка та же.",
+    "Hi, the deployment finished and all health checks are green.",
+    "Let's move the review to Thursday, I'm out on Wednesday.",
+    "Счёт оплачен, закрывающие документы пришлём до конца недели.",
+]
+
+
+def messages(count: int) -> list[Message]:
+    rng = random.Random(0)
+    return [
+        Message(
+            role=rng.choice(["user", "assistant"]),
+            content=" ".join(rng.choices(PHRASES, k=rng.randint(1, 4))),
+            importance=rng.randint(0, 3),
+        )
+        for _ in range(count)
+    ]
+
+
+def timed(fn, repeat: int, scale: float) -> float:
+    """Best of ``repeat`` runs, in milliseconds per 1k messages."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000 * scale
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    msgs = messages(args.messages)
+    scale = 1000 / len(msgs)
+    formats = {
+        "fernet": (
+            lambda m: encrypt_text(m.model_dump_json()).encode(),
+            lambda d: Message.model_validate_json(decrypt_text(d.decode())).role,
+        ),
+        "aesgcm": (lambda m: pack_message(m), lambda d: _decode_data(d).role),
+        "fields": (lambda m: pack_message(m, True), lambda d: peek_fields(d)["role"]),
+    }
+    print(
+        f"{'format':>8} {'bytes/msg':>10} {'encode ms':>10} {'decode ms':>10} "
+        f"{'batch ms':>9} {'role ms':>8}   (per 1k messages)"
+    )
+    for name, (encode, role) in formats.items():
+        payloads = [encode(m) for m in msgs]
+        decoded = asyncio.run(decode_payloads(None, payloads))
+        assert [m.content for m in decoded] == [m.content for m in msgs]
+        size = sum(len(p) for p in payloads) / len(payloads)
+        enc = timed(lambda: [encode(m) for m in msgs], args.repeat, scale)
+        dec = timed(lambda: [_decode_data(p) for p in payloads], args.repeat, scale)
+        batch = timed(
+            lambda: asyncio.run(decode_payloads(None, payloads)), args.repeat, scale
+        )
+        roles = timed(lambda: [role(p) for p in payloads], args.repeat, scale)
+        print(
+            f"{name:>8} {size:>10.0f} {enc:>10.2f} {dec:>10.2f} "
+            f"{batch:>9.2f} {roles:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Benchmark the binary stream entry format against the legacy one.
+
+Writes a history of ``--messages`` messages (by default 10k: mostly short
+chat lines, every third one long enough to be gzip-compressed) once as
+legacy entries (Fernet over the message JSON with base64 content) and once
+as binary envelopes, then reports per format:
+
+- stored bytes per message (``MEMORY USAGE`` of the stream / messages),
+- encode time per message,
+- time to read and decode the whole history and the last 20 messages
+  (what ``GET /history`` does).
+
+Requires a running Redis (``REDIS_URL``). A random ``ENCRYPTION_KEY`` is
+used unless one is set::
+
+    python benchmarks/bench_envelope.py --messages 10000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import time
+
+from cryptography.fernet import Fernet
+
+os.environ.setdefault("ENCRYPTION_KEY", Fernet.generate_key().decode())
+
+from _common import DEFAULT_REDIS_URL, counting_client  # noqa: E402
+
+from app.encryption import encrypt_text  # noqa: E402
+from app.history_utils import (  # noqa: E402
+    _compress_text,
+    _decode_message,
+    encode_message,
+)
+from app.models import Message  # noqa: E402
+
+KEY = "bench:envelope:{}"
+WORDS = (
+    "встреча отчёт клиент договор завтра сегодня проект задача срок деплой "
+    "review meeting deadline release ticket update please thanks check"
+).split()
+
+
+def history(count: int) -> list[Message]:
+    rng = random.Random(0)
+    msgs = []
+    for i in range(count):
+        words = rng.randint(150, 300) if i % 3 == 0 else rng.randint(5, 20)
+        text = " ".join(rng.choice(WORDS) for _ in range(words))
+        extra = None
+        if len(text) > 500:
+            extra = {"compressed": True, "compress_algo": "gzip"}
+        msgs.append(
+            Message(role=rng.choice(["user", "assistant"]), content=text, extra=extra)
+        )
+    return msgs
+
+
+def legacy_encode(msg: Message) -> str:
+    """What ``encode_message`` stored before the binary format."""
+    if msg.extra and msg.extra.get("compressed"):
+        msg = msg.model_copy(
+            update={"content": _compress_text(msg.content, "gzip")}
+        )
+    return encrypt_text(msg.model_dump_json())
+
+
+async def write(rds, key: str, payloads: list) -> None:
+    await rds.delete(key)
+    for i in range(0, len(payloads), 1000):
+        pipe = rds.pipeline(transaction=False)
+        for data in payloads[i : i + 1000]:
+            pipe.xadd(key, {"data": data})
+        await pipe.execute()
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--redis-url", default=DEFAULT_REDIS_URL)
+    args = parser.parse_args()
+
+    rds = counting_client(args.redis_url)
+    msgs = history(args.messages)
+    print(
+        f"{'format':>8} {'bytes/msg':>10} {'encode us':>10} "
+        f"{'read all ms':>12} {'read 20 ms':>11}"
+    )
+    for name, encode in (("legacy", legacy_encode), ("binary", encode_message)):
+        key = KEY.format(name)
+        start = time.perf_counter()
+        payloads = [encode(m) for m in msgs]
+        encode_us = (time.perf_counter() - start) / len(msgs) * 1e6
+        await write(rds, key, payloads)
+        size = await rds.memory_usage(key, samples=0)
+
+        start = time.perf_counter()
+        decoded = [_decode_message(obj) for _mid, obj in await rds.xrange(key)]
+        read_all = (time.perf_counter() - start) * 1000
+        assert [m.content for m in decoded] == [m.content for m in msgs]
+
+        start = time.perf_counter()
+        for _ in range(100):
+            [_decode_message(obj) for _mid, obj in await rds.xrevrange(key, count=20)]
+        read_20 = (time.perf_counter() - start) * 10
+        print(
+            f"{name:>8} {size / len(msgs):>10.0f} {encode_us:>10.1f} "
+            f"{read_all:>12.1f} {read_20:>11.2f}"
+        )
+        await rds.delete(key)
+    await rds.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
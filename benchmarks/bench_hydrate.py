@@ -0,0 +1,94 @@
+"""Benchmark hydrating semantic search hits from the history stream.
+
+Compares the legacy per-hit ``XRANGE`` + ``HGET`` loop with
+``hydrate_messages`` (one pipeline for all entries and an ``HMGET`` for the
+tags) at top_k = 5, 50 and 200.
+
+Requires a running Redis (``REDIS_URL``)::
+
+    python benchmarks/bench_hydrate.py --iterations 100
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+from _common import (
+    DEFAULT_REDIS_URL,
+    CountingConnection,
+    counting_client,
+    percentile,
+)
+
+from app.encryption import encrypt_text
+from app.history_utils import (
+    _decode_message,
+    _get_tags,
+    hydrate_messages,
+    stream_key,
+)
+from app.models import Message
+
+UUID = "bench-hydrate"
+
+
+async def legacy_hydrate(rds, ids: list[str]) -> list[Message]:
+    msgs = []
+    for mid in ids:
+        row = await rds.xrange(stream_key(UUID), min=mid, max=mid)
+        if row:
+            msg = _decode_message(row[0][1])
+            msg.tags = await _get_tags(rds, UUID, mid)
+            msgs.append(msg)
+    return msgs
+
+
+async def pipelined_hydrate(rds, ids: list[str]) -> list[Message]:
+    return [msg for _mid, msg in await hydrate_messages(rds, UUID, ids)]
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--redis-url", default=DEFAULT_REDIS_URL)
+    args = parser.parse_args()
+
+    rds = counting_client(args.redis_url)
+    skey = stream_key(UUID)
+    await rds.delete(skey, f"user:{UUID}:msg_tags")
+    pipe = rds.pipeline(transaction=False)
+    for i in range(args.messages):
+        msg = Message(role="user", content=f"message number {i} " * 8)
+        pipe.xadd(skey, {"data": encrypt_text(msg.model_dump_json())})
+    ids = [mid.decode() for mid in await pipe.execute()]
+    await rds.hset(
+        f"user:{UUID}:msg_tags",
+        mapping={mid: json.dumps(["bench"]) for mid in ids[::2]},
+    )
+
+    print(f"{'top_k':>5} {'path':>10} {'round trips':>12} {'p50 ms':>8} {'p99 ms':>8}")
+    for top_k in (5, 50, 200):
+        for fn in (legacy_hydrate, pipelined_hydrate):
+            timings = []
+            CountingConnection.round_trips = 0
+            for _ in range(args.iterations):
+                sample = random.sample(ids, top_k)
+                start = time.perf_counter()
+                await fn(rds, sample)
+                timings.append((time.perf_counter() - start) * 1000)
+            trips = CountingConnection.round_trips / args.iterations
+            name = fn.__name__.split("_")[0]
+            print(
+                f"{top_k:>5} {name:>10} {trips:>12.0f} "
+                f"{statistics.median(timings):>8.2f} {percentile(timings, 99):>8.2f}"
+            )
+    await rds.delete(skey, f"user:{UUID}:msg_tags")
+    await rds.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,107 @@
+"""Benchmark ``GET /history`` latency during a burst of logins.
+
+Fires ``--logins`` concurrent ``POST /login`` calls while ``--readers``
+clients keep calling ``GET /history``, once with bcrypt running inline on
+the event loop (the previous behaviour) and once on the bounded hashing
+executor. Reports the ``/history`` latency and the event-loop lag measured by
+a probe task.
+
+Requires a running Redis (``REDIS_URL``) and ``httpx``::
+
+    python benchmarks/bench_login_storm.py --logins 50 --readers 20
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from unittest.mock import patch
+
+import httpx
+from _common import percentile
+
+import app.auth as auth
+from app.main import app, shutdown, startup
+
+
+async def inline_verify(password: str, hashed: str) -> bool:
+    """Replicates the pre-executor ``verify_password``."""
+    return auth.pwd_context.verify(password, hashed)
+
+
+async def loop_lag(stop: asyncio.Event, lags: list[float]) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.005)
+        lags.append((time.perf_counter() - start - 0.005) * 1000)
+
+
+async def reader(client, token: str, stop: asyncio.Event, timings: list[float]) -> None:
+    headers = {"Authorization": f"Bearer {token}"}
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get("/history", params={"uuid": "bench-user"}, headers=headers)
+        timings.append((time.perf_counter() - start) * 1000)
+
+
+async def storm(client, logins: int, readers: int, token: str) -> tuple:
+    stop = asyncio.Event()
+    timings: list[float] = []
+    lags: list[float] = []
+    tasks = [asyncio.create_task(loop_lag(stop, lags))]
+    tasks += [
+        asyncio.create_task(reader(client, token, stop, timings))
+        for _ in range(readers)
+    ]
+    start = time.perf_counter()
+    responses = await asyncio.gather(
+        *(
+            client.post(
+                "/login", json={"username": "bench-login", "password": "secret"}
+            )
+            for _ in range(logins)
+        )
+    )
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await asyncio.gather(*tasks)
+    shed = sum(1 for r in responses if r.status_code == 429)
+    return timings, lags, elapsed, shed
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=50)
+    parser.add_argument("--readers", type=int, default=20)
+    args = parser.parse_args()
+
+    await startup()
+    rds = app.state.redis
+    for user in ("bench-user", "bench-login"):
+        await rds.delete(f"user:{user}:data")
+    token = await auth.register_user("bench-user", "secret", "bench")
+    await auth.register_user("bench-login", "secret", "bench")
+
+    transport = httpx.ASGITransport(app=app)
+    print(
+        f"{'mode':>9} {'logins/s':>9} {'shed':>5} {'p50 ms':>8} {'p99 ms':>8} "
+        f"{'lag p99 ms':>11}"
+    )
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for mode in ("inline", "executor"):
+            if mode == "inline":
+                with patch.object(auth, "verify_password", inline_verify):
+                    result = await storm(client, args.logins, args.readers, token)
+            else:
+                result = await storm(client, args.logins, args.readers, token)
+            timings, lags, elapsed, shed = result
+            print(
+                f"{mode:>9} {args.logins / elapsed:>9.1f} {shed:>5} "
+                f"{statistics.median(timings):>8.2f} {percentile(timings, 99):>8.2f} "
+                f"{percentile(lags, 99):>11.2f}"
+            )
+    await shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
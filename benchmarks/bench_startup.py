@@ -0,0 +1,69 @@
+"""Benchmark cold start of the API module and of a Celery worker.
+
+Each scenario runs in a fresh interpreter ``--runs`` times. The script
+reports the median wall time and which heavy libraries were imported as a
+side effect (none of them should be until first use).
+
+No Redis is required::
+
+    python benchmarks/bench_startup.py --runs 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+
+HEAVY = ["torch", "sentence_transformers", "redisvl", "aioboto3", "openai"]
+
+SCENARIOS = {
+    "import app.main": "import app.main",
+    "celery worker boot": (
+        "from worker.celery_app import celery\n"
+        "celery.loader.import_default_modules()\n"
+        "import worker.tasks"
+    ),
+}
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def run(code: str) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE.format(code=code, heavy=HEAVY)],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'scenario':<20} {'median s':>9} {'max s':>7}  heavy modules loaded")
+    for name, code in SCENARIOS.items():
+        results = [run(code) for _ in range(args.runs)]
+        timings = [r["seconds"] for r in results]
+        loaded = ", ".join(results[-1]["loaded"]) or "-"
+        print(
+            f"{name:<20} {statistics.median(timings):>9.3f} {max(timings):>7.3f}  "
+            f"{loaded}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Benchmark tag generation for 100 untagged messages.
+
+Compares the legacy loop (one chat completion, ``HGET``, embedding and
+vector upsert per message) with ``tag_messages`` (one tool call per
+``TAG_BATCH_SIZE`` messages, one ``HMGET``, one ``encode`` call and one
+write pipeline). The LLM is replaced by a client that sleeps
+``--llm-latency-ms`` per call so the numbers do not depend on a provider;
+embeddings use the configured model. Round trips count the benchmark
+client only, not the vector index connection used by the legacy upserts.
+
+Requires a running Redis Stack (``REDIS_URL``)::
+
+    python benchmarks/bench_tagging.py --messages 100 --llm-latency-ms 300
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+from _common import DEFAULT_REDIS_URL, CountingConnection, counting_client
+
+from app.embeddings import aembed
+from app.history_utils import _decode_message, encode_message, stream_key
+from app.models import Message
+from app.services.tagging import tag_messages
+from app.vector import upsert_embedding
+
+UUID = "bench-tags"
+
+
+class FakeLLM:
+    """Answers both the legacy prompt and the ``set_tags`` tool call."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, messages, tools=None, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if not tools:
+            message = SimpleNamespace(content="bench, topic")
+        else:
+            count = len(messages[-1]["content"].splitlines())
+            items = [{"index": i, "tags": ["bench", "topic"]} for i in range(count)]
+            args = json.dumps({"items": items})
+            call = SimpleNamespace(function=SimpleNamespace(arguments=args))
+            message = SimpleNamespace(content=None, tool_calls=[call])
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+async def legacy_tags(rds, client, uuid: str, limit: int) -> int:
+    """Replicates the per-message ``_async_generate_tags`` loop."""
+    tagged = 0
+    for mid, obj in await rds.xrevrange(stream_key(uuid), count=limit):
+        mid = mid.decode()
+        if await rds.hget(f"user:{uuid}:msg_tags", mid):
+            continue
+        msg = _decode_message(obj)
+        resp = await client.chat.completions.create(
+            messages=[{"role": "user", "content": msg.content}]
+        )
+        tags = [t.strip() for t in resp.choices[0].message.content.split(",")]
+        await rds.hset(f"user:{uuid}:msg_tags", mid, json.dumps(tags))
+        for t in tags:
+            await rds.sadd(f"user:{uuid}:tags:{t}", mid)
+        emb = await aembed(rds, msg.content)
+        await upsert_embedding(uuid, mid, emb, tags=tags)
+        tagged += 1
+    return tagged
+
+
+async def reset(rds, count: int) -> None:
+    await rds.delete(
+        stream_key(UUID),
+        f"user:{UUID}:msg_tags",
+        f"user:{UUID}:tags:bench",
+        f"user:{UUID}:tags:topic",
+    )
+    pipe = rds.pipeline(transaction=False)
+    for i in range(count):
+        msg = Message(role="user", content=f"benchmark message {i} about topic {i % 7}")
+        pipe.xadd(stream_key(UUID), {"data": encode_message(msg)})
+    await pipe.execute()
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=100)
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--redis-url", default=DEFAULT_REDIS_URL)
+    args = parser.parse_args()
+
+    rds = counting_client(args.redis_url)
+    print(
+        f"{'path':>8} {'tagged':>7} {'LLM calls':>10} {'round trips':>12} "
+        f"{'wall s':>8}"
+    )
+    for name, fn in (("legacy", legacy_tags), ("batched", tag_messages)):
+        await reset(rds, args.messages)
+        client = FakeLLM(args.llm_latency_ms / 1000)
+        CountingConnection.round_trips = 0
+        start = time.perf_counter()
+        tagged = await fn(rds, client, UUID, args.messages)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{name:>8} {tagged:>7} {client.calls:>10} "
+            f"{CountingConnection.round_trips:>12} {elapsed:>8.2f}"
+        )
+    await reset(rds, 0)
+    await rds.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,129 @@
+"""Benchmark the calendar fast path on a labelled corpus of reminders.
+
+Each line of the corpus is a reminder message with the local time it
+should resolve to (relative to Wednesday 2025-01-15 10:00) or ``None`` when
+only the LLM can answer. The script reports how many reminders the old
+"завтра/сегодня HH:MM" regex and ``parse_temporal`` resolve, how many of
+those are correct, the LLM calls avoided (every add through the tool loop
+costs at least two completions) and the parse time per message.
+
+No Redis or LLM is required::
+
+    python benchmarks/bench_timeparse.py --iterations 1000
+"""
+
+import argparse
+import re
+import time
+from datetime import datetime, timedelta
+
+import _common  # noqa: F401  (adds the repository root to sys.path)
+
+from app.services.timeparse import parse_temporal
+
+NOW = datetime(2025, 1, 15, 10, 0)
+# completions per reminder added through the tool-calling loop
+LLM_CALLS_PER_ADD = 2
+
+CORPUS = [
+    ("напомни завтра в 18:00 о встрече", "2025-01-16T18:00"),
+    ("напомни сегодня в 21.30 выпить таблетки", "2025-01-15T21:30"),
+    ("напомни через 2 часа позвонить маме", "2025-01-15T12:00"),
+    ("напомни через 15 минут проверить духовку", "2025-01-15T10:15"),
+    ("напомни через полчаса выйти из дома", "2025-01-15T10:30"),
+    ("напомни через час про созвон", "2025-01-15T11:00"),
+    ("напомни в пятницу в 7 вечера про кино", "2025-01-17T19:00"),
+    ("напомни в понедельник в 9 утра сдать отчёт", "2025-01-20T09:00"),
+    ("напомни в следующую среду в 10:00 про стоматолога", "2025-01-22T10:00"),
+    ("напомни 20.02 в 9.15 про поезд", "2025-02-20T09:15"),
+    ("напомни 15 марта в 12:00 купить билеты", "2025-03-15T12:00"),
+    ("напомни 1 апреля в 8:00 поздравить Диму", "2025-04-01T08:00"),
+    ("напомни послезавтра в 14:00 забрать посылку", "2025-01-17T14:00"),
+    ("напомни через 2 дня в 10:00 оплатить счёт", "2025-01-17T10:00"),
+    ("напомни в 18:30 забрать детей", "2025-01-15T18:30"),
+    ("напомни в полдень пообедать", "2025-01-15T12:00"),
+    ("напомни сегодня вечером полить цветы", "2025-01-15T19:00"),
+    ("напомни завтра утром купить хлеб", "2025-01-16T09:00"),
+    ("напомни 2025-03-01 в 12:00 продлить домен", "2025-03-01T12:00"),
+    ("напомни через неделю про анализы", "2025-01-22T09:00"),
+    ("напомни завтра про день рождения", "2025-01-16T09:00"),
+    ("remind me tomorrow at 6pm to call John", "2025-01-16T18:00"),
+    ("remind me in 30 minutes to check the oven", "2025-01-15T10:30"),
+    ("remind me in an hour about the standup", "2025-01-15T11:00"),
+    ("remind me in 2 hours to take a break", "2025-01-15T12:00"),
+    ("remind me on friday at 5pm to send the report", "2025-01-17T17:00"),
+    ("remind me next monday at 9am about the review", "2025-01-20T09:00"),
+    ("remind me on March 3rd at 10:30 to renew the passport", "2025-03-03T10:30"),
+    ("remind me on the 5th of may at noon to book a table", "2025-05-05T12:00"),
+    ("remind me at 8 pm to water the plants", "2025-01-15T20:00"),
+    ("remind me tonight to lock the garage", "2025-01-15T20:00"),
+    ("remind me today at 16:45 to leave for the airport", "2025-01-15T16:45"),
+    ("remind me the day after tomorrow at 7am to run", "2025-01-17T07:00"),
+    ("remind me in 3 days at 10:00 to pay rent", "2025-01-18T10:00"),
+    ("remind me in a week to follow up", "2025-01-22T09:00"),
+    ("remind me tomorrow morning to buy milk", "2025-01-16T09:00"),
+    ("remind me on 2025-02-14 at 19:00 about dinner", "2025-02-14T19:00"),
+    ("remind me at 6.30 pm to call the bank", "2025-01-15T18:30"),
+    # only the LLM can resolve these
+    ("напомни когда закончится совещание", None),
+    ("напомни после обеда позвонить", None),
+    ("remind me before the meeting", None),
+    ("remind me when I get home", None),
+    ("remind me about it later", None),
+    ("remind me in 1.5 hours to stretch", None),
+    ("напомни обновиться до версии 2.1", None),
+]
+
+
+def legacy_parse(text: str, now: datetime) -> datetime | None:
+    """Replicates the regex the calendar extractor used before the parser."""
+    m = re.search(r"(завтра|сегодня).*?(\d{1,2})[:.](\d{2})", text.lower())
+    if not m:
+        return None
+    day = now.date() + timedelta(days=1 if m.group(1) == "завтра" else 0)
+    return datetime.combine(day, datetime.min.time()).replace(
+        hour=int(m.group(2)), minute=int(m.group(3))
+    )
+
+
+def fast_path(text: str, now: datetime) -> datetime | None:
+    match = parse_temporal(text, now)
+    return match.when if match else None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=1000)
+    args = parser.parse_args()
+
+    total = len(CORPUS)
+    print(
+        f"{'parser':>8} {'resolved':>9} {'correct':>8} {'coverage':>9} "
+        f"{'LLM calls avoided':>18} {'us/msg':>7}"
+    )
+    for name, fn in (("regex", legacy_parse), ("rules", fast_path)):
+        resolved = correct = 0
+        for text, label in CORPUS:
+            when = fn(text, NOW)
+            if when is None:
+                continue
+            resolved += 1
+            if label and when == datetime.fromisoformat(label):
+                correct += 1
+            elif label is None:
+                print(f"  {name}: false positive: {text!r} -> {when}")
+            else:
+                print(f"  {name}: wrong: {text!r} -> {when}, expected {label}")
+        start = time.perf_counter()
+        for _ in range(args.iterations):
+            for text, _label in CORPUS:
+                fn(text, NOW)
+        per_msg = (time.perf_counter() - start) / (args.iterations * total) * 1e6
+        print(
+            f"{name:>8} {resolved:>9} {correct:>8} {correct / total:>9.0%} "
+            f"{correct * LLM_CALLS_PER_ADD:>18} {per_msg:>7.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -42,23 +42,31 @@ async def calendar(args):
     async with httpx.AsyncClient(base_url=BASE_URL) as client:
         headers = {"Authorization": f"Bearer {args.token}"}
         params = {"uuid": args.uuid}
+        if args.start:
+            params["from"] = args.start
+        if args.end:
+            params["to"] = args.end
+        if args.limit:
+            params["limit"] = args.limit
+        if args.cursor:
+            params["cursor"] = args.cursor
         r = await client.get("/calendar", params=params, headers=headers)
         print(json.dumps(r.json(), ensure_ascii=False, indent=2))
 
 async def update(args):
-    logger.info("Updating event %s", args.index)
+    logger.info("Updating event %s", args.event_id)
     async with httpx.AsyncClient(base_url=BASE_URL) as client:
         headers = {"Authorization": f"Bearer {args.token}"}
         payload = {"uuid": args.uuid, "text": args.text, "when": args.when}
-        r = await client.put(f"/calendar/{args.index}", json=payload, headers=headers)
+        r = await client.put(f"/calendar/{args.event_id}", json=payload, headers=headers)
         print(r.json())
 
 async def delete(args):
-    logger.info("Deleting event %s", args.index)
+    logger.info("Deleting event %s", args.event_id)
     async with httpx.AsyncClient(base_url=BASE_URL) as client:
         headers = {"Authorization": f"Bearer {args.token}"}
         payload = {"uuid": args.uuid}
-        r = await client.delete(f"/calendar/{args.index}", json=payload, headers=headers)
+        r = await client.delete(f"/calendar/{args.event_id}", json=payload, headers=headers)
         print(r.json())
 
 async def main():
@@ -85,18 +93,22 @@ async def main():
 
     c = sub.add_parser("calendar")
     c.add_argument("uuid")
+    c.add_argument("--from", dest="start")
+    c.add_argument("--to", dest="end")
+    c.add_argument("--limit", type=int)
+    c.add_argument("--cursor")
     c.add_argument("--token", required=True)
 
     u = sub.add_parser("update")
     u.add_argument("uuid")
-    u.add_argument("index", type=int)
+    u.add_argument("event_id")
     u.add_argument("--text")
     u.add_argument("--when")
     u.add_argument("--token", required=True)
 
     d = sub.add_parser("delete")
     d.add_argument("uuid")
-    d.add_argument("index", type=int)
+    d.add_argument("event_id")
     d.add_argument("--token", required=True)
 
     args = parser.parse_args()
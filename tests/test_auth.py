@@ -50,6 +50,10 @@ class DummySettings:
         self.admin_key = None
         self.token_ttl = 100
         self.notification_service = 'stub'
+        self.token_cache_size = 100
+        self.token_cache_ttl = 60
+        self.password_hash_workers = 2
+        self.password_hash_queue_size = 4
         self.cost_per_message = 0.0
         self.cost_per_token = 0.0
 
@@ -95,6 +99,43 @@ class AuthTestCase(unittest.IsolatedAsyncioTestCase):
         user = await auth.get_current_user(credentials=creds)
         self.assertEqual(user, ("u1", "c1"))
 
+    async def test_get_current_user_cached(self):
+        self.rds.get.return_value = "u2:c1"
+        self.rds.hget.return_value = b"c1"
+        creds = HTTPAuthorizationCredentials(scheme="Bearer", credentials="cached")
+        await auth.get_current_user(credentials=creds)
+        self.rds.get.reset_mock()
+        user = await auth.get_current_user(credentials=creds)
+        self.assertEqual(user, ("u2", "c1"))
+        self.rds.get.assert_not_awaited()
+
+    async def test_login_invalidates_cached_token(self):
+        auth.token_cache().set("token:old", ("u1", "c1"))
+        self.rds.hgetall.return_value = {
+            b"password": b"hashed-pass",
+            b"token": b"old",
+            b"company_id": b"c1",
+        }
+        await auth.login_user("u1", "pass")
+        self.assertIsNone(auth.token_cache().get("token:old"))
+        self.rds.publish.assert_awaited_with("auth:invalidate", "token:old")
+
+    async def test_hashing_runs_off_loop(self):
+        hashed = await auth.hash_password("pass")
+        self.assertEqual(hashed, "hashed-pass")
+        self.assertTrue(await auth.verify_password("pass", hashed))
+        self.assertEqual(auth.password_hash_stats()["pending"], 0)
+
+    async def test_hashing_sheds_when_saturated(self):
+        auth._hash_pending = auth.settings.password_hash_queue_size
+        try:
+            with self.assertRaises(auth.HTTPException) as ctx:
+                await auth.verify_password("pass", "hashed-pass")
+        finally:
+            auth._hash_pending = 0
+        self.assertEqual(ctx.exception.status_code, 429)
+        self.assertEqual(auth.password_hash_stats()["rejected"], 1)
+
     async def test_invalid_token(self):
         self.rds.get.return_value = None
         with self.assertRaises(auth.HTTPException):
@@ -0,0 +1,254 @@
+import os
+import sys
+import types
+import unittest
+import gzip
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+
+# Stub external dependencies similar to other tests
+sys.modules.setdefault(
+    "redis",
+    types.SimpleNamespace(
+        asyncio=types.SimpleNamespace(
+            from_url=lambda *a, **k: None,
+            ConnectionPool=types.SimpleNamespace(from_url=lambda *a, **k: None),
+            Redis=lambda *a, **k: types.SimpleNamespace(),
+        ),
+        ConnectionPool=types.SimpleNamespace(from_url=lambda *a, **k: None),
+        Redis=lambda *a, **k: types.SimpleNamespace(),
+    ),
+)
+class WatchError(Exception):
+    pass
+
+
+sys.modules.setdefault("redis.exceptions", types.SimpleNamespace(WatchError=WatchError))
+sys.modules.setdefault(
+    "openai", types.SimpleNamespace(AsyncOpenAI=lambda *a, **k: None)
+)
+sys.modules.setdefault(
+    "tiktoken", types.SimpleNamespace(get_encoding=lambda name: lambda x: [])
+)
+
+
+class DummyModel:
+    def encode(self, *a, **k):
+        return []
+
+    def get_sentence_embedding_dimension(self):
+        return 0
+
+
+sys.modules.setdefault(
+    "sentence_transformers",
+    types.SimpleNamespace(SentenceTransformer=lambda *a, **k: DummyModel()),
+)
+redisvl_pkg = types.SimpleNamespace()
+redisvl_index = types.SimpleNamespace(AsyncSearchIndex=object)
+redisvl_schema = types.SimpleNamespace(IndexSchema=object)
+redisvl_filter = types.SimpleNamespace(Tag=object)
+redisvl_query = types.SimpleNamespace(VectorQuery=object, filter=redisvl_filter)
+sys.modules.setdefault("redisvl", redisvl_pkg)
+sys.modules.setdefault("redisvl.index", redisvl_index)
+sys.modules.setdefault("redisvl.schema", redisvl_schema)
+sys.modules.setdefault("redisvl.query", redisvl_query)
+sys.modules.setdefault("redisvl.query.filter", redisvl_filter)
+sys.modules.setdefault("pydantic_settings", types.SimpleNamespace(BaseSettings=object))
+sys.modules.setdefault("aioboto3", types.SimpleNamespace(Session=lambda *a, **k: None))
+sys.modules.setdefault("numpy", types.SimpleNamespace(array=lambda *a, **k: None))
+sys.modules.setdefault("websockets", types.SimpleNamespace())
+passlib_pkg = types.SimpleNamespace()
+passlib_context = types.SimpleNamespace(CryptContext=lambda *a, **k: None)
+sys.modules.setdefault("passlib", passlib_pkg)
+sys.modules.setdefault("passlib.context", passlib_context)
+crypto_pkg = types.SimpleNamespace()
+fernet_mod = types.SimpleNamespace(Fernet=lambda *a, **k: None, InvalidToken=Exception)
+sys.modules.setdefault("cryptography", crypto_pkg)
+sys.modules.setdefault("cryptography.fernet", fernet_mod)
+
+
+class DummyCelery:
+    def __init__(self, *a, **k):
+        self.conf = types.SimpleNamespace()
+
+    def task(self, func=None, *a, **k):
+        if func:
+            return func
+
+        def wrapper(f):
+            return f
+
+        return wrapper
+
+
+sys.modules.setdefault("celery", types.SimpleNamespace(Celery=DummyCelery))
+sys.modules.setdefault(
+    "celery.schedules", types.SimpleNamespace(crontab=lambda *a, **k: None)
+)
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from app.services import bulk_import
+
+
+async def body(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+async def collect(lines):
+    return [item async for item in lines]
+
+
+class WatchPipeline:
+    """Transaction pipeline whose stream tail moves under the first EXECs."""
+
+    def __init__(self, tails, conflicts=0):
+        self.tails = tails
+        self.conflicts = conflicts
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def watch(self, key):
+        pass
+
+    async def xrevrange(self, key, count=None):
+        return self.tails.pop(0)
+
+    def multi(self):
+        pass
+
+    async def execute(self):
+        if self.conflicts:
+            self.conflicts -= 1
+            raise sys.modules["redis.exceptions"].WatchError()
+        return []
+
+
+class IterLinesTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_plain_lines_across_chunks(self):
+        lines = await collect(bulk_import.iter_lines(body(b'{"a"', b":1}\n\n{", b"}")))
+        self.assertEqual(lines, [(1, b'{"a":1}'), (2, b""), (3, b"{}")])
+
+    async def test_gzip_body(self):
+        data = gzip.compress(b"one\ntwo\n" * 3)
+        lines = await collect(bulk_import.iter_lines(body(data[:5], data[5:])))
+        self.assertEqual([n for n, _ in lines], list(range(1, 7)))
+        self.assertEqual(lines[-1], (6, b"two"))
+
+    async def test_broken_gzip_and_long_lines_rejected(self):
+        data = gzip.compress(b"one\n")
+        with self.assertRaises(ValueError):
+            await collect(bulk_import.iter_lines(body(data[:-4])))
+        with patch("app.services.bulk_import.MAX_LINE", 8):
+            with self.assertRaises(ValueError):
+                await collect(bulk_import.iter_lines(body(b"ok\n", b"x" * 9)))
+
+
+class ImportTestCase(unittest.IsolatedAsyncioTestCase):
+    def test_ids_follow_timestamps(self):
+        ts = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        ms = int(ts.timestamp() * 1000)
+        self.assertEqual(bulk_import._next_id(ts, (0, 0)), (ms, 0))
+        # same millisecond, older than the stored tail: next sequence number
+        self.assertEqual(bulk_import._next_id(ts, (ms, 0)), (ms, 1))
+        self.assertEqual(bulk_import._next_id(ts, (ms + 5, 3)), (ms + 5, 4))
+
+    async def test_chunks_written_with_explicit_ids(self):
+        lines = [
+            '{"role":"user","content":"a","ts":"2024-01-01T00:00:00"}',
+            '{"role":"bot","content":"bad"}',
+            "not json",
+            '{"role":"assistant","content":"b c","ts":"2024-01-01T00:00:01"}',
+            '{"role":"user","content":"d","ts":"2024-01-01T00:00:01"}',
+        ]
+        rds = AsyncMock()
+        pipe = MagicMock(execute=AsyncMock())
+        # the second chunk loses the race against a concurrent write once
+        chunks = [
+            WatchPipeline([[]]),
+            WatchPipeline(
+                [[(b"1704067201000-0", {})], [(b"1704067201000-5", {})]], conflicts=1
+            ),
+        ]
+        rds.pipeline = MagicMock(
+            side_effect=lambda transaction=False: chunks.pop(0) if transaction else pipe
+        )
+        add = MagicMock()
+        with patch("app.services.bulk_import._queue_messages", add), patch(
+            "app.services.bulk_import.encode_message", lambda msg: b"data"
+        ), patch(
+            "app.services.bulk_import._mark_compressed", AsyncMock()
+        ), patch(
+            "app.services.bulk_import.settings",
+            types.SimpleNamespace(bulk_import_chunk=2),
+        ):
+            result = await bulk_import.import_messages(
+                rds,
+                "u1",
+                "c1",
+                bulk_import.iter_lines(body("\n".join(lines).encode())),
+                import_id="imp1",
+            )
+        self.assertEqual(result["imported"], 3)
+        self.assertEqual(result["invalid"], 2)
+        self.assertEqual([e["line"] for e in result["errors"]], [2, 3])
+        # the retried chunk follows the tail written by the concurrent /add
+        self.assertEqual(
+            [call.kwargs["ids"] for call in add.call_args_list],
+            [
+                ["1704067200000-0", "1704067201000-0"],
+                ["1704067201000-1"],
+                ["1704067201000-6"],
+            ],
+        )
+        self.assertFalse(add.call_args.kwargs["calendar_feed"])
+        self.assertEqual(add.call_args_list[0].kwargs["tokens"], 3)
+        self.assertEqual(result["first_id"], "1704067200000-0")
+        self.assertEqual(result["last_id"], "1704067201000-6")
+        pipe.hset.assert_called_with(
+            "import:imp1",
+            mapping={
+                "uuid": "u1",
+                "status": "written",
+                "lines": 5,
+                "imported": 3,
+                "invalid": 2,
+            },
+        )
+
+    async def test_gives_up_when_stream_keeps_changing(self):
+        lines = ['{"role":"user","content":"a","ts":"2024-01-01T00:00:00"}']
+        rds = AsyncMock()
+        pipe = MagicMock(execute=AsyncMock())
+        watched = WatchPipeline(
+            [[]] * bulk_import.WRITE_RETRIES, conflicts=bulk_import.WRITE_RETRIES
+        )
+        rds.pipeline = MagicMock(
+            side_effect=lambda transaction=False: watched if transaction else pipe
+        )
+        with patch("app.services.bulk_import._queue_messages", MagicMock()), patch(
+            "app.services.bulk_import.encode_message", lambda msg: b"data"
+        ), patch("app.services.bulk_import._mark_compressed", AsyncMock()), patch(
+            "app.services.bulk_import.settings",
+            types.SimpleNamespace(bulk_import_chunk=2),
+        ):
+            with self.assertRaises(bulk_import.ImportConflict):
+                await bulk_import.import_messages(
+                    rds,
+                    "u1",
+                    "c1",
+                    bulk_import.iter_lines(body("\n".join(lines).encode())),
+                    import_id="imp1",
+                )
+        mapping = pipe.hset.call_args.kwargs["mapping"]
+        self.assertEqual((mapping["status"], mapping["imported"]), ("failed", 0))
+        self.assertIn("user:u1:history", mapping["error"])
+
+
+if __name__ == "__main__":
+    unittest.main()
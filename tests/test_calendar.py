@@ -4,7 +4,7 @@ import os
 import sys
 import types
 import unittest
-from unittest.mock import AsyncMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 # Stub external dependencies for tests
 sys.modules.setdefault(
@@ -85,9 +85,11 @@ sys.modules.setdefault(
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 from datetime import datetime
 
+from fastapi import HTTPException
+
 from app.main import app
 from app.models import Message
-from app.routes.calendar import delete_calendar, update_calendar
+from app.routes.calendar import delete_calendar, get_calendar, update_calendar
 from app.services.calendar import (
     _add_event,
     _batch_check_calendar_events,
@@ -102,6 +104,34 @@ tasks.send_notification.apply_async = lambda *a, **k: None
 from app.models import CalendarDeleteRequest, CalendarUpdateRequest
 
 
+class FakePipeline:
+    def __init__(self, results=None):
+        self.commands = []
+        self.results = results or []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+            return self
+
+        return queue
+
+    async def execute(self):
+        return self.results
+
+
+def _redis(results=None):
+    rds = AsyncMock()
+    rds.pipeline = MagicMock(return_value=FakePipeline(results))
+    return rds
+
+
+def _stored(rds):
+    """Event hash and index entry written by ``_store_event``."""
+    cmds = {name: (args, kwargs) for name, args, kwargs in rds.pipeline().commands}
+    return cmds["hset"][1]["mapping"], cmds["zadd"][0][1]
+
+
 class DummySettings:
     def __init__(self):
         self.openai_chat_model = "gpt"
@@ -109,17 +139,34 @@ class DummySettings:
 
 class CalendarTestCase(unittest.IsolatedAsyncioTestCase):
     async def test_event_added(self):
-        rds = AsyncMock()
+        rds = _redis()
         msg = Message(role="user", content="напомни завтра в 18:00 о встрече")
         await _check_and_store_calendar_event(rds, "u1", msg, tz="Europe/Moscow")
-        rds.zadd.assert_awaited()
-        args, kwargs = rds.zadd.await_args
-        stored = list(args[1].keys())[0]
-        data = json.loads(stored)
+        data, index = _stored(rds)
         self.assertEqual(data["tz"], "Europe/Moscow")
+        self.assertEqual(list(index.values()), [data["ts"]])
+
+    async def test_fast_path_skips_llm(self):
+        rds = _redis()
+        dummy_llm = types.SimpleNamespace(
+            chat=types.SimpleNamespace(
+                completions=types.SimpleNamespace(create=AsyncMock())
+            )
+        )
+        msg = Message(
+            role="user", content="remind me in 2 hours", ts=datetime(2025, 1, 1, 10)
+        )
+        with patch("app.services.llm.llm", dummy_llm), patch(
+            "app.main.settings", DummySettings()
+        ):
+            handled = await _check_and_store_calendar_event(rds, "u1", msg)
+        self.assertTrue(handled)
+        dummy_llm.chat.completions.create.assert_not_awaited()
+        _data, index = _stored(rds)
+        self.assertEqual(list(index.values()), [1735732800])
 
     async def test_event_added_via_llm(self):
-        rds = AsyncMock()
+        rds = _redis()
         dummy_llm = types.SimpleNamespace(
             chat=types.SimpleNamespace(
                 completions=types.SimpleNamespace(
@@ -154,7 +201,8 @@ class CalendarTestCase(unittest.IsolatedAsyncioTestCase):
         ):
             msg = Message(role="user", content="поставь напоминание")
             await _check_and_store_calendar_event(rds, "u1", msg)
-            rds.zadd.assert_awaited()
+            data, _index = _stored(rds)
+            self.assertEqual(data["text"], "meet")
 
     async def test_ignore_non_calendar_message(self):
         rds = AsyncMock()
@@ -185,7 +233,7 @@ class CalendarTestCase(unittest.IsolatedAsyncioTestCase):
                                             types.SimpleNamespace(
                                                 function=types.SimpleNamespace(
                                                     name="delete_event",
-                                                    arguments=json.dumps({"index": 0}),
+                                                    arguments=json.dumps({"id": "e1"}),
                                                 )
                                             )
                                         ]
@@ -200,9 +248,12 @@ class CalendarTestCase(unittest.IsolatedAsyncioTestCase):
         with patch("app.services.llm.llm", dummy_llm), patch(
             "app.main.settings", DummySettings()
         ):
-            msg = Message(role="user", content="удали напоминание 0")
+            msg = Message(role="user", content="удали напоминание e1")
             await _check_and_store_calendar_event(rds, "u1", msg)
-            rds.zremrangebyrank.assert_awaited_with("user:u1:calendar", 0, 0)
+            args = rds.eval.await_args.args
+            self.assertEqual(
+                args[1:], (2, "user:u1:event:e1", "user:u1:calendar", "e1")
+            )
 
     async def test_event_updated_via_llm(self):
         rds = AsyncMock()
@@ -219,7 +270,7 @@ class CalendarTestCase(unittest.IsolatedAsyncioTestCase):
                                                 function=types.SimpleNamespace(
                                                     name="update_event",
                                                     arguments=json.dumps(
-                                                        {"index": 1, "text": "new"}
+                                                        {"id": "e1", "text": "new"}
                                                     ),
                                                 )
                                             )
@@ -232,13 +283,17 @@ class CalendarTestCase(unittest.IsolatedAsyncioTestCase):
                 )
             )
         )
-        rds.zrange.return_value = [(json.dumps({"text": "old"}), 1000)]
+        rds.eval.return_value = [b"new", b"1000", None]
         with patch("app.services.llm.llm", dummy_llm), patch(
             "app.main.settings", DummySettings()
         ):
             msg = Message(role="user", content="измени напоминание")
             await _check_and_store_calendar_event(rds, "u1", msg)
-            rds.zremrangebyrank.assert_awaited_with("user:u1:calendar", 1, 1)
+            args = rds.eval.await_args.args
+            self.assertEqual(
+                args[2:],
+                ("user:u1:event:e1", "user:u1:calendar", "e1", "new", "", ""),
+            )
 
     async def test_event_list_via_llm(self):
         rds = AsyncMock()
@@ -266,31 +321,48 @@ class CalendarTestCase(unittest.IsolatedAsyncioTestCase):
                 )
             )
         )
-        rds.zrange.return_value = []
+        rds.zrangebyscore.return_value = []
         with patch("app.services.llm.llm", dummy_llm), patch(
             "app.main.settings", DummySettings()
         ):
             msg = Message(role="user", content="покажи напоминания")
             await _check_and_store_calendar_event(rds, "u1", msg)
-            rds.zrange.assert_awaited()
+            rds.zrangebyscore.assert_awaited_with(
+                "user:u1:calendar", "-inf", "+inf", withscores=True
+            )
 
     async def test_update_calendar(self):
         rds = AsyncMock()
         app.state.redis = rds
-        rds.zrange.return_value = [(json.dumps({"text": "old"}), 1000)]
-        rds.hget.return_value = b"c1"
+        rds.hget.side_effect = lambda key, field: b"UTC" if field == "tz" else b"c1"
+        rds.eval.return_value = [b"new", b"1735689600", None]
         req = CalendarUpdateRequest(uuid="u1", text="new", when=datetime(2025, 1, 1))
-        await update_calendar(0, req, user=("u1", "c1"))
-        rds.zremrangebyrank.assert_awaited_with("user:u1:calendar", 0, 0)
-        rds.zadd.assert_awaited()
+        result = await update_calendar("e1", req, user=("u1", "c1"))
+        self.assertEqual(result, {"status": "updated"})
+        self.assertEqual(
+            rds.eval.await_args.args[2:],
+            ("user:u1:event:e1", "user:u1:calendar", "e1", "new", 1735689600, ""),
+        )
+
+    async def test_update_missing_event(self):
+        rds = AsyncMock()
+        app.state.redis = rds
+        rds.hget.return_value = b"c1"
+        rds.eval.return_value = None
+        req = CalendarUpdateRequest(uuid="u1", text="new")
+        with self.assertRaises(HTTPException) as ctx:
+            await update_calendar("e1", req, user=("u1", "c1"))
+        self.assertEqual(ctx.exception.status_code, 404)
 
     async def test_delete_calendar(self):
         rds = AsyncMock()
         app.state.redis = rds
         req = CalendarDeleteRequest(uuid="u1")
         rds.hget.return_value = b"c1"
-        await delete_calendar(1, req, user=("u1", "c1"))
-        rds.zremrangebyrank.assert_awaited_with("user:u1:calendar", 1, 1)
+        rds.eval.return_value = b""
+        result = await delete_calendar("e1", req, user=("u1", "c1"))
+        self.assertEqual(result, {"status": "deleted"})
+        rds.zrem.assert_not_awaited()
 
     async def test_calendar_disabled(self):
         rds = AsyncMock()
@@ -302,37 +374,144 @@ class CalendarTestCase(unittest.IsolatedAsyncioTestCase):
             AsyncMock(return_value=False),
         ):
             with self.assertRaises(app.main.HTTPException):
-                await delete_calendar(1, req, user=("u1", "c1"))
+                await delete_calendar("e1", req, user=("u1", "c1"))
 
     async def test_list_add_update_delete(self):
-        rds = AsyncMock()
+        rds = _redis()
         app.state.redis = rds
-        rds.zrange.return_value = []
+        rds.zrangebyscore.return_value = []
         events = await _list_events(rds, "u1")
         self.assertEqual(events, [])
 
-        await _add_event(rds, "u1", "2025-01-01T10:00:00", "test")
-        rds.zadd.assert_awaited()
+        result = await _add_event(rds, "u1", "2025-01-01T10:00:00", "test")
+        event_id = result["id"]
+        _data, index = _stored(rds)
+        self.assertEqual(index, {event_id: 1735725600})
 
-        rds.zrange.return_value = [
-            (json.dumps({"text": "test", "tz": "UTC"}), 1735725600)
-        ]
-        events = await _list_events(rds, "u1")
-        self.assertEqual(events[0]["index"], 0)
+        rds.zrangebyscore.return_value = [(event_id.encode(), 1735725600.0)]
+        rds.pipeline = MagicMock(
+            return_value=FakePipeline([{b"text": b"test", b"tz": b"UTC"}])
+        )
+        events = await _list_events(
+            rds, "u1", "2025-01-01T00:00:00", "2025-01-02T00:00:00"
+        )
+        rds.zrangebyscore.assert_awaited_with(
+            "user:u1:calendar", 1735689600.0, 1735776000.0, withscores=True
+        )
+        self.assertEqual(events[0]["id"], event_id)
+        self.assertEqual(events[0]["when"], "2025-01-01T10:00:00+00:00")
 
-        await _update_event(rds, "u1", 0, text="new")
-        rds.zremrangebyrank.assert_awaited_with("user:u1:calendar", 0, 0)
-        rds.zadd.assert_awaited()
+        rds.eval.return_value = [b"new", b"1735725600", b"r1"]
+        self.assertEqual(
+            await _update_event(rds, "u1", event_id, text="new"),
+            {"status": "updated"},
+        )
 
-        await _delete_event(rds, "u1", 0)
-        rds.zremrangebyrank.assert_awaited_with("user:u1:calendar", 0, 0)
+        rds.eval.return_value = b"r1"
+        self.assertEqual(
+            await _delete_event(rds, "u1", event_id), {"status": "deleted"}
+        )
+        rds.delete.assert_awaited_with("reminder:r1")
 
-    async def test_batch_reminder_detection(self):
+        rds.eval.return_value = None
+        self.assertEqual(
+            await _delete_event(rds, "u1", event_id), {"status": "not_found"}
+        )
+
+    async def test_calendar_pages_by_cursor(self):
         rds = AsyncMock()
+        app.state.redis = rds
+        rds.hget.return_value = b"c1"
+        rds.zrangebyscore.return_value = [(b"a", 100.0), (b"b", 200.0), (b"c", 200.0)]
+        rds.pipeline = MagicMock(
+            return_value=FakePipeline(
+                [{b"text": b"x", b"tz": b"Europe/Moscow"}, {b"text": b"y"}]
+            )
+        )
+        resp = await get_calendar(
+            uuid="u1",
+            start=datetime(1970, 1, 1, 0, 1),
+            end=None,
+            limit=2,
+            cursor=None,
+            user=("u1", "c1"),
+        )
+        rds.zrangebyscore.assert_awaited_with(
+            "user:u1:calendar", 60.0, "+inf", start=0, num=3, withscores=True
+        )
+        self.assertEqual([e.id for e in resp["events"]], ["a", "b"])
+        self.assertEqual(resp["events"][0].when.utcoffset().total_seconds(), 10800)
+        self.assertEqual(resp["next_cursor"], "200:1")
+
+        rds.zrangebyscore.return_value = [(b"c", 200.0), (b"d", 200.0)]
+        rds.pipeline = MagicMock(return_value=FakePipeline([{b"text": b"z"}] * 2))
+        resp = await get_calendar(
+            uuid="u1", start=None, end=None, limit=1, cursor="200:1", user=("u1", "c1")
+        )
+        rds.zrangebyscore.assert_awaited_with(
+            "user:u1:calendar", 200, "+inf", start=1, num=2, withscores=True
+        )
+        self.assertEqual(resp["next_cursor"], "200:2")
+
+        with self.assertRaises(HTTPException) as ctx:
+            await get_calendar(
+                uuid="u1", start=None, end=None, limit=1, cursor="x", user=("u1", "c1")
+            )
+        self.assertEqual(ctx.exception.status_code, 400)
+
+    async def test_legacy_events_migrated_on_read(self):
+        legacy = json.dumps({"text": "old", "tz": "UTC", "reminder": "r1"})
+        rds = _redis([{b"text": b"old", b"tz": b"UTC"}])
+        rds.zrangebyscore.return_value = [(legacy.encode(), 1000.0)]
+
+        async def migrate(script, numkeys, key, prefix, *args):
+            self.assertEqual(prefix, "user:u1:event:")
+            self.assertEqual((args[0], args[2]), (legacy, 1000))
+            return [args[1].encode()]
+
+        rds.eval.side_effect = migrate
+        events = await _list_events(rds, "u1")
+        self.assertEqual(len(events), 1)
+        self.assertNotEqual(events[0]["id"], legacy)
+        self.assertEqual(events[0]["text"], "old")
+
+    async def test_batch_reminder_detection(self):
+        rds = _redis()
         msg1 = Message(role="user", content="напомни завтра")
         msg2 = Message(role="user", content="в 18:00 о встрече")
         await _batch_check_calendar_events(rds, "u1", [msg1, msg2])
-        rds.zadd.assert_awaited()
+        data, _index = _stored(rds)
+        self.assertIn("18:00", data["text"])
+
+    async def test_chat_reminder_creates_event(self):
+        from app import history_utils
+        from app.services import calendar_feed
+
+        msg = Message(
+            role="user", content="remind me in 2 hours", ts=datetime(2025, 1, 1, 10)
+        )
+        write = FakePipeline([b"1-0", b"9-0", 1, 1, 1])
+        await history_utils._add_messages_to_stream(
+            types.SimpleNamespace(pipeline=lambda transaction=True: write),
+            "u1",
+            [msg],
+            chat_id="c1",
+            payloads=[msg.model_dump_json().encode()],
+        )
+        feed = [
+            (b"9-0", {k.encode(): v for k, v in args[1].items()})
+            for name, args, _kwargs in write.commands
+            if name == "xadd" and args[0] == calendar_feed.FEED_KEY
+        ]
+        self.assertEqual(len(feed), 1)
+
+        rds = _redis()
+        with patch("app.history_utils.decrypt_text", lambda x: x), patch(
+            "app.main.settings", DummySettings()
+        ):
+            self.assertEqual(await calendar_feed._process(rds, feed, 1), 1)
+        _data, index = _stored(rds)
+        self.assertEqual(list(index.values()), [1735732800])
 
 
 if __name__ == "__main__":
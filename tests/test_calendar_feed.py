@@ -0,0 +1,165 @@
+import json
+import os
+import sys
+import types
+import unittest
+from unittest.mock import AsyncMock, patch
+
+# Stub external dependencies similar to other tests
+sys.modules.setdefault(
+    "redis",
+    types.SimpleNamespace(
+        asyncio=types.SimpleNamespace(
+            from_url=lambda *a, **k: None,
+            ConnectionPool=types.SimpleNamespace(from_url=lambda *a, **k: None),
+            Redis=lambda *a, **k: types.SimpleNamespace(),
+        ),
+        ConnectionPool=types.SimpleNamespace(from_url=lambda *a, **k: None),
+        Redis=lambda *a, **k: types.SimpleNamespace(),
+    ),
+)
+sys.modules.setdefault(
+    "openai", types.SimpleNamespace(AsyncOpenAI=lambda *a, **k: None)
+)
+sys.modules.setdefault(
+    "tiktoken", types.SimpleNamespace(get_encoding=lambda name: lambda x: [])
+)
+
+
+class DummyModel:
+    def encode(self, *a, **k):
+        return []
+
+    def get_sentence_embedding_dimension(self):
+        return 0
+
+
+sys.modules.setdefault(
+    "sentence_transformers",
+    types.SimpleNamespace(SentenceTransformer=lambda *a, **k: DummyModel()),
+)
+redisvl_pkg = types.SimpleNamespace()
+redisvl_index = types.SimpleNamespace(AsyncSearchIndex=object)
+redisvl_schema = types.SimpleNamespace(IndexSchema=object)
+redisvl_filter = types.SimpleNamespace(Tag=object)
+redisvl_query = types.SimpleNamespace(VectorQuery=object, filter=redisvl_filter)
+sys.modules.setdefault("redisvl", redisvl_pkg)
+sys.modules.setdefault("redisvl.index", redisvl_index)
+sys.modules.setdefault("redisvl.schema", redisvl_schema)
+sys.modules.setdefault("redisvl.query", redisvl_query)
+sys.modules.setdefault("redisvl.query.filter", redisvl_filter)
+sys.modules.setdefault("pydantic_settings", types.SimpleNamespace(BaseSettings=object))
+sys.modules.setdefault("aioboto3", types.SimpleNamespace(Session=lambda *a, **k: None))
+sys.modules.setdefault("numpy", types.SimpleNamespace(array=lambda *a, **k: None))
+sys.modules.setdefault("websockets", types.SimpleNamespace())
+passlib_pkg = types.SimpleNamespace()
+passlib_context = types.SimpleNamespace(CryptContext=lambda *a, **k: None)
+sys.modules.setdefault("passlib", passlib_pkg)
+sys.modules.setdefault("passlib.context", passlib_context)
+crypto_pkg = types.SimpleNamespace()
+fernet_mod = types.SimpleNamespace(Fernet=lambda *a, **k: None, InvalidToken=Exception)
+sys.modules.setdefault("cryptography", crypto_pkg)
+sys.modules.setdefault("cryptography.fernet", fernet_mod)
+
+
+class DummyCelery:
+    def __init__(self, *a, **k):
+        self.conf = types.SimpleNamespace()
+
+    def task(self, func=None, *a, **k):
+        if func:
+            return func
+
+        def wrapper(f):
+            return f
+
+        return wrapper
+
+
+sys.modules.setdefault("celery", types.SimpleNamespace(Celery=DummyCelery))
+sys.modules.setdefault(
+    "celery.schedules", types.SimpleNamespace(crontab=lambda *a, **k: None)
+)
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from app.models import Message
+from app.services import calendar_feed
+
+
+class RecordingPipeline:
+    def __init__(self):
+        self.commands = []
+
+    def xadd(self, key, fields, **kwargs):
+        self.commands.append((key, fields))
+
+
+def feed_entry(mid, uuid, content):
+    data = json.dumps({"role": "user", "content": content})
+    return (mid, {b"uuid": uuid.encode(), b"data": data.encode()})
+
+
+class CalendarFeedTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        calendar_feed._group_ready = False
+        calendar_feed.settings = types.SimpleNamespace(
+            calendar_feed_maxlen=1000, calendar_claim_idle_ms=60000
+        )
+
+    def test_only_user_text_is_queued(self):
+        pipe = RecordingPipeline()
+        msgs = [
+            Message(role="user", content="remind me"),
+            Message(role="assistant", content="ok"),
+            Message(role="user", content=""),
+        ]
+        calendar_feed.queue_calendar_feed(pipe, "u1", msgs, ["a", "b", "c"])
+        self.assertEqual(
+            pipe.commands, [("calendar:feed", {"uuid": "u1", "data": "a"})]
+        )
+
+    async def test_consume_acks_processed_entries(self):
+        rds = AsyncMock()
+        rds.rename.side_effect = Exception("no such key")
+        rds.xautoclaim.return_value = [b"0-0", [feed_entry(b"1-0", "u0", "old")], []]
+        rds.xreadgroup.side_effect = [
+            [
+                (
+                    b"calendar:feed",
+                    [
+                        feed_entry(b"2-0", "u1", "first"),
+                        feed_entry(b"3-0", "u2", "second"),
+                        feed_entry(b"4-0", "u1", "third"),
+                    ],
+                )
+            ],
+            [],
+        ]
+
+        async def check(rds, uuid, msgs, tz="UTC"):
+            if uuid == "u2":
+                raise RuntimeError("llm down")
+
+        with patch("app.history_utils.decrypt_text", lambda x: x), patch(
+            "app.services.calendar._batch_check_calendar_events",
+            AsyncMock(side_effect=check),
+        ) as batch:
+            handled = await calendar_feed.consume_calendar_feed(rds, "w1", batch=10)
+
+        self.assertEqual(handled, 3)
+        rds.xgroup_create.assert_awaited_once_with(
+            "calendar:feed", "calendar", id="0", mkstream=True
+        )
+        calls = {
+            c.args[1]: [m.content for m in c.args[2]] for c in batch.await_args_list
+        }
+        self.assertEqual(
+            calls, {"u0": ["old"], "u1": ["first", "third"], "u2": ["second"]}
+        )
+        acked = [a for c in rds.xack.await_args_list for a in c.args[2:]]
+        # u2 failed and stays pending for another consumer to reclaim
+        self.assertEqual(sorted(acked), [b"1-0", b"2-0", b"4-0"])
+
+
+if __name__ == "__main__":
+    unittest.main()
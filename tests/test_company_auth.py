@@ -2,7 +2,7 @@ import os
 import sys
 import types
 import unittest
-from unittest.mock import AsyncMock
+from unittest.mock import AsyncMock, patch
 
 from fastapi.security import HTTPAuthorizationCredentials
 
@@ -57,6 +57,12 @@ class DummySettings:
         self.admin_key = None
         self.token_ttl = 100
         self.notification_service = "stub"
+        self.token_cache_size = 100
+        self.token_cache_ttl = 60
+        self.company_cache_size = 100
+        self.company_cache_ttl = 60
+        self.password_hash_workers = 2
+        self.password_hash_queue_size = 4
         self.cost_per_message = 0.0
         self.cost_per_token = 0.0
 
@@ -64,6 +70,7 @@ class DummySettings:
 app_config.get_settings = lambda: DummySettings()
 
 from app import company_auth
+from app.services import company as company_service
 
 company_auth.settings = app_config.get_settings()
 
@@ -145,6 +152,16 @@ class CompanyAuthTestCase(unittest.IsolatedAsyncioTestCase):
         name = await company_auth.get_current_company(credentials=new_creds)
         self.assertEqual(name, "c1")
 
+    async def test_rotation_evicts_cached_token(self):
+        self.rds.get.return_value = "c1"
+        creds = HTTPAuthorizationCredentials(scheme="Bearer", credentials="old")
+        await company_auth.get_current_company(credentials=creds)
+        self.rds.hgetall.return_value = {b"password": b"hashed-pass", b"token": b"old"}
+        await company_auth.rotate_company_key("c1")
+        self.rds.get.return_value = None
+        with self.assertRaises(company_auth.HTTPException):
+            await company_auth.get_current_company(credentials=creds)
+
     async def test_update_company_flags(self):
         self.rds.hgetall.return_value = {
             b"enable_summary": b"1",
@@ -160,5 +177,29 @@ class CompanyAuthTestCase(unittest.IsolatedAsyncioTestCase):
         self.assertFalse(res["enable_summary"])
 
 
+    async def test_company_settings_cached_until_flags_change(self):
+        company_service.company_cache().clear()
+        self.rds.hgetall.return_value = {
+            b"password": b"hashed-pass",
+            b"enable_facts": b"0",
+        }
+        app = types.SimpleNamespace(state=types.SimpleNamespace(redis=self.rds))
+        with patch.dict(sys.modules, {"app.main": types.SimpleNamespace(app=app)}):
+            flags = await company_service._company_features(
+                "c1", "enable_summary", "enable_facts"
+            )
+            self.assertEqual(flags, [True, False])
+            self.assertFalse(
+                await company_service._company_feature_enabled("c1", "enable_facts")
+            )
+            self.assertEqual(self.rds.hgetall.await_count, 1)
+            self.assertNotIn("password", await company_service.company_settings("c1"))
+
+            await company_auth.update_company_flags(
+                "c1", company_auth.CompanyFlagsUpdate(enable_facts=True)
+            )
+            self.rds.publish.assert_awaited_with("company:invalidate", "c1")
+            self.assertIsNone(company_service.company_cache().get("c1"))
+
 if __name__ == "__main__":
     unittest.main()
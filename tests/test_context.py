@@ -2,7 +2,7 @@ import os
 import sys
 import types
 import unittest
-from unittest.mock import AsyncMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 # Stub external dependencies similar to other tests
 sys.modules.setdefault(
@@ -90,6 +90,23 @@ if not hasattr(Message, "model_validate_json"):
     Message.model_validate_json = classmethod(lambda cls, data: cls.parse_raw(data))
 
 
+class FakePipeline:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queued = []
+
+    def xrange(self, key, min=None, max=None):
+        self.queued.append(self.rows.get(min, []))
+        return self
+
+    def hmget(self, key, ids):
+        self.queued.append([None for _ in ids])
+        return self
+
+    async def execute(self):
+        return self.queued
+
+
 class ContextTestCase(unittest.IsolatedAsyncioTestCase):
     async def test_duplicates_excluded(self):
         rds = AsyncMock()
@@ -98,31 +115,33 @@ class ContextTestCase(unittest.IsolatedAsyncioTestCase):
             ("2-0", {b"data": b'{"role":"user","type":"text","content":"m2"}'}),
             ("1-0", {b"data": b'{"role":"user","type":"text","content":"m1"}'}),
         ]
-
-        async def xrange(key, min=None, max=None):
-            if min == "2-0":
-                return [
-                    ("2-0", {b"data": b'{"role":"user","type":"text","content":"m2"}'})
-                ]
-            if min == "3-0":
-                return [
-                    ("3-0", {b"data": b'{"role":"user","type":"text","content":"m3"}'})
-                ]
-            return []
-
-        rds.xrange.side_effect = xrange
+        rows = {
+            "2-0": [("2-0", {b"data": b'{"role":"user","type":"text","content":"m2"}'})],
+            "3-0": [("3-0", {b"data": b'{"role":"user","type":"text","content":"m3"}'})],
+        }
+        pipe = FakePipeline(rows)
+        rds.pipeline = MagicMock(return_value=pipe)
+        rds.hmget.return_value = [None, None]
         rds.hget.return_value = None
-        with patch("app.routes.history.embed", lambda text: []), patch(
-            "app.routes.history.semantic_search", AsyncMock(return_value=["2-0", "3-0"])
-        ), patch("app.services.company._ensure_company", AsyncMock()), patch(
-            "app.services.facts._aggregate_facts", AsyncMock(return_value=None)
+        with patch("app.routes.history.aembed", AsyncMock(return_value=[])), patch(
+            "app.services.messages.semantic_search",
+            AsyncMock(return_value=["2-0", "3-0"]),
+        ), patch(
+            "app.services.messages.settings",
+            types.SimpleNamespace(vector_inline_payload=False),
+        ), patch("app.routes.history._ensure_company", AsyncMock()), patch(
+            "app.routes.history._aggregate_facts", AsyncMock(return_value=None)
         ), patch(
-            "app.routes.history.decrypt_text", lambda x: x
+            "app.history_utils.decrypt_text", lambda x: x
         ):
             resp = await get_context(
                 uuid="u1", limit=2, top_k=2, chat_id=None, user=("u1", "c1")
             )
             self.assertEqual([m.content for m in resp["relevant"]], ["m3"])
+            self.assertEqual([m.content for m in resp["messages"]], ["m1", "m2"])
+            # only the unseen hit is fetched, in a single pipeline
+            rds.pipeline.assert_called_once()
+            rds.xrange.assert_not_called()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,129 @@
+import asyncio
+import os
+import sys
+import types
+import unittest
+from unittest.mock import AsyncMock, patch
+
+# Stub external dependencies similar to other tests
+sys.modules.setdefault(
+    "redis",
+    types.SimpleNamespace(
+        asyncio=types.SimpleNamespace(
+            from_url=lambda *a, **k: None,
+            ConnectionPool=types.SimpleNamespace(from_url=lambda *a, **k: None),
+            Redis=lambda *a, **k: types.SimpleNamespace(),
+        ),
+        ConnectionPool=types.SimpleNamespace(from_url=lambda *a, **k: None),
+        Redis=lambda *a, **k: types.SimpleNamespace(),
+    ),
+)
+sys.modules.setdefault(
+    "openai", types.SimpleNamespace(AsyncOpenAI=lambda *a, **k: None)
+)
+sys.modules.setdefault(
+    "tiktoken", types.SimpleNamespace(get_encoding=lambda name: lambda x: [])
+)
+
+
+class DummyModel:
+    def encode(self, *a, **k):
+        return []
+
+    def get_sentence_embedding_dimension(self):
+        return 0
+
+
+sys.modules.setdefault(
+    "sentence_transformers",
+    types.SimpleNamespace(SentenceTransformer=lambda *a, **k: DummyModel()),
+)
+redisvl_pkg = types.SimpleNamespace()
+redisvl_index = types.SimpleNamespace(AsyncSearchIndex=object)
+redisvl_schema = types.SimpleNamespace(IndexSchema=object)
+redisvl_filter = types.SimpleNamespace(Tag=object)
+redisvl_query = types.SimpleNamespace(VectorQuery=object, filter=redisvl_filter)
+sys.modules.setdefault("redisvl", redisvl_pkg)
+sys.modules.setdefault("redisvl.index", redisvl_index)
+sys.modules.setdefault("redisvl.schema", redisvl_schema)
+sys.modules.setdefault("redisvl.query", redisvl_query)
+sys.modules.setdefault("redisvl.query.filter", redisvl_filter)
+sys.modules.setdefault("pydantic_settings", types.SimpleNamespace(BaseSettings=object))
+sys.modules.setdefault("aioboto3", types.SimpleNamespace(Session=lambda *a, **k: None))
+sys.modules.setdefault("numpy", types.SimpleNamespace(array=lambda *a, **k: None))
+sys.modules.setdefault("websockets", types.SimpleNamespace())
+passlib_pkg = types.SimpleNamespace()
+passlib_context = types.SimpleNamespace(CryptContext=lambda *a, **k: None)
+sys.modules.setdefault("passlib", passlib_pkg)
+sys.modules.setdefault("passlib.context", passlib_context)
+crypto_pkg = types.SimpleNamespace()
+fernet_mod = types.SimpleNamespace(Fernet=lambda *a, **k: None, InvalidToken=Exception)
+sys.modules.setdefault("cryptography", crypto_pkg)
+sys.modules.setdefault("cryptography.fernet", fernet_mod)
+
+
+class DummyCelery:
+    def __init__(self, *a, **k):
+        self.conf = types.SimpleNamespace()
+
+    def task(self, func=None, *a, **k):
+        if func:
+            return func
+
+        def wrapper(f):
+            return f
+
+        return wrapper
+
+
+sys.modules.setdefault("celery", types.SimpleNamespace(Celery=DummyCelery))
+sys.modules.setdefault(
+    "celery.schedules", types.SimpleNamespace(crontab=lambda *a, **k: None)
+)
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from app.services.embedding_batcher import EmbeddingBatcher
+
+
+class EmbeddingBatcherTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrent_texts_share_one_batch(self):
+        calls = []
+
+        async def aembed_many(rds, texts):
+            calls.append(list(texts))
+            return [[float(len(t))] for t in texts]
+
+        batcher = EmbeddingBatcher(max_batch=8, max_wait_ms=50)
+        with patch("app.embeddings.aembed_many", aembed_many), patch(
+            "app.vector.upsert_embeddings", AsyncMock()
+        ) as upsert:
+            await asyncio.gather(
+                *(batcher.submit("u1", f"{i}-0", f"text {i}") for i in range(5))
+            )
+            await batcher.stop()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(calls[0]), 5)
+        upsert.assert_awaited_once()
+        rows = upsert.await_args.args[0]
+        self.assertEqual([r["message_id"] for r in rows], [f"{i}-0" for i in range(5)])
+        stats = batcher.stats()
+        self.assertEqual(stats["texts"], 5)
+        self.assertEqual(stats["batches"], 1)
+        self.assertEqual(stats["batch_size_histogram"]["le_8"], 1)
+
+    async def test_batches_are_capped(self):
+        batcher = EmbeddingBatcher(max_batch=2, max_wait_ms=50)
+        with patch(
+            "app.embeddings.aembed_many",
+            AsyncMock(side_effect=lambda rds, texts: [[0.0] for _ in texts]),
+        ), patch("app.vector.upsert_embeddings", AsyncMock()) as upsert:
+            for i in range(5):
+                await batcher.submit("u1", f"{i}-0", "x")
+            await batcher.stop()
+        self.assertEqual(
+            [len(c.args[0]) for c in upsert.await_args_list], [2, 2, 1]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,191 @@
+import os
+import sys
+import tempfile
+import types
+import unittest
+from unittest.mock import patch
+
+# Stub external dependencies similar to other tests
+sys.modules.setdefault(
+    "redis",
+    types.SimpleNamespace(
+        asyncio=types.SimpleNamespace(
+            from_url=lambda *a, **k: None,
+            ConnectionPool=types.SimpleNamespace(from_url=lambda *a, **k: None),
+            Redis=lambda *a, **k: types.SimpleNamespace(),
+        ),
+        ConnectionPool=types.SimpleNamespace(from_url=lambda *a, **k: None),
+        Redis=lambda *a, **k: types.SimpleNamespace(),
+    ),
+)
+sys.modules.setdefault(
+    "openai", types.SimpleNamespace(AsyncOpenAI=lambda *a, **k: None)
+)
+sys.modules.setdefault(
+    "tiktoken", types.SimpleNamespace(get_encoding=lambda name: lambda x: [])
+)
+
+
+class DummyModel:
+    def encode(self, *a, **k):
+        return []
+
+    def get_sentence_embedding_dimension(self):
+        return 0
+
+
+sys.modules.setdefault(
+    "sentence_transformers",
+    types.SimpleNamespace(SentenceTransformer=lambda *a, **k: DummyModel()),
+)
+redisvl_pkg = types.SimpleNamespace()
+redisvl_index = types.SimpleNamespace(AsyncSearchIndex=object)
+redisvl_schema = types.SimpleNamespace(IndexSchema=object)
+redisvl_filter = types.SimpleNamespace(Tag=object)
+redisvl_query = types.SimpleNamespace(VectorQuery=object, filter=redisvl_filter)
+sys.modules.setdefault("redisvl", redisvl_pkg)
+sys.modules.setdefault("redisvl.index", redisvl_index)
+sys.modules.setdefault("redisvl.schema", redisvl_schema)
+sys.modules.setdefault("redisvl.query", redisvl_query)
+sys.modules.setdefault("redisvl.query.filter", redisvl_filter)
+sys.modules.setdefault("pydantic_settings", types.SimpleNamespace(BaseSettings=object))
+sys.modules.setdefault("aioboto3", types.SimpleNamespace(Session=lambda *a, **k: None))
+sys.modules.setdefault("websockets", types.SimpleNamespace())
+passlib_pkg = types.SimpleNamespace()
+passlib_context = types.SimpleNamespace(CryptContext=lambda *a, **k: None)
+sys.modules.setdefault("passlib", passlib_pkg)
+sys.modules.setdefault("passlib.context", passlib_context)
+crypto_pkg = types.SimpleNamespace()
+fernet_mod = types.SimpleNamespace(Fernet=lambda *a, **k: None, InvalidToken=Exception)
+sys.modules.setdefault("cryptography", crypto_pkg)
+sys.modules.setdefault("cryptography.fernet", fernet_mod)
+
+
+class DummyCelery:
+    def __init__(self, *a, **k):
+        self.conf = types.SimpleNamespace()
+
+    def task(self, func=None, *a, **k):
+        if func:
+            return func
+
+        def wrapper(f):
+            return f
+
+        return wrapper
+
+
+sys.modules.setdefault("celery", types.SimpleNamespace(Celery=DummyCelery))
+sys.modules.setdefault(
+    "celery.schedules", types.SimpleNamespace(crontab=lambda *a, **k: None)
+)
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+import numpy as np
+
+from app import embeddings
+
+
+class CountingModel:
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, **kwargs):
+        self.calls.append(list(texts))
+        return np.array([[float(len(t)), 1.0] for t in texts])
+
+
+class FakeRedis:
+    def __init__(self):
+        self.store = {}
+
+    async def mget(self, keys):
+        return [self.store.get(k) for k in keys]
+
+    def pipeline(self, transaction=False):
+        rds = self
+
+        class Pipe:
+            def set(self, key, value, ex=None):
+                rds.store[key] = value
+
+            async def execute(self):
+                return []
+
+        return Pipe()
+
+
+class EmbeddingCacheTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        embeddings._local_cache.cache_clear()
+        self.model = CountingModel()
+        self.settings = types.SimpleNamespace(
+            hf_embed_model="dummy", embed_cache_size=16, embed_cache_ttl=60
+        )
+
+    async def test_shared_tier_survives_local_cache_loss(self):
+        rds = FakeRedis()
+        with patch.object(embeddings, "get_model", lambda: self.model), patch.object(
+            embeddings, "settings", self.settings
+        ):
+            first = await embeddings.aembed_many(rds, ["hello", "hi", "hello"])
+            self.assertEqual(self.model.calls, [["hello", "hi"]])
+            self.assertEqual(first[0].dtype, np.float32)
+            self.assertEqual(len(rds.store), 2)
+            # a new process starts with an empty in-process tier
+            embeddings._local_cache.cache_clear()
+            again = await embeddings.aembed(rds, "hello")
+            self.assertEqual(self.model.calls, [["hello", "hi"]])
+            np.testing.assert_array_equal(again, first[0])
+
+    async def test_local_tier_without_redis(self):
+        with patch.object(embeddings, "get_model", lambda: self.model), patch.object(
+            embeddings, "settings", self.settings
+        ):
+            await embeddings.aembed(None, "hello")
+            await embeddings.aembed(None, "hello")
+        self.assertEqual(self.model.calls, [["hello"]])
+        self.assertEqual(embeddings._local_cache().stats()["hits"], 1)
+
+    def test_key_depends_on_model(self):
+        with patch.object(embeddings, "settings", self.settings):
+            key_a = embeddings._cache_key("hello")
+            self.settings.hf_embed_model = "other"
+            key_b = embeddings._cache_key("hello")
+        self.assertNotEqual(key_a, key_b)
+
+
+class EmbeddingDimensionTestCase(unittest.TestCase):
+    def setUp(self):
+        embeddings.embedding_dimension.cache_clear()
+        self.addCleanup(embeddings.embedding_dimension.cache_clear)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.settings = types.SimpleNamespace(
+            hf_embed_model="dummy",
+            embed_dimension=None,
+            embed_meta_path=os.path.join(self.tmp.name, "meta", "embeddings.json"),
+        )
+
+    def test_configured_dimension_skips_model(self):
+        self.settings.embed_dimension = 384
+        with patch.object(embeddings, "settings", self.settings), patch.object(
+            embeddings, "get_model", side_effect=AssertionError("model loaded")
+        ):
+            self.assertEqual(embeddings.embedding_dimension(), 384)
+
+    def test_dimension_recorded_for_next_start(self):
+        model = types.SimpleNamespace(get_sentence_embedding_dimension=lambda: 8)
+        with patch.object(embeddings, "settings", self.settings), patch.object(
+            embeddings, "get_model", lambda: model
+        ):
+            self.assertEqual(embeddings.embedding_dimension(), 8)
+        embeddings.embedding_dimension.cache_clear()
+        with patch.object(embeddings, "settings", self.settings), patch.object(
+            embeddings, "get_model", side_effect=AssertionError("model loaded")
+        ):
+            self.assertEqual(embeddings.embedding_dimension(), 8)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -29,10 +29,26 @@ class DummyFernet:
 class InvalidToken(Exception):
     pass
 
+class DummyMultiFernet:
+    def __init__(self, fernets):
+        self.fernets = fernets
+
+    def encrypt(self, data: bytes) -> bytes:
+        return self.fernets[0].encrypt(data)
+
+    def decrypt(self, token: bytes) -> bytes:
+        for f in self.fernets:
+            try:
+                return f.decrypt(token)
+            except InvalidToken:
+                continue
+        raise InvalidToken()
+
 # Stub external modules used by encryption
 sys.modules['cryptography'] = types.SimpleNamespace()
 sys.modules['cryptography.fernet'] = types.SimpleNamespace(
     Fernet=DummyFernet,
+    MultiFernet=DummyMultiFernet,
     InvalidToken=InvalidToken,
 )
 
@@ -46,8 +62,9 @@ importlib.reload(encryption)
 VALID_KEY = base64.urlsafe_b64encode(b'0' * 32).decode()
 
 class DummySettings:
-    def __init__(self, key=None):
+    def __init__(self, key=None, old_keys=None):
         self.encryption_key = key
+        self.encryption_old_keys = old_keys
         self.notification_service = 'stub'
 
 class EncryptionTestCase(unittest.TestCase):
@@ -67,6 +84,17 @@ class EncryptionTestCase(unittest.TestCase):
         encryption.settings = DummySettings('invalid')
         encryption._KEY = None
         self.assertEqual(encryption.decrypt_text(token), token)
+    def test_old_key_still_decrypts_after_rotation(self):
+        token = encryption.encrypt_text('secret')
+        new_key = base64.urlsafe_b64encode(b'1' * 32).decode()
+        encryption.settings = DummySettings(new_key, f' {VALID_KEY} ')
+        encryption._KEY = None
+        self.assertEqual(encryption.decrypt_text(token), 'secret')
+        rotated = encryption.encrypt_text('secret')
+        encryption.settings = DummySettings(new_key)
+        encryption._KEY = None
+        self.assertEqual(encryption.decrypt_text(rotated), 'secret')
+        self.assertEqual(encryption.decrypt_text(token), token)
 
 if __name__ == '__main__':
     unittest.main()
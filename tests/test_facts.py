@@ -3,7 +3,7 @@ import os
 import sys
 import types
 import unittest
-from unittest.mock import AsyncMock
+from unittest.mock import AsyncMock, patch
 
 sys.modules.setdefault(
     "redis",
@@ -143,11 +143,21 @@ class FactsTestCase(unittest.IsolatedAsyncioTestCase):
         rds.xrange.return_value = [
             ("2-0", {b"data": b'{"role":"user","content":"remember: a"}'}),
             ("3-0", {b"data": b'{"role":"user","content":"remember: b"}'}),
+            # plaintext role field: not decrypted
+            ("4-0", {b"role": b"assistant", b"data": b"remember: c"}),
         ]
-        await worker_tasks._async_update_facts("u1")
+        decrypted = []
+
+        def decrypt(token):
+            decrypted.append(token)
+            return token
+
+        with patch("app.history_utils.decrypt_text", decrypt):
+            await worker_tasks._async_update_facts("u1")
+        self.assertEqual(len(decrypted), 2)
         rds.xrange.assert_awaited_with("user:u1:history", min="(1-0", max="+")
         rds.sadd.assert_awaited_with("user:u1:facts", "a", "b")
-        rds.set.assert_awaited_with("facts:last:u1", "3-0")
+        rds.set.assert_awaited_with("facts:last:u1", "4-0")
 
 
 if __name__ == "__main__":
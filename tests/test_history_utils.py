@@ -0,0 +1,365 @@
+import os
+import sys
+import types
+import unittest
+from unittest.mock import AsyncMock, patch
+
+# Stub external dependencies similar to other tests
+sys.modules.setdefault(
+    "redis",
+    types.SimpleNamespace(
+        asyncio=types.SimpleNamespace(
+            from_url=lambda *a, **k: None,
+            ConnectionPool=types.SimpleNamespace(from_url=lambda *a, **k: None),
+            Redis=lambda *a, **k: types.SimpleNamespace(),
+        ),
+        ConnectionPool=types.SimpleNamespace(from_url=lambda *a, **k: None),
+        Redis=lambda *a, **k: types.SimpleNamespace(),
+    ),
+)
+sys.modules.setdefault(
+    "openai", types.SimpleNamespace(AsyncOpenAI=lambda *a, **k: None)
+)
+sys.modules.setdefault(
+    "tiktoken", types.SimpleNamespace(get_encoding=lambda name: lambda x: [])
+)
+
+
+class DummyModel:
+    def encode(self, *a, **k):
+        return []
+
+    def get_sentence_embedding_dimension(self):
+        return 0
+
+
+sys.modules.setdefault(
+    "sentence_transformers",
+    types.SimpleNamespace(SentenceTransformer=lambda *a, **k: DummyModel()),
+)
+redisvl_pkg = types.SimpleNamespace()
+redisvl_index = types.SimpleNamespace(AsyncSearchIndex=object)
+redisvl_schema = types.SimpleNamespace(IndexSchema=object)
+redisvl_filter = types.SimpleNamespace(Tag=object)
+redisvl_query = types.SimpleNamespace(VectorQuery=object, filter=redisvl_filter)
+sys.modules.setdefault("redisvl", redisvl_pkg)
+sys.modules.setdefault("redisvl.index", redisvl_index)
+sys.modules.setdefault("redisvl.schema", redisvl_schema)
+sys.modules.setdefault("redisvl.query", redisvl_query)
+sys.modules.setdefault("redisvl.query.filter", redisvl_filter)
+sys.modules.setdefault("pydantic_settings", types.SimpleNamespace(BaseSettings=object))
+sys.modules.setdefault("aioboto3", types.SimpleNamespace(Session=lambda *a, **k: None))
+sys.modules.setdefault("numpy", types.SimpleNamespace(array=lambda *a, **k: None))
+sys.modules.setdefault("websockets", types.SimpleNamespace())
+passlib_pkg = types.SimpleNamespace()
+passlib_context = types.SimpleNamespace(CryptContext=lambda *a, **k: None)
+sys.modules.setdefault("passlib", passlib_pkg)
+sys.modules.setdefault("passlib.context", passlib_context)
+crypto_pkg = types.SimpleNamespace()
+fernet_mod = types.SimpleNamespace(Fernet=lambda *a, **k: None, InvalidToken=Exception)
+sys.modules.setdefault("cryptography", crypto_pkg)
+sys.modules.setdefault("cryptography.fernet", fernet_mod)
+
+
+class DummyCelery:
+    def __init__(self, *a, **k):
+        self.conf = types.SimpleNamespace()
+
+    def task(self, func=None, *a, **k):
+        if func:
+            return func
+
+        def wrapper(f):
+            return f
+
+        return wrapper
+
+
+sys.modules.setdefault("celery", types.SimpleNamespace(Celery=DummyCelery))
+sys.modules.setdefault(
+    "celery.schedules", types.SimpleNamespace(crontab=lambda *a, **k: None)
+)
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from app import compression, envelope, history_utils
+from app.models import Message
+
+
+class FakePipeline:
+    def __init__(self, results):
+        self.commands = []
+        self.results = results
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+            return self
+
+        return queue
+
+    async def execute(self):
+        return self.results
+
+
+class BatchWriteTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_single_round_trip(self):
+        # SET last_seen, 2x XADD, XADD calendar feed, 2x HINCRBY role,
+        # HINCRBY type, 4x INCRBY, XLEN
+        results = [True, b"1-0", b"2-0", b"9-0", 1, 1, 2, 2, 2, 5, 5, 12]
+        pipe = FakePipeline(results)
+        rds = types.SimpleNamespace(pipeline=lambda transaction=True: pipe)
+        msgs = [
+            Message(role="user", content="hello"),
+            Message(role="assistant", content="hi there"),
+        ]
+        with patch("app.envelope.seal", lambda data, aad: None):
+            ids, length = await history_utils._add_messages_to_stream(
+                rds, "u1", msgs, company="c1", tokens=5, last_seen=1000
+            )
+        self.assertEqual(ids, ["1-0", "2-0"])
+        self.assertEqual(length, 12)
+        names = [c[0] for c in pipe.commands]
+        xadds = [c[1][0] for c in pipe.commands if c[0] == "xadd"]
+        # only the user message can carry a calendar command
+        self.assertEqual(xadds, ["user:u1:history"] * 2 + ["calendar:feed"])
+        self.assertEqual(names.count("incrby"), 4)
+        self.assertEqual(names[0], "set")
+        self.assertEqual(names[-1], "xlen")
+        self.assertIn(
+            ("hincrby", ("user:u1:stats:type", "text", 2), {}), pipe.commands
+        )
+
+
+class HydrateTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_single_pipeline_preserves_order(self):
+        rows = {
+            "1-0": [("1-0", {b"data": b'{"role":"user","content":"one"}'})],
+            "3-0": [("3-0", {b"data": b'{"role":"user","content":"three"}'})],
+        }
+
+        class Pipe(FakePipeline):
+            def xrange(self, key, min=None, max=None):
+                self.commands.append(("xrange", (key,), {}))
+                self.results.append(rows.get(min, []))
+                return self
+
+            def hmget(self, key, ids):
+                self.commands.append(("hmget", (key, ids), {}))
+                self.results.append([b'["a"]', None, b"broken"])
+                return self
+
+        pipe = Pipe([])
+        rds = types.SimpleNamespace(pipeline=lambda transaction=False: pipe)
+        with patch("app.history_utils.decrypt_text", lambda x: x):
+            hits = await history_utils.hydrate_messages(
+                rds, "u1", [b"3-0", "2-0", "1-0"]
+            )
+        self.assertEqual([mid for mid, _ in hits], ["3-0", "1-0"])
+        self.assertEqual(hits[0][1].content, "three")
+        self.assertEqual(hits[0][1].tags, ["a"])
+        self.assertEqual(hits[1][1].tags, [])
+        self.assertEqual(
+            pipe.commands[-1], ("hmget", ("user:u1:msg_tags", ["3-0", "2-0", "1-0"]), {})
+        )
+
+
+class VectorHitsTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_inline_payloads_skip_stream(self):
+        hits = [
+            {
+                "message_id": "2-0",
+                "blob": '{"role":"user","content":"two"}',
+                "stream": "user:u1:history",
+                "tags": "a,b",
+            },
+            {
+                "message_id": "3-0",
+                "blob": '{"role":"user","content":"other"}',
+                "stream": "chat:c1:history",
+                "tags": None,
+            },
+            {"message_id": "1-0", "blob": None, "stream": None, "tags": None},
+        ]
+        fallback = AsyncMock(return_value=[("1-0", Message(role="user", content="one"))])
+        with patch("app.history_utils.decrypt_text", lambda x: x), patch(
+            "app.history_utils.hydrate_messages", fallback
+        ):
+            out = await history_utils.decode_vector_hits(object(), "u1", hits)
+        self.assertEqual([mid for mid, _ in out], ["2-0", "1-0"])
+        self.assertEqual(out[0][1].content, "two")
+        self.assertEqual(out[0][1].tags, ["a", "b"])
+        # only the hit without a payload goes back to the stream
+        fallback.assert_awaited_once()
+        self.assertEqual(fallback.await_args.args[2], ["1-0"])
+
+
+class CompressionTestCase(unittest.IsolatedAsyncioTestCase):
+    def test_codecs_round_trip(self):
+        text = "сообщение " * 100
+        for algo in compression.available_codecs():
+            packed = history_utils._compress_text(text, algo)
+            self.assertEqual(history_utils._decompress_text(packed, algo), text)
+        with self.assertRaises(ValueError):
+            history_utils._compress_text(text, "brotli")
+
+    async def test_missing_dictionary_loaded_from_redis(self):
+        class DictCodec(compression.Codec):
+            name = "test-dict"
+
+            def decompress(self, data, dict_id=None):
+                if dict_id not in compression._dictionaries:
+                    raise compression.MissingDictionary(dict_id)
+                return data.replace(b"@", compression._dictionaries[dict_id])
+
+        compression.register_codec(DictCodec)
+        msg = Message(
+            role="user",
+            content=history_utils._compress_text("@ world", "none"),
+            extra={"compressed": True, "compress_algo": "test-dict", "compress_dict": 7},
+        )
+        rds = AsyncMock()
+        rds.get.return_value = b"hello"
+        with patch("app.history_utils.decrypt_text", lambda x: x):
+            out = await history_utils.decode_payload(rds, msg.model_dump_json())
+        self.assertEqual(out.content, "hello world")
+        rds.get.assert_awaited_once_with("zstd:dict:7")
+
+
+class EnvelopeTestCase(unittest.TestCase):
+    def test_binary_entry_round_trip(self):
+        text = "длинное сообщение " * 50
+        msg = Message(
+            role="user",
+            content=text,
+            importance=3,
+            extra={"compressed": True, "compress_algo": "gzip"},
+        )
+        with patch("app.envelope.seal", lambda data, aad: None):
+            data = history_utils.encode_message(msg)
+        self.assertEqual(data[:2], b"\x01\x02")
+        # raw compressed content, no base64 and no JSON escaping
+        self.assertLess(len(data), len(text.encode()) // 4)
+        out = history_utils._decode_data(data)
+        self.assertEqual(out.content, text)
+        self.assertEqual(out.importance, 3)
+        self.assertEqual(out.ts, msg.ts)
+
+    def test_entry_decoded_as_text(self):
+        # e.g. an inline payload read through a client decoding replies as UTF-8
+        msg = Message(role="user", content="hi")
+        with patch("app.envelope.seal", lambda data, aad: None):
+            data = history_utils.encode_message(msg)
+        self.assertEqual(history_utils._decode_data(data.decode()).content, "hi")
+
+    def test_encrypted_entry_authenticates_header(self):
+        sealed = {}
+
+        def seal(data, aad):
+            sealed["aad"] = aad
+            return b"n" * 12 + data[::-1]
+
+        def unseal(blob, aad, keyed=True):
+            self.assertEqual(aad, sealed["aad"])
+            return blob[12:][::-1]
+
+        msg = Message(role="assistant", content=None)
+        with patch("app.envelope.seal", seal), patch("app.envelope.unseal", unseal):
+            data = history_utils.encode_message(msg)
+            self.assertEqual(data[:2], b"\x01\x09")
+            self.assertIsNone(history_utils._decode_data(data).content)
+
+    def test_legacy_entry_still_read(self):
+        legacy = Message(
+            role="user",
+            content=history_utils._compress_text("old text", "gzip"),
+            extra={"compressed": True, "compress_algo": "gzip"},
+        ).model_dump_json()
+        with patch("app.history_utils.decrypt_text", lambda x: x):
+            out = history_utils._decode_message({b"data": legacy.encode()})
+        self.assertEqual(out.content, "old text")
+
+
+class FieldEncryptionTestCase(unittest.IsolatedAsyncioTestCase):
+    def test_routing_metadata_in_clear(self):
+        sealed = {}
+
+        def seal(data, aad):
+            sealed["aad"] = aad
+            return b"n" * 12 + bytes(b ^ 0xFF for b in data)
+
+        def unseal(blob, aad, keyed=True):
+            self.assertEqual(aad, sealed["aad"])
+            return bytes(b ^ 0xFF for b in blob[12:])
+
+        msg = Message(role="user", content="secret", importance=4, extra={"k": "v"})
+        with patch("app.envelope.seal", seal), patch(
+            "app.envelope.unseal", unseal
+        ), patch.object(history_utils.settings, "encryption_mode", "fields"):
+            data = history_utils.encode_message(msg)
+            fields = history_utils.stream_fields(msg, data)
+            out = history_utils._decode_data(data)
+        self.assertEqual(data[:2], b"\x01\x0f")
+        self.assertNotIn(b"secret", data)
+        self.assertNotIn(b'"k"', data)
+        # the clear metadata is authenticated with the header
+        self.assertEqual(sealed["aad"], data[: len(sealed["aad"])])
+        self.assertEqual(
+            envelope.peek_fields(data),
+            {"role": "user", "type": "text", "ts": msg.ts.isoformat(), "importance": 4},
+        )
+        self.assertEqual(fields["role"], "user")
+        self.assertEqual(fields["importance"], 4)
+        self.assertEqual(fields["data"], data)
+        self.assertEqual(out, msg)
+
+    def test_needs_rewrap(self):
+        def seal(data, aad):
+            return b"old!" + b"n" * 12 + data
+
+        msg = Message(role="user", content="hi")
+        with patch("app.envelope.seal", seal):
+            old = history_utils.encode_message(msg)
+        with patch("app.envelope.seal", lambda data, aad: None):
+            plain = history_utils.encode_message(msg)
+        self.assertEqual(envelope.key_id(old), b"old!")
+        self.assertIsNone(envelope.key_id(plain))
+        with patch("app.history_utils.current_key_id", lambda: b"new!"):
+            self.assertTrue(history_utils.needs_rewrap(old))
+            self.assertTrue(history_utils.needs_rewrap(plain))
+            self.assertTrue(history_utils.needs_rewrap(msg.model_dump_json()))
+        with patch("app.history_utils.current_key_id", lambda: b"old!"):
+            self.assertFalse(history_utils.needs_rewrap(old))
+
+    async def test_batch_skips_undecodable(self):
+        with patch("app.envelope.seal", lambda data, aad: None):
+            good = history_utils.encode_message(Message(role="user", content="ok"))
+        with patch("app.history_utils.decrypt_text", lambda x: x):
+            out = await history_utils.decode_payloads(
+                AsyncMock(), [good, b"gAAAA-not-a-token", b"\x09\x00"]
+            )
+        self.assertEqual(out[0].content, "ok")
+        self.assertEqual(out[1:], [None, None])
+
+    async def test_batch_skips_corrupt_envelopes(self):
+        msg = Message(
+            role="user",
+            content="длинное сообщение " * 50,
+            extra={"compressed": True, "compress_algo": "gzip"},
+        )
+        with patch("app.envelope.seal", lambda data, aad: None):
+            good = history_utils.encode_message(msg)
+        corrupt = [
+            good[:1],  # truncated header
+            good[:4],  # truncated length prefix
+            good[:-20] + b"\x00" * 20,  # broken gzip body
+        ]
+        out = await history_utils.decode_payloads(AsyncMock(), [good] + corrupt)
+        self.assertEqual(out[0].content, msg.content)
+        self.assertEqual(out[1:], [None, None, None])
+        with patch("app.history_utils.current_key_id", lambda: b"new!"):
+            for data in corrupt[:2]:
+                self.assertTrue(history_utils.needs_rewrap(data))
+
+
+if __name__ == "__main__":
+    unittest.main()
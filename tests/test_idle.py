@@ -1,8 +1,9 @@
+import fnmatch
 import os
 import sys
 import types
 import unittest
-from unittest.mock import AsyncMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 # Stub external dependencies similar to other tests
 sys.modules.setdefault(
@@ -84,26 +85,32 @@ sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 from worker import tasks as worker_tasks
 
 
+class FakePipeline:
+    def __init__(self, results):
+        self.commands = []
+        self.results = results
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+            return self
+
+        return queue
+
+    async def execute(self):
+        return self.results
+
+
 class IdleProcessingTestCase(unittest.IsolatedAsyncioTestCase):
     async def test_idle_user_triggers_processing(self):
         rds = AsyncMock()
         worker_tasks.redis.Redis = lambda *a, **k: rds
-        rds.keys.return_value = [b"user:u1:data"]
-
-        now = 1000
-
-        async def hget_side_effect(key, field):
-            if key == "user:u1:data" and field == "company_id":
-                return b"c1"
-            if key == "company:c1:data" and field == "idle_timeout":
-                return b"10"
-            return None
-
-        rds.hget.side_effect = hget_side_effect
-        rds.get.return_value = str(now - 20)
-        rds.xrevrange.return_value = [
-            ("1-0", {b"data": b'{"role":"user","content":"hello"}'})
-        ]
+        rds.hgetall.return_value = {b"c1": b"10", b"c2": b"0"}
+        rds.zrangebyscore.return_value = [b"u1"]
+        last = FakePipeline(
+            [[("1-0", {b"data": b'{"role":"user","content":"hello"}'})]]
+        )
+        rds.pipeline = MagicMock(return_value=last)
 
         with patch.object(
             worker_tasks,
@@ -117,7 +124,7 @@ class IdleProcessingTestCase(unittest.IsolatedAsyncioTestCase):
             "app.services.calendar._check_and_store_calendar_event",
             AsyncMock(),
         ) as chk, patch(
-            "app.encryption.decrypt_text", lambda x: x
+            "app.history_utils.decrypt_text", lambda x: x
         ):
             await worker_tasks._async_process_idle_users()
             sum_task.delay.assert_called_with(
@@ -125,6 +132,117 @@ class IdleProcessingTestCase(unittest.IsolatedAsyncioTestCase):
             )
             upd_task.delay.assert_called_with("u1")
             chk.assert_awaited()
+        # only the company with a timeout is scanned, no KEYS over the keyspace
+        rds.keys.assert_not_called()
+        self.assertEqual(rds.zrangebyscore.await_args.args[0], "company:c1:last_seen")
+        # the user leaves the set only once processed
+        rds.zremrangebyscore.assert_not_called()
+        script, _n, key, _cutoff, *done = rds.eval.await_args.args
+        self.assertEqual(script, worker_tasks._ACK_IDLE_SCRIPT)
+        self.assertEqual((key, done), ("company:c1:last_seen", ["u1"]))
+
+    async def test_failing_user_stays_and_others_are_processed(self):
+        rds = AsyncMock()
+        worker_tasks.redis.Redis = lambda *a, **k: rds
+        rds.hgetall.return_value = {b"c1": b"10"}
+        rds.zrangebyscore.return_value = [b"u1", b"u2"]
+        rds.pipeline = MagicMock(return_value=FakePipeline([[], []]))
+
+        def delay(uuid, threshold):
+            if uuid == "u1":
+                raise RuntimeError("broker down")
+
+        with patch.object(
+            worker_tasks, "summarize_if_needed", types.SimpleNamespace(delay=delay)
+        ), patch.object(
+            worker_tasks, "update_facts", types.SimpleNamespace(delay=MagicMock())
+        ) as upd_task:
+            await worker_tasks._async_process_idle_users()
+        upd_task.delay.assert_called_once_with("u2")
+        self.assertEqual(rds.eval.await_args.args[4:], ("u2",))
+
+
+class LastSeenBackfillTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_backfill_runs_once(self):
+        rds = AsyncMock()
+        rds.exists.return_value = 0
+
+        async def scan_iter(match=None, count=None):
+            for key in (b"user:u1:last_seen", b"user:u2:last_seen"):
+                yield key
+
+        rds.scan_iter = scan_iter
+        reads = FakePipeline([b"100", b"c1", b"200", None])
+        writes = FakePipeline([])
+        rds.pipeline = MagicMock(side_effect=[reads, writes])
+        await worker_tasks._backfill_last_seen(rds)
+        # u2 has no company and is skipped
+        self.assertEqual(
+            writes.commands,
+            [("zadd", ("company:c1:last_seen", {"u1": 100}), {"nx": True})],
+        )
+        rds.set.assert_awaited_once_with(worker_tasks.LAST_SEEN_BACKFILL_KEY, 1)
+
+        rds.exists.return_value = 1
+        rds.pipeline.reset_mock()
+        await worker_tasks._backfill_last_seen(rds)
+        rds.pipeline.assert_not_called()
+
+
+class HashRedis:
+    """In-memory hashes and strings for the idle timeout index."""
+
+    def __init__(self, hashes):
+        self.hashes = hashes
+        self.strings = {}
+
+    async def exists(self, key):
+        return int(key in self.hashes or key in self.strings)
+
+    async def set(self, key, value, ex=None):
+        self.strings[key] = value
+
+    async def hget(self, key, field):
+        return self.hashes.get(key, {}).get(field.encode())
+
+    async def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    async def hset(self, key, field=None, value=None, mapping=None):
+        row = self.hashes.setdefault(key, {})
+        for k, v in (mapping or {field: value}).items():
+            row[k.encode()] = v if isinstance(v, bytes) else str(v).encode()
+
+    async def scan_iter(self, match=None, count=None):
+        for key in list(self.hashes):
+            if fnmatch.fnmatch(key, match):
+                yield key.encode()
+
+
+class IdleTimeoutsTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_registration_keeps_existing_companies(self):
+        from app import company_auth
+
+        rds = HashRedis({"company:old:data": {b"idle_timeout": b"30"}})
+        with patch.object(
+            company_auth, "get_redis", AsyncMock(return_value=rds)
+        ), patch.object(
+            company_auth, "hash_password", AsyncMock(return_value="hashed")
+        ), patch.object(
+            company_auth, "invalidate_company", AsyncMock()
+        ):
+            await company_auth.register_company("new", "pass", idle_timeout=10)
+
+        self.assertEqual(
+            await worker_tasks._idle_timeouts(rds), {"old": 30, "new": 10}
+        )
+        self.assertIn(worker_tasks.IDLE_TIMEOUTS_BACKFILL_KEY, rds.strings)
+
+        # later runs read the index only
+        rds.hashes["company:gone:data"] = {b"idle_timeout": b"5"}
+        self.assertEqual(
+            await worker_tasks._idle_timeouts(rds), {"old": 30, "new": 10}
+        )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,49 @@
+import os
+import sys
+import types
+import unittest
+
+sys.modules.setdefault("pydantic_settings", types.SimpleNamespace(BaseSettings=object))
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from app import redis_pool
+
+
+class DummySettings:
+    def __init__(self):
+        self.redis_url = "redis://localhost/0"
+        self.redis_max_connections = 7
+        self.redis_pool_timeout = 1.0
+        self.redis_socket_timeout = None
+        self.redis_connect_timeout = 1.0
+        self.redis_socket_keepalive = True
+        self.redis_health_check_interval = 30
+
+
+class RedisPoolTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        redis_pool.settings = DummySettings()
+        await redis_pool.close_pool()
+
+    async def asyncTearDown(self):
+        await redis_pool.close_pool()
+
+    async def test_clients_share_one_pool(self):
+        first = redis_pool.get_client()
+        second = redis_pool.get_client()
+        self.assertIs(first.connection_pool, second.connection_pool)
+        pool = redis_pool.get_pool()
+        self.assertEqual(pool.max_connections, 7)
+        self.assertEqual(pool.connection_kwargs["health_check_interval"], 30)
+        self.assertTrue(pool.connection_kwargs["socket_keepalive"])
+
+    async def test_stats(self):
+        stats = redis_pool.pool_stats()
+        self.assertEqual(stats["in_use"], 0)
+        redis_pool.get_pool()
+        stats = redis_pool.pool_stats()
+        self.assertEqual(stats["max_connections"], 7)
+        self.assertEqual(stats["utilization"], 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,257 @@
+import os
+import sys
+import types
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+# Stub external dependencies similar to other tests
+sys.modules.setdefault(
+    "redis",
+    types.SimpleNamespace(
+        asyncio=types.SimpleNamespace(
+            from_url=lambda *a, **k: None,
+            ConnectionPool=types.SimpleNamespace(from_url=lambda *a, **k: None),
+            Redis=lambda *a, **k: types.SimpleNamespace(),
+        ),
+        ConnectionPool=types.SimpleNamespace(from_url=lambda *a, **k: None),
+        Redis=lambda *a, **k: types.SimpleNamespace(),
+    ),
+)
+sys.modules.setdefault(
+    "openai", types.SimpleNamespace(AsyncOpenAI=lambda *a, **k: None)
+)
+sys.modules.setdefault(
+    "tiktoken", types.SimpleNamespace(get_encoding=lambda name: lambda x: [])
+)
+
+
+class DummyModel:
+    def encode(self, *a, **k):
+        return []
+
+    def get_sentence_embedding_dimension(self):
+        return 0
+
+
+sys.modules.setdefault(
+    "sentence_transformers",
+    types.SimpleNamespace(SentenceTransformer=lambda *a, **k: DummyModel()),
+)
+redisvl_pkg = types.SimpleNamespace()
+redisvl_index = types.SimpleNamespace(AsyncSearchIndex=object)
+redisvl_schema = types.SimpleNamespace(IndexSchema=object)
+redisvl_filter = types.SimpleNamespace(Tag=object)
+redisvl_query = types.SimpleNamespace(VectorQuery=object, filter=redisvl_filter)
+sys.modules.setdefault("redisvl", redisvl_pkg)
+sys.modules.setdefault("redisvl.index", redisvl_index)
+sys.modules.setdefault("redisvl.schema", redisvl_schema)
+sys.modules.setdefault("redisvl.query", redisvl_query)
+sys.modules.setdefault("redisvl.query.filter", redisvl_filter)
+sys.modules.setdefault("pydantic_settings", types.SimpleNamespace(BaseSettings=object))
+sys.modules.setdefault("aioboto3", types.SimpleNamespace(Session=lambda *a, **k: None))
+sys.modules.setdefault("numpy", types.SimpleNamespace(array=lambda *a, **k: None))
+sys.modules.setdefault("websockets", types.SimpleNamespace())
+passlib_pkg = types.SimpleNamespace()
+passlib_context = types.SimpleNamespace(CryptContext=lambda *a, **k: None)
+sys.modules.setdefault("passlib", passlib_pkg)
+sys.modules.setdefault("passlib.context", passlib_context)
+crypto_pkg = types.SimpleNamespace()
+fernet_mod = types.SimpleNamespace(Fernet=lambda *a, **k: None, InvalidToken=Exception)
+sys.modules.setdefault("cryptography", crypto_pkg)
+sys.modules.setdefault("cryptography.fernet", fernet_mod)
+
+
+class DummyCelery:
+    def __init__(self, *a, **k):
+        self.conf = types.SimpleNamespace()
+
+    def task(self, func=None, *a, **k):
+        if func:
+            return func
+
+        def wrapper(f):
+            return f
+
+        return wrapper
+
+
+sys.modules.setdefault("celery", types.SimpleNamespace(Celery=DummyCelery))
+sys.modules.setdefault(
+    "celery.schedules", types.SimpleNamespace(crontab=lambda *a, **k: None)
+)
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from app.services import reminders
+from app.services.calendar import _add_event, _delete_event
+from worker import tasks as worker_tasks
+
+
+class FakePipeline:
+    def __init__(self, results=None):
+        self.commands = []
+        self.results = results or []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+            return self
+
+        return queue
+
+    async def execute(self):
+        return self.results
+
+
+class ReminderTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_event_schedules_reminder(self):
+        rds = AsyncMock()
+        pipe = FakePipeline()
+        rds.pipeline = MagicMock(return_value=pipe)
+        await _add_event(rds, "u1", "2025-01-01T10:00:00", "call mom")
+        # the reminder and the event are written in one MULTI
+        rds.pipeline.assert_called_once_with(transaction=True)
+        rds.hset.assert_not_awaited()
+        rds.zadd.assert_not_awaited()
+        (_n, (rkey,), rkw), (_n, (dkey, due), _kw), (_n, _a, ekw) = pipe.commands[:3]
+        rid = rkey.split(":")[1]
+        self.assertEqual(
+            rkw["mapping"], {"uuid": "u1", "text": "call mom", "due": 1735725600.0}
+        )
+        self.assertEqual((dkey, due), ("reminders:due", {rid: 1735725600.0}))
+        self.assertEqual(ekw["mapping"]["reminder"], rid)
+
+    async def test_delete_cancels_reminder(self):
+        rds = AsyncMock()
+        rds.eval.return_value = b"r1"
+        await _delete_event(rds, "u1", "e1")
+        rds.zrem.assert_any_await("reminders:due", "r1")
+        rds.zrem.assert_any_await("reminders:inflight", "r1")
+        rds.delete.assert_awaited_with("reminder:r1")
+
+    async def test_fired_reminder_not_rearmed_in_past(self):
+        rds = AsyncMock()
+        rds.zscore.return_value = None
+        await reminders.update_reminder(rds, "r1", "u1", "new", 1000)
+        rds.zadd.assert_not_awaited()
+
+    async def test_claim_due_parses_rows(self):
+        rds = AsyncMock()
+        pipe = FakePipeline([[b"r1"], [b"r2", b"r1"]])
+        rds.pipeline = MagicMock(return_value=pipe)
+        rds.eval.return_value = [b"r1", b"u1", b"hi", b"100.5"]
+        claimed = await reminders.claim_due(rds, now=200, limit=10)
+        self.assertEqual(
+            claimed, [{"id": "r1", "uuid": "u1", "text": "hi", "due": 100.5}]
+        )
+        # due and stale in-flight candidates, every touched key declared
+        self.assertEqual(
+            rds.eval.await_args.args[1:],
+            (
+                4,
+                "reminders:due",
+                "reminders:inflight",
+                "reminder:r1",
+                "reminder:r2",
+                200,
+                200 - reminders.INFLIGHT_TIMEOUT,
+                "r1",
+                "r2",
+            ),
+        )
+
+    async def test_claim_due_without_candidates(self):
+        rds = AsyncMock()
+        rds.pipeline = MagicMock(return_value=FakePipeline([[], []]))
+        self.assertEqual(await reminders.claim_due(rds, now=200), [])
+        rds.eval.assert_not_awaited()
+
+    async def test_dispatch_only_by_leader(self):
+        rds = AsyncMock()
+        worker_tasks.redis.Redis = lambda *a, **k: rds
+        rds.set.return_value = None
+        notify = types.SimpleNamespace(delay=MagicMock())
+        with patch.object(worker_tasks, "send_notification", notify):
+            self.assertEqual(await worker_tasks._async_dispatch_reminders(), 0)
+        rds.eval.assert_not_awaited()
+        notify.delay.assert_not_called()
+
+    async def test_dispatch_sends_and_records_lag(self):
+        rds = AsyncMock()
+        worker_tasks.redis.Redis = lambda *a, **k: rds
+        rds.set.return_value = True
+        rds.eval.side_effect = [[b"r1", b"u1", b"hi", b"100"], 1, 1]
+        pipe = FakePipeline([[b"r1"], []])
+        rds.pipeline = MagicMock(return_value=pipe)
+        notify = types.SimpleNamespace(delay=MagicMock())
+        with patch.object(worker_tasks, "send_notification", notify):
+            self.assertEqual(await worker_tasks._async_dispatch_reminders(), 1)
+        notify.delay.assert_called_once_with("u1", "hi")
+        self.assertIn(
+            ("hincrby", ("reminders:stats", "dispatched", 1), {}), pipe.commands
+        )
+        claim, ack, release = rds.eval.await_args_list
+        # acknowledged only after the notification was enqueued
+        self.assertEqual(ack.args[0], reminders._ACK_SCRIPT)
+        self.assertEqual(
+            ack.args[2:],
+            ("reminders:due", "reminders:inflight", "reminder:r1", "r1"),
+        )
+        self.assertEqual(release.args[2], "reminders:leader")
+
+    async def test_dispatch_renews_lock_between_batches(self):
+        rds = AsyncMock()
+        worker_tasks.redis.Redis = lambda *a, **k: rds
+        rds.set.return_value = True
+        rds.eval.side_effect = [[b"r1", b"u1", b"hi", b"100"], 1, 1, 1]
+        rds.pipeline = MagicMock(
+            side_effect=[
+                FakePipeline([[b"r1"], []]),
+                FakePipeline(),
+                FakePipeline([[], []]),
+            ]
+        )
+        notify = types.SimpleNamespace(delay=MagicMock())
+        with patch.object(worker_tasks, "send_notification", notify):
+            self.assertEqual(
+                await worker_tasks._async_dispatch_reminders(batch=1), 1
+            )
+        scripts = [c.args[0] for c in rds.eval.await_args_list]
+        self.assertEqual(
+            scripts,
+            [
+                reminders._CLAIM_SCRIPT,
+                reminders._ACK_SCRIPT,
+                reminders._RENEW_SCRIPT,
+                reminders._RELEASE_SCRIPT,
+            ],
+        )
+        _claim, _ack, renew, release = rds.eval.await_args_list
+        # the lock this run holds is extended, not someone else's
+        self.assertEqual(
+            renew.args[2:],
+            ("reminders:leader", release.args[3], worker_tasks.REMINDER_LEADER_TTL),
+        )
+
+    async def test_unsent_reminders_stay_in_flight(self):
+        rds = AsyncMock()
+        worker_tasks.redis.Redis = lambda *a, **k: rds
+        rds.set.return_value = True
+        rds.eval.side_effect = [
+            [b"r1", b"u1", b"hi", b"100", b"r2", b"u2", b"yo", b"100"],
+            1,
+            1,
+        ]
+        rds.pipeline = MagicMock(return_value=FakePipeline([[b"r1", b"r2"], []]))
+        notify = types.SimpleNamespace(
+            delay=MagicMock(side_effect=[None, RuntimeError("broker down")])
+        )
+        with patch.object(worker_tasks, "send_notification", notify):
+            with self.assertRaises(RuntimeError):
+                await worker_tasks._async_dispatch_reminders()
+        _claim, ack, _release = rds.eval.await_args_list
+        self.assertEqual(ack.args[-1], "r1")
+        self.assertNotIn("r2", ack.args)
+
+
+if __name__ == "__main__":
+    unittest.main()
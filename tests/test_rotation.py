@@ -0,0 +1,224 @@
+import os
+import sys
+import types
+import unittest
+from contextlib import ExitStack, contextmanager
+from unittest.mock import AsyncMock, MagicMock, patch
+
+# Stub external dependencies similar to other tests
+sys.modules.setdefault(
+    "redis",
+    types.SimpleNamespace(
+        asyncio=types.SimpleNamespace(
+            from_url=lambda *a, **k: None,
+            ConnectionPool=types.SimpleNamespace(from_url=lambda *a, **k: None),
+            Redis=lambda *a, **k: types.SimpleNamespace(),
+        ),
+        ConnectionPool=types.SimpleNamespace(from_url=lambda *a, **k: None),
+        Redis=lambda *a, **k: types.SimpleNamespace(),
+    ),
+)
+sys.modules.setdefault(
+    "openai", types.SimpleNamespace(AsyncOpenAI=lambda *a, **k: None)
+)
+sys.modules.setdefault(
+    "tiktoken", types.SimpleNamespace(get_encoding=lambda name: lambda x: [])
+)
+
+
+class DummyModel:
+    def encode(self, *a, **k):
+        return []
+
+    def get_sentence_embedding_dimension(self):
+        return 0
+
+
+sys.modules.setdefault(
+    "sentence_transformers",
+    types.SimpleNamespace(SentenceTransformer=lambda *a, **k: DummyModel()),
+)
+redisvl_pkg = types.SimpleNamespace()
+redisvl_index = types.SimpleNamespace(AsyncSearchIndex=object)
+redisvl_schema = types.SimpleNamespace(IndexSchema=object)
+redisvl_filter = types.SimpleNamespace(Tag=object)
+redisvl_query = types.SimpleNamespace(VectorQuery=object, filter=redisvl_filter)
+sys.modules.setdefault("redisvl", redisvl_pkg)
+sys.modules.setdefault("redisvl.index", redisvl_index)
+sys.modules.setdefault("redisvl.schema", redisvl_schema)
+sys.modules.setdefault("redisvl.query", redisvl_query)
+sys.modules.setdefault("redisvl.query.filter", redisvl_filter)
+sys.modules.setdefault("pydantic_settings", types.SimpleNamespace(BaseSettings=object))
+sys.modules.setdefault("aioboto3", types.SimpleNamespace(Session=lambda *a, **k: None))
+sys.modules.setdefault("numpy", types.SimpleNamespace(array=lambda *a, **k: None))
+sys.modules.setdefault("websockets", types.SimpleNamespace())
+passlib_pkg = types.SimpleNamespace()
+passlib_context = types.SimpleNamespace(CryptContext=lambda *a, **k: None)
+sys.modules.setdefault("passlib", passlib_pkg)
+sys.modules.setdefault("passlib.context", passlib_context)
+crypto_pkg = types.SimpleNamespace()
+fernet_mod = types.SimpleNamespace(Fernet=lambda *a, **k: None, InvalidToken=Exception)
+sys.modules.setdefault("cryptography", crypto_pkg)
+sys.modules.setdefault("cryptography.fernet", fernet_mod)
+
+
+class DummyCelery:
+    def __init__(self, *a, **k):
+        self.conf = types.SimpleNamespace()
+
+    def task(self, func=None, *a, **k):
+        if func:
+            return func
+
+        def wrapper(f):
+            return f
+
+        return wrapper
+
+
+sys.modules.setdefault("celery", types.SimpleNamespace(Celery=DummyCelery))
+sys.modules.setdefault(
+    "celery.schedules", types.SimpleNamespace(crontab=lambda *a, **k: None)
+)
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from app.models import Message
+from app.services import rotation
+
+
+class FakePipeline:
+    def __init__(self, results=None):
+        self.commands = []
+        self.results = results or []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+            return self
+
+        return queue
+
+    async def execute(self):
+        return self.results
+
+
+@contextmanager
+def rewrap_only(stale):
+    """Patch decoding so that only the payloads in ``stale`` are rewritten."""
+
+    async def decode(rds, payloads):
+        return [Message(role="user", content=p.decode()) for p in payloads]
+
+    with ExitStack() as stack:
+        for name, value in (
+            ("needs_rewrap", lambda data: data in stale),
+            ("decode_payloads", decode),
+            ("encode_message", lambda msg: b"new:" + msg.content.encode()),
+            ("stream_fields", lambda msg, data: {"data": data}),
+        ):
+            stack.enter_context(patch(f"app.services.rotation.{name}", value))
+        yield
+
+
+class ReencryptStreamTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_copies_in_batches_and_swaps(self):
+        rows = [
+            (b"1-0", {b"data": b"a"}),
+            (b"2-0", {b"data": b"b"}),
+            (b"3-0", {b"data": b"c"}),
+        ]
+        rds = AsyncMock()
+        # the first read is the check for stale entries, stopping at "a"
+        rds.xrange.side_effect = [rows[:2], rows[:2], rows[2:]]
+        rds.hget.return_value = b"2"
+        rds.eval.return_value = 1
+        pipes = [FakePipeline(), FakePipeline()]
+        rds.pipeline = MagicMock(side_effect=pipes)
+        with rewrap_only({b"a", b"c"}):
+            count = await rotation.reencrypt_stream(rds, "user:u1:history", batch=2)
+        self.assertEqual(count, 2)
+        # the second batch resumes after the last copied ID
+        self.assertEqual(rds.xrange.await_args_list[2].kwargs["min"], "(2-0")
+        xadds = [c for p in pipes for c in p.commands if c[0] == "xadd"]
+        self.assertEqual(
+            [(c[1][1], c[2]["id"]) for c in xadds],
+            [
+                ({"data": b"new:a"}, b"1-0"),
+                ({b"data": b"b"}, b"2-0"),
+                ({"data": b"new:c"}, b"3-0"),
+            ],
+        )
+        self.assertEqual(xadds[0][1][0], "user:u1:history:reencrypt")
+        self.assertIn(("hset", (rotation.STATE_KEY, "last", "2-0"), {}), pipes[0].commands)
+        rds.eval.assert_awaited_once_with(
+            rotation._SWAP_SCRIPT,
+            2,
+            "user:u1:history",
+            "user:u1:history:reencrypt",
+            "3-0",
+        )
+
+    async def test_up_to_date_stream_not_copied(self):
+        rds = AsyncMock()
+        rds.xrange.side_effect = [
+            [(b"1-0", {b"data": b"a"}), (b"2-0", {b"data": b"b"})],
+            [(b"3-0", {b"data": b"c"})],
+        ]
+        rds.pipeline = MagicMock(return_value=FakePipeline())
+        with rewrap_only(set()):
+            count = await rotation.reencrypt_stream(rds, "chat:c1:history", batch=2)
+        self.assertEqual(count, 0)
+        self.assertEqual(rds.xrange.await_args_list[1].kwargs["min"], "(2-0")
+        rds.pipeline.assert_not_called()
+        rds.hset.assert_not_awaited()
+        rds.eval.assert_not_awaited()
+
+    async def test_nothing_rewrapped_not_swapped(self):
+        # stale entries that cannot be decoded keep their old form
+        rds = AsyncMock()
+        rds.xrange.return_value = [(b"1-0", {b"data": b"a"})]
+        rds.hget.return_value = b"0"
+        rds.pipeline = MagicMock(return_value=FakePipeline())
+        with rewrap_only({b"a"}), patch(
+            "app.services.rotation.decode_payloads", AsyncMock(return_value=[None])
+        ):
+            count = await rotation.reencrypt_stream(rds, "chat:c1:history")
+        self.assertEqual(count, 0)
+        rds.eval.assert_not_awaited()
+        rds.delete.assert_awaited_with("chat:c1:history:reencrypt")
+
+
+class ReencryptHistoryTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_skips_when_locked(self):
+        rds = AsyncMock()
+        rds.set.return_value = None
+        self.assertIsNone(await rotation.reencrypt_history(rds))
+        rds.scan.assert_not_awaited()
+
+    async def test_resumes_interrupted_stream(self):
+        rds = AsyncMock()
+        rds.set.return_value = True
+        rds.hgetall.return_value = {
+            b"scan": b"7",
+            b"key": b"user:u1:history",
+            b"last": b"5-0",
+        }
+        rds.scan.return_value = (0, [b"user:u2:history", b"user:u2:history:reencrypt"])
+        stream = AsyncMock(return_value=1)
+        vectors = AsyncMock(return_value=0)
+        with patch("app.services.rotation.reencrypt_stream", stream), patch(
+            "app.services.rotation.reencrypt_vector_payloads", vectors
+        ):
+            total = await rotation.reencrypt_history(rds, batch=10, rate=0)
+        self.assertEqual(total, 2)
+        self.assertEqual(
+            [c.args[1:] for c in stream.await_args_list],
+            [("user:u1:history", 10, 0, "5-0"), ("user:u2:history", 10, 0)],
+        )
+        self.assertEqual(rds.scan.await_args.args[0], 7)
+        rds.delete.assert_any_await(rotation.STATE_KEY)
+        rds.delete.assert_any_await(rotation.LOCK_KEY)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,159 @@
+import os
+import sys
+import types
+import unittest
+from unittest.mock import patch
+
+try:
+    from cryptography.fernet import Fernet
+except ImportError:  # pragma: no cover - optional in the test environment
+    Fernet = None
+
+# Stub external dependencies similar to other tests; cryptography is real
+sys.modules.setdefault(
+    "openai", types.SimpleNamespace(AsyncOpenAI=lambda *a, **k: None)
+)
+sys.modules.setdefault(
+    "tiktoken", types.SimpleNamespace(get_encoding=lambda name: lambda x: [])
+)
+sys.modules.setdefault("aioboto3", types.SimpleNamespace(Session=lambda *a, **k: None))
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+if Fernet is not None:
+    from app import encryption, envelope, history_utils
+    from app.models import Message
+    from app.services import rotation
+
+
+class MemoryRedis:
+    """Just enough of a Redis client to run ``reencrypt_stream``."""
+
+    def __init__(self, streams):
+        self.streams = streams
+        self.hashes = {}
+
+    @staticmethod
+    def _id(mid):
+        return tuple(int(p) for p in mid.decode().split("-"))
+
+    async def xrange(self, key, min="-", max="+", count=None):
+        rows = self.streams.get(key, [])
+        if min != "-":
+            low = self._id(min[1:].encode())
+            rows = [r for r in rows if self._id(r[0]) > low]
+        return rows[:count]
+
+    def pipeline(self, transaction=True):
+        rds = self
+
+        class Pipe:
+            def __init__(self):
+                self.ops = []
+
+            def xadd(self, key, fields, id):
+                fields = {
+                    k.encode() if isinstance(k, str) else k: v
+                    for k, v in fields.items()
+                }
+                self.ops.append(
+                    lambda: rds.streams.setdefault(key, []).append((id, fields))
+                )
+
+            def hset(self, key, field, value):
+                self.ops.append(
+                    lambda: rds.hashes.setdefault(key, {}).update({field: value})
+                )
+
+            def hincrby(self, key, field, amount):
+                def op():
+                    row = rds.hashes.setdefault(key, {})
+                    row[field] = int(row.get(field, 0)) + amount
+
+                self.ops.append(op)
+
+            def expire(self, key, ttl):
+                self.ops.append(lambda: True)
+
+            async def execute(self):
+                return [op() for op in self.ops]
+
+        return Pipe()
+
+    async def hset(self, key, field=None, value=None, mapping=None):
+        self.hashes.setdefault(key, {}).update(mapping or {field: value})
+
+    async def hget(self, key, field):
+        return self.hashes.get(key, {}).get(field)
+
+    async def hdel(self, key, *fields):
+        for field in fields:
+            self.hashes.get(key, {}).pop(field, None)
+
+    async def delete(self, key):
+        self.streams.pop(key, None)
+
+    async def eval(self, script, numkeys, key, copy, last):
+        # _SWAP_SCRIPT without concurrent writers
+        self.streams[key] = self.streams.pop(copy)
+        return 1
+
+
+@unittest.skipUnless(Fernet, "cryptography is not installed")
+class RealKeyRotationTestCase(unittest.IsolatedAsyncioTestCase):
+    def use_keys(self, key, old=None):
+        encryption.settings = types.SimpleNamespace(
+            encryption_key=key, encryption_old_keys=old
+        )
+        encryption._KEY = None
+        encryption._AEADS = None
+
+    def setUp(self):
+        saved = encryption.settings
+        self.addCleanup(setattr, encryption, "settings", saved)
+        self.addCleanup(self.use_keys, None)
+        self.old_key = Fernet.generate_key().decode()
+        self.new_key = Fernet.generate_key().decode()
+
+    async def test_rotated_stream_reads_with_new_key_only(self):
+        self.use_keys(self.old_key)
+        old_id = encryption.current_key_id()
+        msgs = [Message(role="user", content=f"m{i}") for i in range(3)]
+        with patch.object(history_utils.settings, "encryption_mode", "message"):
+            sealed = [history_utils.encode_message(m) for m in msgs[:2]]
+        # an entry written before the binary format: Fernet over the JSON
+        legacy = encryption.encrypt_text(msgs[2].model_dump_json()).encode()
+        self.assertEqual(envelope.key_id(sealed[0]), old_id)
+        rds = MemoryRedis(
+            {
+                "user:u1:history": [
+                    (f"{i + 1}-0".encode(), {b"data": data})
+                    for i, data in enumerate(sealed + [legacy])
+                ]
+            }
+        )
+
+        # the new key is primary, the old one is still accepted (MultiFernet
+        # for the legacy entry, the key ID for the envelopes)
+        self.use_keys(self.new_key, self.old_key)
+        self.assertNotEqual(encryption.current_key_id(), old_id)
+        with patch.object(history_utils.settings, "encryption_mode", "message"):
+            count = await rotation.reencrypt_stream(rds, "user:u1:history", batch=2)
+        self.assertEqual(count, 3)
+        rows = rds.streams["user:u1:history"]
+        self.assertEqual([mid for mid, _obj in rows], [b"1-0", b"2-0", b"3-0"])
+        payloads = [obj[b"data"] for _mid, obj in rows]
+        self.assertFalse(any(history_utils.needs_rewrap(p) for p in payloads))
+
+        # a second run finds nothing stale and copies nothing
+        self.assertEqual(await rotation.reencrypt_stream(rds, "user:u1:history"), 0)
+        self.assertNotIn("user:u1:history:reencrypt", rds.streams)
+
+        # once the old key is removed everything is still readable
+        self.use_keys(self.new_key)
+        out = await history_utils.decode_payloads(rds, payloads)
+        self.assertEqual([m.content for m in out], ["m0", "m1", "m2"])
+        self.assertEqual(await history_utils.decode_payloads(rds, sealed), [None, None])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import asyncio
+import os
+import sys
+import threading
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from worker.runner import AsyncRunner
+
+
+class AsyncRunnerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.runner = AsyncRunner(max_in_flight=2)
+        self.addCleanup(self.runner.stop)
+
+    def test_reuses_one_loop(self):
+        async def current_loop():
+            return asyncio.get_running_loop()
+
+        first = self.runner.run(current_loop())
+        second = self.runner.run(current_loop())
+        self.assertIs(first, second)
+
+    def test_concurrent_callers_are_bounded(self):
+        peak = 0
+        active = 0
+
+        async def task():
+            nonlocal peak, active
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.02)
+            active -= 1
+            return True
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.runner.run(task())))
+            for _ in range(6)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(results, [True] * 6)
+        self.assertEqual(peak, 2)
+        self.assertEqual(self.runner.in_flight, 0)
+
+    def test_exceptions_propagate(self):
+        async def fail():
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            self.runner.run(fail())
+
+
+if __name__ == "__main__":
+    unittest.main()
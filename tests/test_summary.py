@@ -2,7 +2,7 @@ import os
 import sys
 import types
 import unittest
-from unittest.mock import AsyncMock
+from unittest.mock import AsyncMock, patch
 
 # Stub external dependencies similar to other tests
 sys.modules.setdefault(
@@ -81,30 +81,201 @@ sys.modules.setdefault(
 )
 
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from app.services import summary as summary_service
 from worker import tasks as worker_tasks
 
 
+class FakeRedis:
+    def __init__(self, entries):
+        self.entries = entries
+        self.kv = {}
+        self.hashes = {"summary": {}}
+        self.summary = self.hashes["summary"]
+        self.ranges = []
+
+    def pipeline(self, transaction=False):
+        rds = self
+
+        class Pipe:
+            def __init__(self):
+                self.ops = []
+
+            def get(self, key):
+                self.ops.append(lambda: rds.kv.get(key))
+
+            def hget(self, key, field):
+                self.ops.append(lambda: rds.hashes.get(key, {}).get(field))
+
+            def set(self, key, value):
+                self.ops.append(lambda: rds.kv.__setitem__(key, value))
+
+            def hset(self, key, field, value):
+                self.ops.append(
+                    lambda: rds.hashes.setdefault(key, {}).__setitem__(field, value)
+                )
+
+            def expire(self, key, ttl):
+                self.ops.append(lambda: True)
+
+            def delete(self, key):
+                self.ops.append(lambda: rds.hashes.pop(key, None))
+
+            async def execute(self):
+                return [op() for op in self.ops]
+
+        return Pipe()
+
+    async def hget(self, key, field):
+        return self.hashes.get(key, {}).get(field)
+
+    async def xrange(self, key, min="-"):
+        self.ranges.append(min)
+        if min == "-":
+            return self.entries
+        return [e for e in self.entries if e[0] > min[1:]]
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.kv:
+            return None
+        self.kv[key] = value
+        return True
+
+    async def delete(self, key):
+        self.kv.pop(key, None)
+
+    async def eval(self, script, numkeys, key, token):
+        if self.kv.get(key) == token:
+            self.kv.pop(key)
+
+
 class SummaryLastIdTestCase(unittest.IsolatedAsyncioTestCase):
-    async def test_summary_runs_only_with_new_messages(self):
-        rds = AsyncMock()
+    async def test_summary_folds_only_new_messages(self):
+        rds = FakeRedis([("1-0", {b"data": b'{"role":"user","content":"hi"}'})])
         worker_tasks.redis.Redis = lambda *a, **k: rds
-        rds.xrevrange.return_value = [("1-0", {b"data": b'{"content":"hi"}'})]
-        rds.get.side_effect = [None, b"1-0"]
         worker_tasks.count_tokens = lambda text: 1
         create = AsyncMock(
-            return_value=types.SimpleNamespace(
-                choices=[types.SimpleNamespace(text="sum")]
+            side_effect=[
+                types.SimpleNamespace(
+                    choices=[
+                        types.SimpleNamespace(message=types.SimpleNamespace(content=text))
+                    ]
+                )
+                for text in ("sum1", "sum2")
+            ]
+        )
+        worker_tasks.openai1 = types.SimpleNamespace(
+            chat=types.SimpleNamespace(
+                completions=types.SimpleNamespace(create=create)
             )
         )
+
+        with patch("app.history_utils.decrypt_text", lambda x: x):
+            await worker_tasks._async_summary("u1", 0)
+            await worker_tasks._async_summary("u1", 0)
+            rds.entries.append(("2-0", {b"data": b'{"role":"user","content":"bye"}'}))
+            await worker_tasks._async_summary("u1", 0)
+
+        self.assertEqual(create.call_count, 2)
+        self.assertEqual(rds.kv["summary:last:u1"], "2-0")
+        self.assertEqual(rds.summary["u1"], "sum2")
+        self.assertEqual(rds.ranges, ["-", "(1-0", "(1-0"])
+        # the second call only carries the previous summary and the new message
+        prompt = create.await_args.kwargs["messages"][0]["content"]
+        self.assertIn("sum1", prompt)
+        self.assertIn("bye", prompt)
+        self.assertNotIn('"hi"', prompt)
+
+    async def test_below_threshold_keeps_watermark(self):
+        rds = FakeRedis([("1-0", {b"data": b'{"role":"user","content":"hi"}'})])
+        worker_tasks.redis.Redis = lambda *a, **k: rds
+        worker_tasks.count_tokens = lambda text: 1
+        create = AsyncMock()
         worker_tasks.openai1 = types.SimpleNamespace(
-            completions=types.SimpleNamespace(create=create)
+            chat=types.SimpleNamespace(
+                completions=types.SimpleNamespace(create=create)
+            )
         )
+        with patch("app.history_utils.decrypt_text", lambda x: x):
+            await worker_tasks._async_summary("u1", 5)
+        create.assert_not_awaited()
+        self.assertNotIn("summary:last:u1", rds.kv)
+
+    async def test_expired_lock_of_another_run_is_kept(self):
+        rds = FakeRedis([("1-0", {b"data": b'{"role":"user","content":"hi"}'})])
+
+        async def create(**kwargs):
+            # our lock expired and another run took it over
+            rds.kv["summary:lock:u1"] = "other"
+            return completion("sum")
+
+        client = types.SimpleNamespace(
+            chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=create))
+        )
+        with patch("app.history_utils.decrypt_text", lambda x: x):
+            await summary_service.update_summary(
+                rds, client, "u1", count_tokens=lambda text: 1
+            )
+        self.assertEqual(rds.summary["u1"], "sum")
+        self.assertEqual(rds.kv["summary:lock:u1"], "other")
 
-        await worker_tasks._async_summary("u1", 0)
-        await worker_tasks._async_summary("u1", 0)
 
-        self.assertEqual(create.call_count, 1)
-        rds.set.assert_awaited_with("summary:last:u1", "1-0")
+def completion(text):
+    return types.SimpleNamespace(
+        choices=[types.SimpleNamespace(message=types.SimpleNamespace(content=text))]
+    )
+
+
+class MapReduceTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_chunks_summarized_and_cached_until_done(self):
+        rds = FakeRedis(
+            [
+                (f"{i}-0", {b"data": f'{{"role":"user","content":"m{i}"}}'.encode()})
+                for i in range(1, 6)
+            ]
+        )
+        prompts = []
+
+        async def create(**kwargs):
+            prompt = kwargs["messages"][0]["content"]
+            prompts.append(prompt)
+            if prompt.startswith(summary_service.REDUCE_PROMPT) and fail_reduce:
+                raise RuntimeError("llm down")
+            return completion(f"part{len(prompts)}")
+
+        client = types.SimpleNamespace(
+            chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=create))
+        )
+        settings = types.SimpleNamespace(
+            openai_chat_model="gpt",
+            summary_max_tokens=100,
+            summary_chunk_tokens=2,
+            summary_concurrency=2,
+            summary_chunk_ttl=60,
+            summary_lock_ttl=60,
+        )
+        fail_reduce = True
+        with patch("app.history_utils.decrypt_text", lambda x: x), patch.object(
+            summary_service, "settings", settings
+        ):
+            with self.assertRaises(RuntimeError):
+                await summary_service.update_summary(
+                    rds, client, "u1", count_tokens=lambda text: 1
+                )
+            # three chunks of at most two messages were summarized and kept
+            self.assertEqual(len(rds.hashes["summary:chunks:u1"]), 3)
+            self.assertNotIn("summary:last:u1", rds.kv)
+
+            fail_reduce = False
+            prompts.clear()
+            summary, tokens = await summary_service.update_summary(
+                rds, client, "u1", count_tokens=lambda text: 1
+            )
+        # the retry only runs the reduce step
+        self.assertTrue(all(p.startswith(summary_service.REDUCE_PROMPT) for p in prompts))
+        self.assertEqual(tokens, 5)
+        self.assertEqual(rds.summary["u1"], summary)
+        self.assertEqual(rds.kv["summary:last:u1"], "5-0")
+        self.assertNotIn("summary:chunks:u1", rds.hashes)
 
 
 if __name__ == "__main__":
@@ -2,7 +2,7 @@ import os
 import sys
 import types
 import unittest
-from unittest.mock import AsyncMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 # Reuse stubs from other tests
 sys.modules.setdefault(
@@ -84,29 +84,39 @@ sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 from app.main import app
 from app.models import Message
 from app.routes.messages import search_by_tag
+from app.services import tagging
 
 # Pydantic v1 compatibility
 if not hasattr(Message, "model_validate_json"):
     Message.model_validate_json = classmethod(lambda cls, data: cls.parse_raw(data))
 
 
+class FakePipeline:
+    def __init__(self):
+        self.queued = []
+
+    def xrange(self, key, min=None, max=None):
+        self.queued.append(
+            [(min, {b"data": b'{"role":"user","type":"text","content":"hi"}'})]
+        )
+        return self
+
+    def hmget(self, key, ids):
+        self.queued.append([b'["tag"]' if key == "user:u1:msg_tags" else None])
+        return self
+
+    async def execute(self):
+        return self.queued
+
+
 class TagSearchTestCase(unittest.IsolatedAsyncioTestCase):
     async def test_search_by_tag(self):
         rds = AsyncMock()
         app.state.redis = rds
         rds.smembers.return_value = {b"1-0"}
-        rds.xrange.return_value = [
-            ("1-0", {b"data": b'{"role":"user","type":"text","content":"hi"}'})
-        ]
-
-        def hget_side(key, mid=None):
-            if key == "user:u1:msg_tags":
-                return b'["tag"]'
-            return b"c1"
-
-        rds.hget.side_effect = hget_side
-        with patch("app.services.company._ensure_company", AsyncMock()), patch(
-            "app.main.decrypt_text", lambda x: x
+        rds.pipeline = MagicMock(return_value=FakePipeline())
+        with patch("app.routes.messages._ensure_company", AsyncMock()), patch(
+            "app.history_utils.decrypt_text", lambda x: x
         ):
             resp = await search_by_tag(
                 uuid="u1", tag="tag", limit=1, chat_id=None, user=("u1", "c1")
@@ -115,5 +125,107 @@ class TagSearchTestCase(unittest.IsolatedAsyncioTestCase):
             self.assertEqual(resp["hits"][0].tags, ["tag"])
 
 
+class RecordingPipeline:
+    def __init__(self):
+        self.calls = []
+
+    def hset(self, key, mapping=None):
+        self.calls.append(("hset", key, mapping))
+        return self
+
+    def sadd(self, key, *values):
+        self.calls.append(("sadd", key, values))
+        return self
+
+    async def execute(self):
+        return []
+
+
+class TagMessagesTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_batches_llm_calls_and_writes(self):
+        def entry(mid, text):
+            data = '{"role":"user","type":"text","content":"%s"}' % text
+            return (mid, {b"data": data.encode()})
+
+        rds = AsyncMock()
+        rds.xrevrange.return_value = [
+            entry(b"3-0", "third"),
+            entry(b"2-0", "second"),
+            entry(b"1-0", "first"),
+        ]
+        rds.hmget.return_value = [None, b'["old"]', None]
+        pipe = RecordingPipeline()
+        rds.pipeline = MagicMock(return_value=pipe)
+
+        args = '{"items": [{"index": 0, "tags": ["Big Topic"]}, {"index": 1, "tags": []}]}'
+        call = types.SimpleNamespace(function=types.SimpleNamespace(arguments=args))
+        resp = types.SimpleNamespace(
+            choices=[types.SimpleNamespace(message=types.SimpleNamespace(tool_calls=[call]))]
+        )
+        client = types.SimpleNamespace(
+            chat=types.SimpleNamespace(
+                completions=types.SimpleNamespace(create=AsyncMock(return_value=resp))
+            )
+        )
+        embed = AsyncMock(return_value=["vec"])
+        with patch("app.history_utils.decrypt_text", lambda x: x), patch.object(
+            tagging, "settings", types.SimpleNamespace(tag_batch_size=20, openai_chat_model="m")
+        ), patch.object(tagging, "aembed_many", embed), patch.object(
+            tagging, "_vector_doc", lambda *a: {"doc": a}
+        ):
+            tagged = await tagging.tag_messages(rds, client, "u1", limit=3)
+
+        self.assertEqual(tagged, 1)
+        client.chat.completions.create.assert_awaited_once()
+        rds.hmget.assert_awaited_once_with("user:u1:msg_tags", ["3-0", "2-0", "1-0"])
+        embed.assert_awaited_once_with(rds, ["third"])
+        self.assertIn(
+            ("hset", "user:u1:msg_tags", {"3-0": '["big_topic"]'}), pipe.calls
+        )
+        self.assertIn(("sadd", "user:u1:tags:big_topic", ("3-0",)), pipe.calls)
+        self.assertIn(
+            ("hset", "history_vectors:u1:3-0", {"doc": ("u1", "3-0", "vec", ["big_topic"])}),
+            pipe.calls,
+        )
+
+    async def test_reuses_given_embeddings(self):
+        data = b'{"role":"user","type":"text","content":"imported"}'
+        rds = AsyncMock()
+        rds.hmget.return_value = [None]
+        pipe = RecordingPipeline()
+        rds.pipeline = MagicMock(return_value=pipe)
+        args = '{"items": [{"index": 0, "tags": ["topic"]}]}'
+        call = types.SimpleNamespace(function=types.SimpleNamespace(arguments=args))
+        resp = types.SimpleNamespace(
+            choices=[types.SimpleNamespace(message=types.SimpleNamespace(tool_calls=[call]))]
+        )
+        client = types.SimpleNamespace(
+            chat=types.SimpleNamespace(
+                completions=types.SimpleNamespace(create=AsyncMock(return_value=resp))
+            )
+        )
+        embed = AsyncMock()
+        with patch("app.history_utils.decrypt_text", lambda x: x), patch.object(
+            tagging, "settings", types.SimpleNamespace(tag_batch_size=20, openai_chat_model="m")
+        ), patch.object(tagging, "aembed_many", embed), patch.object(
+            tagging, "_vector_doc", lambda *a: {"doc": a}
+        ):
+            tagged = await tagging.tag_messages(
+                rds,
+                client,
+                "u1",
+                entries=[("5-0", {b"data": data})],
+                embeddings={"5-0": "vec"},
+            )
+
+        self.assertEqual(tagged, 1)
+        embed.assert_not_awaited()
+        rds.xrevrange.assert_not_awaited()
+        self.assertIn(
+            ("hset", "history_vectors:u1:5-0", {"doc": ("u1", "5-0", "vec", ["topic"])}),
+            pipe.calls,
+        )
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,73 @@
+import os
+import sys
+import unittest
+from datetime import datetime
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from app.services.timeparse import parse_temporal
+
+# Wednesday
+NOW = datetime(2025, 1, 15, 10, 0)
+
+
+class ParseTemporalTestCase(unittest.TestCase):
+    def assertParsed(self, text, expected, explicit=True):
+        match = parse_temporal(text, NOW)
+        self.assertIsNotNone(match, text)
+        self.assertEqual(match.when, expected, text)
+        self.assertEqual(match.explicit_time, explicit, text)
+
+    def test_relative_days(self):
+        self.assertParsed("напомни завтра в 18:00", datetime(2025, 1, 16, 18, 0))
+        self.assertParsed("remind me tomorrow at 6pm", datetime(2025, 1, 16, 18, 0))
+        self.assertParsed(
+            "напомни послезавтра", datetime(2025, 1, 17, 9, 0), explicit=False
+        )
+
+    def test_durations(self):
+        self.assertParsed("напомни через 2 часа", datetime(2025, 1, 15, 12, 0))
+        self.assertParsed("remind me in an hour", datetime(2025, 1, 15, 11, 0))
+        self.assertParsed("напомни через полчаса", datetime(2025, 1, 15, 10, 30))
+        self.assertParsed(
+            "напомни через 2 дня в 10:00", datetime(2025, 1, 17, 10, 0)
+        )
+
+    def test_weekdays(self):
+        self.assertParsed("в пятницу в 7 вечера", datetime(2025, 1, 17, 19, 0))
+        # today's 9:00 has passed, so the next Wednesday is meant
+        self.assertParsed("в среду в 9 утра", datetime(2025, 1, 22, 9, 0))
+        self.assertParsed("next wednesday at noon", datetime(2025, 1, 22, 12, 0))
+
+    def test_dates(self):
+        self.assertParsed("20.02 в 9.15", datetime(2025, 2, 20, 9, 15))
+        self.assertParsed("on March 3rd at 10:30", datetime(2025, 3, 3, 10, 30))
+        self.assertParsed("15 марта", datetime(2025, 3, 15, 9, 0), explicit=False)
+        # already passed this year
+        self.assertParsed("10.01", datetime(2026, 1, 10, 9, 0), explicit=False)
+
+    def test_time_only_rolls_over(self):
+        self.assertParsed("remind me at 8", datetime(2025, 1, 16, 8, 0))
+        self.assertParsed("напомни в 12:30", datetime(2025, 1, 15, 12, 30))
+
+    def test_dotted_clock_with_marker(self):
+        self.assertParsed("remind me at 6.30 pm", datetime(2025, 1, 15, 18, 30))
+        self.assertParsed("remind me at 6.30 am", datetime(2025, 1, 16, 6, 30))
+
+    def test_no_expression(self):
+        self.assertIsNone(parse_temporal("remind me to call mom", NOW))
+        self.assertIsNone(parse_temporal("18.00", NOW))
+
+    def test_unreadable_numbers_left_to_llm(self):
+        for text in (
+            "remind me in 1.5 hours",
+            "напомни через 1,5 часа",
+            "remind me in a few days",
+            "напомни обновиться до версии 2.1",
+            "напомни обновиться до версии 2.10",
+            "напомни поставить 2.1.3",
+        ):
+            self.assertIsNone(parse_temporal(text, NOW), text)
+
+
+if __name__ == "__main__":
+    unittest.main()
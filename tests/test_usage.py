@@ -94,6 +94,7 @@ class DummySettings:
         self.compression_algorithm = "gzip"
         self.openai_chat_model = "gpt"
         self.summary_token_threshold = 3000
+        self.vector_inline_payload = False
 
 
 class UsageTestCase(unittest.IsolatedAsyncioTestCase):
@@ -101,59 +102,68 @@ class UsageTestCase(unittest.IsolatedAsyncioTestCase):
         rds = AsyncMock()
         app.state.redis = rds
         mainmod.settings = DummySettings()
-        rds.xlen.return_value = 0
         req = AddRequest(
             uuid="u1", messages=[Message(role="user", type="text", content="hello")]
         )
         with patch(
-            "app.history_utils._add_to_stream", AsyncMock(return_value="1")
-        ), patch("app.services.messages._embed_and_insert", AsyncMock()), patch(
-            "app.services.facts._check_and_store_fact", AsyncMock()
+            "app.routes.messages._add_messages_to_stream",
+            AsyncMock(return_value=(["1-0"], 1)),
+        ) as add_batch, patch(
+            "app.routes.messages._embed_and_insert", AsyncMock()
         ), patch(
-            "app.services.calendar._check_and_store_calendar_event", AsyncMock()
+            "app.routes.messages._check_and_store_fact", AsyncMock()
         ), patch(
-            "app.services.company._ensure_company", AsyncMock()
+            "app.routes.messages._ensure_company", AsyncMock()
         ), patch(
-            "app.main.summarize_if_needed",
-            types.SimpleNamespace(delay=lambda *a, **k: None),
+            "app.routes.messages._company_features",
+            AsyncMock(return_value=[True, True, True]),
         ), patch(
-            "app.main.update_facts", types.SimpleNamespace(delay=lambda *a, **k: None)
+            "app.routes.messages.settings", DummySettings()
         ), patch(
-            "app.main.increment_messages", AsyncMock()
-        ) as inc_msg, patch(
-            "app.main.increment_tokens", AsyncMock()
-        ) as inc_tok:
-            await add_history(req, user=("u1", "c1"))
-            inc_msg.assert_awaited_with(rds, "c1", 1)
-            inc_tok.assert_awaited_with(rds, "c1", 1)
+            "app.services.messages.settings", DummySettings()
+        ):
+            resp = await add_history(req, user=("u1", "c1"))
+            self.assertEqual(resp, {"stream_ids": ["1-0"]})
+            add_batch.assert_awaited_once()
+            kwargs = add_batch.await_args.kwargs
+            self.assertEqual(kwargs["company"], "c1")
+            self.assertEqual(kwargs["tokens"], 1)
+            self.assertTrue(kwargs["calendar_feed"])
 
     async def test_add_history_respects_flags(self):
         rds = AsyncMock()
         app.state.redis = rds
         mainmod.settings = DummySettings()
-        rds.xlen.return_value = 0
         req = AddRequest(
             uuid="u1", messages=[Message(role="user", type="text", content="hi")]
         )
         with patch(
-            "app.history_utils._add_to_stream", AsyncMock(return_value="1")
-        ), patch("app.services.messages._embed_and_insert", AsyncMock()), patch(
-            "app.services.facts._check_and_store_fact", AsyncMock()
+            "app.routes.messages._add_messages_to_stream",
+            AsyncMock(return_value=(["1-0"], 10)),
+        ) as add_batch, patch(
+            "app.routes.messages._embed_and_insert", AsyncMock()
+        ), patch(
+            "app.routes.messages._check_and_store_fact", AsyncMock()
         ) as chk_fact, patch(
-            "app.services.calendar._check_and_store_calendar_event", AsyncMock()
-        ) as chk_cal, patch(
-            "app.services.company._ensure_company", AsyncMock()
+            "app.routes.messages._ensure_company", AsyncMock()
         ), patch(
-            "app.services.company._company_feature_enabled",
-            AsyncMock(side_effect=[False, False, False]),
+            "app.routes.messages._company_features",
+            AsyncMock(return_value=[False, False, False]),
         ), patch(
-            "app.main.summarize_if_needed", types.SimpleNamespace(delay=AsyncMock())
+            "app.routes.messages.summarize_if_needed",
+            types.SimpleNamespace(delay=AsyncMock()),
         ) as sum_task, patch(
-            "app.main.update_facts", types.SimpleNamespace(delay=AsyncMock())
-        ) as upd_task:
+            "app.routes.messages.update_facts", types.SimpleNamespace(delay=AsyncMock())
+        ) as upd_task, patch(
+            "app.routes.messages.generate_tags", types.SimpleNamespace(delay=AsyncMock())
+        ), patch(
+            "app.routes.messages.settings", DummySettings()
+        ), patch(
+            "app.services.messages.settings", DummySettings()
+        ):
             await add_history(req, user=("u1", "c1"))
-            chk_fact.assert_not_awaited()
-            chk_cal.assert_not_awaited()
+            chk_fact.assert_not_called()
+            self.assertFalse(add_batch.await_args.kwargs["calendar_feed"])
             sum_task.delay.assert_not_called()
             upd_task.delay.assert_not_called()
 
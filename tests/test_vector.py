@@ -3,6 +3,10 @@ import os
 import sys
 import types
 import unittest
+from unittest.mock import patch
+
+from redis.commands.search.query import Query
+from redis.commands.search.result import Result
 
 
 # Stub redisvl and numpy modules used by vector
@@ -19,20 +23,35 @@ def dummy_asarray(arr, dtype=None):
 
 
 class DummyIndex:
-    def __init__(self, schema=None, redis_url=None):
+    def __init__(self, schema=None, redis_url=None, redis_client=None):
         self.created = False
         self.loaded = []
 
     async def create(self, overwrite=False):
         self.created = True
 
-    async def load(self, docs, id_field=None):
+    async def load(self, docs, id_field=None, keys=None):
         self.loaded.extend(docs)
+        self.keys = keys
 
     async def query(self, query):
         return [{"message_id": "m1"}, {"message_id": "m2"}]
 
 
+class DummyTag:
+    def __init__(self, *a, **k):
+        pass
+
+    def __eq__(self, other):
+        return self
+
+    def __and__(self, other):
+        return self
+
+    def any(self, values):
+        return self
+
+
 def dummy_from_dict(d):
     return d
 
@@ -45,6 +64,36 @@ class DummyVectorQuery:
         self.filter = f
 
 
+class SearchVectorQuery(Query):
+    """VectorQuery stand-in built on the redis-py query, as redisvl's is."""
+
+    def __init__(self, vector=None, vector_field_name=None, num_results=10, **kw):
+        super().__init__("*")
+        self.return_fields(*kw["return_fields"])
+
+    def set_filter(self, f):
+        self.filter = f
+
+
+class SearchIndex:
+    """Parses a raw FT.SEARCH reply the way redisvl does."""
+
+    def __init__(self, reply):
+        self.reply = reply
+
+    async def query(self, query):
+        result = Result(
+            self.reply, True, field_encodings=query._return_fields_decode_as
+        )
+        docs = []
+        for doc in result.docs:
+            doc = dict(doc.__dict__)
+            doc.pop("id")
+            doc.pop("payload")
+            docs.append(doc)
+        return docs
+
+
 sys.modules["numpy"] = types.SimpleNamespace(asarray=dummy_asarray, float32="f32")
 
 redisvl_pkg = types.SimpleNamespace()
@@ -54,9 +103,9 @@ sys.modules["redisvl.schema"] = types.SimpleNamespace(
     IndexSchema=types.SimpleNamespace(from_dict=dummy_from_dict)
 )
 sys.modules["redisvl.query"] = types.SimpleNamespace(
-    VectorQuery=DummyVectorQuery, filter=types.SimpleNamespace(Tag=lambda *a, **k: None)
+    VectorQuery=DummyVectorQuery, filter=types.SimpleNamespace(Tag=DummyTag)
 )
-sys.modules["redisvl.query.filter"] = types.SimpleNamespace(Tag=lambda *a, **k: None)
+sys.modules["redisvl.query.filter"] = types.SimpleNamespace(Tag=DummyTag)
 
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 import app.vector as vector
@@ -80,6 +129,30 @@ class VectorTestCase(unittest.IsolatedAsyncioTestCase):
             },
             vector._idx.loaded,
         )
+        self.assertEqual(vector._idx.keys, ["history_vectors:u1:m1"])
+
+    async def test_payload_search_returns_raw_blob(self):
+        blob = b"\x01\x09\xff\xfe\x80payload"
+        reply = [
+            1,
+            b"history_vectors:m1",
+            [b"message_id", b"m1", b"stream", b"user:u1:history", b"blob", blob],
+        ]
+        with patch.object(vector, "_idx", SearchIndex(reply)), patch.object(
+            sys.modules["redisvl.query"], "VectorQuery", SearchVectorQuery
+        ):
+            hits = await vector.semantic_search_payloads("u1", [1.0, 2.0], k=1)
+        self.assertEqual(
+            hits,
+            [
+                {
+                    "message_id": "m1",
+                    "blob": blob,
+                    "stream": "user:u1:history",
+                    "tags": None,
+                }
+            ],
+        )
 
 
 if __name__ == "__main__":
@@ -4,10 +4,12 @@ import os
 from celery import Celery
 from celery.schedules import crontab
 
+from app.config import get_settings
 from app.logging_config import setup_logging
 
 setup_logging()
 logger = logging.getLogger(__name__)
+settings = get_settings()
 
 celery = Celery(
     "summary_worker",
@@ -21,13 +23,27 @@ logger.info("Celery configured")
 celery.conf.task_serializer = "json"
 celery.conf.result_serializer = "json"
 celery.conf.accept_content = ["json"]
+# with the "threads" pool one process runs many tasks concurrently on the
+# shared event loop of worker.runner (bounded by WORKER_MAX_IN_FLIGHT)
+celery.conf.worker_pool = settings.celery_worker_pool
+if settings.celery_worker_concurrency:
+    celery.conf.worker_concurrency = settings.celery_worker_concurrency
+CALENDAR_POLL_INTERVAL = settings.calendar_poll_interval
+REMINDER_POLL_INTERVAL = settings.reminder_poll_interval
 celery.conf.beat_schedule = {
     "check-calendar": {
         "task": "worker.tasks.check_calendar",
-        "schedule": crontab(minute="*/30"),
+        "schedule": CALENDAR_POLL_INTERVAL,
+        "options": {"expires": CALENDAR_POLL_INTERVAL},
     },
     "process-idle-users": {
         "task": "worker.tasks.process_idle_users",
         "schedule": crontab(minute="*/5"),
     },
+    "dispatch-reminders": {
+        "task": "worker.tasks.dispatch_reminders",
+        "schedule": REMINDER_POLL_INTERVAL,
+        # a poll that waited longer than one interval is superseded by the next
+        "options": {"expires": REMINDER_POLL_INTERVAL},
+    },
 }
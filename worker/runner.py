@@ -0,0 +1,78 @@
+import asyncio
+import atexit
+import logging
+import os
+import threading
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncRunner:
+    """Run coroutines on one long-lived event loop per worker process.
+
+    The loop lives in a daemon thread, so clients bound to it (the Redis pool,
+    the OpenAI client) are created once and reused by every task. Any number
+    of threads may call :meth:`run` at the same time — e.g. with the Celery
+    ``threads`` pool — and their coroutines run concurrently on the loop, at
+    most ``max_in_flight`` at once (``WORKER_MAX_IN_FLIGHT`` when not given).
+    The loop is recreated after a fork.
+    """
+
+    def __init__(self, max_in_flight: int | None = None) -> None:
+        self.max_in_flight = max_in_flight
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self._pid: int | None = None
+        self.in_flight = 0
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=loop.run_forever, name="async-runner", daemon=True
+                )
+                self._thread.start()
+                self._loop = loop
+                self._pid = os.getpid()
+                self._slots = None
+                logger.info("Started task event loop in process %d", self._pid)
+            return self._loop
+
+    async def _limited(self, coro):
+        if self._slots is None:
+            if self.max_in_flight is None:
+                self.max_in_flight = get_settings().worker_max_in_flight
+            self._slots = asyncio.Semaphore(max(1, self.max_in_flight))
+        async with self._slots:
+            self.in_flight += 1
+            try:
+                return await coro
+            finally:
+                self.in_flight -= 1
+
+    def run(self, coro, timeout: float | None = None):
+        """Run ``coro`` on the shared loop and wait for its result."""
+        loop = self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(self._limited(coro), loop)
+        return future.result(timeout)
+
+    def stop(self) -> None:
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                return
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+            if not self._thread.is_alive():
+                self._loop.close()
+            self._loop = None
+
+
+runner = AsyncRunner()
+atexit.register(runner.stop)
+
+__all__ = ["AsyncRunner", "runner"]
@@ -1,39 +1,32 @@
-import asyncio
-import json
 import logging
+import os
 
-from openai import AsyncOpenAI
 from redis import asyncio as redis
 
 from app.config import get_settings
 from app.logging_config import setup_logging
+from app.services.llm import LazyClient
+from app.tokens import count_tokens
 
 from .celery_app import celery
+from .runner import runner
 
-try:
-    from tiktoken import get_encoding
+setup_logging()
+logger = logging.getLogger(__name__)
+settings = get_settings()
 
-    enc = get_encoding("cl100k_base")
 
-    def count_tokens(text: str) -> int:
-        return len(enc.encode(text))
+def _openai_client():
+    from openai import AsyncOpenAI
 
-except Exception:  # pragma: no cover - optional dependency
-    enc = None
-    logging.getLogger(__name__).warning(
-        "tiktoken unavailable, using fallback token counter"
+    return AsyncOpenAI(
+        api_key=settings.openai_api_key, base_url=settings.openai_base_url
     )
 
-    def count_tokens(text: str) -> int:
-        return len(text.split())
-
 
-setup_logging()
-logger = logging.getLogger(__name__)
-settings = get_settings()
-openai1 = AsyncOpenAI(
-    api_key=settings.openai_api_key, base_url=settings.openai_base_url
-)
+openai1 = LazyClient(_openai_client)
+# a crashed dispatcher gives up leadership after this many seconds
+REMINDER_LEADER_TTL = 60
 redis_pool = redis.ConnectionPool.from_url(
     str(settings.redis_url), decode_responses=False
 )
@@ -42,51 +35,26 @@ redis_pool = redis.ConnectionPool.from_url(
 @celery.task
 def summarize_if_needed(uuid: str, threshold: int = 3000):
     logger.info("Checking if summary needed for %s", uuid)
-    loop = asyncio.get_event_loop()
-    loop.run_until_complete(_async_summary(uuid, threshold))
+    runner.run(_async_summary(uuid, threshold))
 
 
 async def _async_summary(uuid: str, threshold: int):
-    rds = redis.Redis(connection_pool=redis_pool)
-    key = f"user:{uuid}:history"
-    entries = await rds.xrevrange(key, count=100)
-    if not entries:
-        return
-
-    last = await rds.get(f"summary:last:{uuid}")
-    if isinstance(last, bytes):
-        last = last.decode()
+    from app.services.summary import update_summary
 
-    latest_id = entries[0][0]
-    if isinstance(latest_id, bytes):
-        latest_id = latest_id.decode()
-
-    if last == latest_id:
-        return
-
-    concatenated = " ".join(
-        json.loads(obj[b"data"].decode()).get("content") or "" for _id, obj in entries
-    )
-    if count_tokens(concatenated) < threshold:
-        return
-    prompt = (
-        "Summarize the following chat history for quick recall by an assistant:\n\n"
-        + concatenated
-    )
-
-    resp = await openai1.completions.create(
-        model=settings.openai_chat_model, prompt=prompt, max_tokens=5000
+    rds = redis.Redis(connection_pool=redis_pool)
+    # folds only the messages added since the last summary, once they hold
+    # at least ``threshold`` tokens
+    _summary, tokens = await update_summary(
+        rds, openai1, uuid, min_tokens=threshold, count_tokens=count_tokens
     )
-    summary = resp.choices[0].text.strip()
-    await rds.hset("summary", uuid, summary)
-    await rds.set(f"summary:last:{uuid}", latest_id)
+    if tokens:
+        logger.info("Folded %d tokens into summary of %s", tokens, uuid)
 
 
 @celery.task
 def update_facts(uuid: str):
     logger.info("Updating facts for %s", uuid)
-    loop = asyncio.get_event_loop()
-    loop.run_until_complete(_async_update_facts(uuid))
+    runner.run(_async_update_facts(uuid))
 
 
 async def _async_update_facts(uuid: str):
@@ -96,11 +64,17 @@ async def _async_update_facts(uuid: str):
     if isinstance(last, bytes):
         last = last.decode()
     entries = await rds.xrange(key, min=f"({last}" if last else "-", max="+")
+    from app.history_utils import decode_payloads
+
+    # entries written with ENCRYPTION_MODE=fields carry the role in the
+    # clear, so assistant messages are not decrypted at all
+    payloads = [
+        obj[b"data"] for _id, obj in entries if obj.get(b"role", b"user") == b"user"
+    ]
     facts = []
-    for _id, obj in entries:
-        msg = json.loads(obj[b"data"].decode())
-        content = msg.get("content")
-        if msg.get("role") == "user" and content:
+    for msg in await decode_payloads(rds, payloads):
+        content = msg.content if msg else None
+        if msg and msg.role == "user" and content:
             text = content.strip()
             low = text.lower()
             if low.startswith(
@@ -118,64 +92,220 @@ async def _async_update_facts(uuid: str):
 @celery.task
 def generate_tags(uuid: str, limit: int = 20):
     logger.info("Generating tags for %s", uuid)
-    loop = asyncio.get_event_loop()
-    loop.run_until_complete(_async_generate_tags(uuid, limit))
+    runner.run(_async_generate_tags(uuid, limit))
+
+
+async def _async_generate_tags(uuid: str, limit: int = 20) -> int:
+    from app.services.tagging import tag_messages
+
+    rds = redis.Redis(connection_pool=redis_pool)
+    return await tag_messages(rds, openai1, uuid, limit)
 
 
-async def _async_generate_tags(uuid: str, limit: int = 20) -> None:
-    from app.embeddings import embed
-    from app.encryption import decrypt_text
+@celery.task
+def backfill_vector_payloads(batch: int = 500):
+    logger.info("Backfilling inline vector payloads")
+    runner.run(_async_backfill_vector_payloads(batch))
+
+
+async def _async_backfill_vector_payloads(batch: int = 500) -> int:
+    """Copy stream entries into vectors stored without an inline payload.
+
+    The SCAN cursor is saved after every batch so an interrupted run resumes
+    where it stopped. Only the per-user stream is consulted; vectors of chat
+    messages keep falling back to the stream lookup at search time.
+    """
     from app.history_utils import stream_key
-    from app.models import Message
-    from app.vector import upsert_embedding
 
     rds = redis.Redis(connection_pool=redis_pool)
-    entries = await rds.xrevrange(stream_key(uuid), count=limit)
-    for mid, obj in entries:
-        mid_str = mid.decode() if isinstance(mid, bytes) else mid
-        if await rds.hget(f"user:{uuid}:msg_tags", mid_str):
-            continue
-        msg = Message.model_validate_json(decrypt_text(obj[b"data"].decode()))
-        if msg.type != "text" or not msg.content:
-            continue
-        try:
-            resp = await openai1.chat.completions.create(
-                model=settings.openai_chat_model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "Generate up to 5 short topic tags. Return comma-separated tags only.",
-                    },
-                    {"role": "user", "content": msg.content},
-                ],
-                max_tokens=30,
-                temperature=0.2,
-            )
-            tag_line = resp.choices[0].message.content or ""
-            tags = [
-                t.strip().lower().replace(" ", "_")
-                for t in tag_line.split(",")
-                if t.strip()
+    cursor_key = "vector_backfill:cursor"
+    cursor = int(await rds.get(cursor_key) or 0)
+    updated = 0
+    while True:
+        cursor, keys = await rds.scan(cursor, match="history_vectors:*", count=batch)
+        if keys:
+            pipe = rds.pipeline(transaction=False)
+            for key in keys:
+                pipe.hmget(key, ["uuid", "message_id", "blob"])
+            rows = await pipe.execute()
+            todo = [
+                (key, uuid.decode(), mid.decode())
+                for key, (uuid, mid, blob) in zip(keys, rows)
+                if uuid and mid and not blob
             ]
-        except Exception:
-            logger.exception("tag generation failed for %s", uuid)
-            continue
-        if not tags:
-            continue
-        await rds.hset(f"user:{uuid}:msg_tags", mid_str, json.dumps(tags))
-        for t in tags:
-            await rds.sadd(f"user:{uuid}:tags:{t}", mid_str)
-        emb = await asyncio.get_running_loop().run_in_executor(
-            None, lambda: embed(msg.content)
+            if todo:
+                pipe = rds.pipeline(transaction=False)
+                for _key, uuid, mid in todo:
+                    pipe.xrange(stream_key(uuid), min=mid, max=mid)
+                entries = await pipe.execute()
+                pipe = rds.pipeline(transaction=False)
+                for (key, uuid, _mid), row in zip(todo, entries):
+                    if row:
+                        pipe.hset(
+                            key,
+                            mapping={
+                                "blob": row[0][1][b"data"],
+                                "stream": stream_key(uuid),
+                            },
+                        )
+                        # the field used before, which broke FT.SEARCH hits
+                        pipe.hdel(key, "payload")
+                        updated += 1
+                await pipe.execute()
+        if not cursor:
+            break
+        await rds.set(cursor_key, cursor)
+    await rds.delete(cursor_key)
+    logger.info("Backfilled %d vector payloads", updated)
+    return updated
+
+
+@celery.task
+def migrate_vector_keys(batch: int = 500):
+    logger.info("Migrating vector keys")
+    runner.run(_async_migrate_vector_keys(batch))
+
+
+async def _async_migrate_vector_keys(batch: int = 500) -> int:
+    """Rename ``history_vectors:{message_id}`` rows to :func:`vector_key`.
+
+    Rows used to be keyed by the stream ID alone, which two users can share.
+    A row already rewritten under the new key wins over the old one. The SCAN
+    cursor is saved after every batch so an interrupted run resumes.
+    """
+    from app.vector import vector_key
+
+    rds = redis.Redis(connection_pool=redis_pool)
+    cursor_key = "vector_migrate:cursor"
+    cursor = int(await rds.get(cursor_key) or 0)
+    moved = 0
+    while True:
+        cursor, keys = await rds.scan(cursor, match="history_vectors:*", count=batch)
+        if keys:
+            pipe = rds.pipeline(transaction=False)
+            for key in keys:
+                pipe.hmget(key, ["uuid", "message_id"])
+            rows = await pipe.execute()
+            todo = []
+            for key, (uuid, mid) in zip(keys, rows):
+                if not (uuid and mid):
+                    continue
+                new = vector_key(uuid.decode(), mid.decode())
+                if (key.decode() if isinstance(key, bytes) else key) != new:
+                    todo.append((key, new))
+            if todo:
+                pipe = rds.pipeline(transaction=False)
+                for key, new in todo:
+                    pipe.renamenx(key, new)
+                renamed = await pipe.execute()
+                stale = [key for (key, _new), ok in zip(todo, renamed) if not ok]
+                if stale:
+                    await rds.delete(*stale)
+                moved += sum(1 for ok in renamed if ok)
+        if not cursor:
+            break
+        await rds.set(cursor_key, cursor)
+    await rds.delete(cursor_key)
+    logger.info("Migrated %d vector keys", moved)
+    return moved
+
+
+@celery.task
+def index_imported(
+    uuid: str, chat_id: str | None, start: str, end: str, import_id: str | None = None
+):
+    logger.info("Indexing imported messages of %s", uuid)
+    runner.run(_async_index_imported(uuid, chat_id, start, end, import_id))
+
+
+async def _async_index_imported(
+    uuid: str, chat_id: str | None, start: str, end: str, import_id: str | None = None
+) -> int:
+    from app.services.bulk_import import index_imported as index_range
+
+    rds = redis.Redis(connection_pool=redis_pool)
+    return await index_range(rds, openai1, uuid, chat_id, start, end, import_id)
+
+
+@celery.task
+def reencrypt_history(batch: int = 500, rate: int = 2000):
+    logger.info("Re-encrypting history with the current key")
+    runner.run(_async_reencrypt_history(batch, rate))
+
+
+async def _async_reencrypt_history(batch: int = 500, rate: int = 2000) -> int | None:
+    """Rewrite every stored message not encrypted with ``ENCRYPTION_KEY``.
+
+    Resumable and rate-limited to ``rate`` messages per second; see
+    :mod:`app.services.rotation`.
+    """
+    from app.services.rotation import reencrypt_history
+
+    rds = redis.Redis(connection_pool=redis_pool)
+    return await reencrypt_history(rds, batch, rate)
+
+
+@celery.task
+def train_compression_dictionary(company: str, users: int = 200, per_user: int = 50):
+    logger.info("Training zstd dictionary for %s", company)
+    runner.run(_async_train_compression_dictionary(company, users, per_user))
+
+
+async def _async_train_compression_dictionary(
+    company: str, users: int = 200, per_user: int = 50
+) -> int | None:
+    """Train a zstd dictionary on recent messages of ``company``.
+
+    Samples the latest ``per_user`` text messages of the ``users`` most
+    recently active users. The new dictionary becomes the company's
+    ``zstd_dict`` for messages written from now on; older dictionaries stay
+    in Redis so the messages compressed with them remain readable.
+    """
+    from app.compression import DICT_SIZE, dictionary_key, get_codec, train_dictionary
+    from app.history_utils import decode_payloads, stream_key
+    from app.services.company import invalidate_company
+
+    try:
+        get_codec("zstd")
+    except ValueError as exc:
+        logger.warning("Skipping dictionary training for %s: %s", company, exc)
+        return None
+    rds = redis.Redis(connection_pool=redis_pool)
+    uuids = await rds.zrevrange(f"company:{company}:last_seen", 0, users - 1)
+    if not uuids:
+        logger.warning("No active users to train a dictionary for %s", company)
+        return None
+    pipe = rds.pipeline(transaction=False)
+    for uuid in uuids:
+        pipe.xrevrange(stream_key(uuid.decode()), count=per_user)
+    payloads = [obj[b"data"] for rows in await pipe.execute() for _mid, obj in rows]
+    samples = [
+        msg.content.encode()
+        for msg in await decode_payloads(rds, payloads)
+        if msg is not None and msg.type == "text" and msg.content
+    ]
+    try:
+        dict_id, raw = train_dictionary(samples, DICT_SIZE)
+    except ValueError:
+        logger.warning(
+            "Could not train a dictionary for %s from %d messages",
+            company,
+            len(samples),
         )
-        await upsert_embedding(uuid, mid_str, emb, tags=tags)
+        return None
+    await rds.set(dictionary_key(dict_id), raw)
+    await rds.hset(f"company:{company}:data", "zstd_dict", dict_id)
+    await invalidate_company(rds, company)
+    logger.info(
+        "Trained dictionary %s for %s on %d messages", dict_id, company, len(samples)
+    )
+    return dict_id
 
 
 @celery.task
 def send_notification(uuid: str, text: str):
     logger.info("Reminder for %s: %s", uuid, text)
-    loop = asyncio.get_event_loop()
-    loop.run_until_complete(_async_send_notification(uuid, text))
+    runner.run(_async_send_notification(uuid, text))
 
 
 async def _async_send_notification(uuid: str, text: str) -> None:
@@ -191,89 +321,213 @@ async def _async_send_notification(uuid: str, text: str) -> None:
 
 
 @celery.task
-def check_calendar():
+def dispatch_reminders(batch: int = 500):
+    runner.run(_async_dispatch_reminders(batch))
+
+
+async def _async_dispatch_reminders(batch: int = 500) -> int:
+    """Send every due reminder; only one worker polls at a time."""
+    import uuid as uuid_mod
+
+    from app.services.reminders import (
+        ack_claimed,
+        acquire_leader,
+        claim_due,
+        record_dispatch,
+        release_leader,
+        renew_leader,
+    )
+
+    rds = redis.Redis(connection_pool=redis_pool)
+    token = uuid_mod.uuid4().hex
+    if not await acquire_leader(rds, token, REMINDER_LEADER_TTL):
+        return 0
+    dispatched = 0
+    try:
+        while True:
+            claimed = await claim_due(rds, limit=batch)
+            sent = []
+            try:
+                for reminder in claimed:
+                    send_notification.delay(reminder["uuid"], reminder["text"])
+                    sent.append(reminder["id"])
+            finally:
+                # the rest stays in flight and is claimed again later
+                await ack_claimed(rds, sent)
+            await record_dispatch(rds, claimed)
+            dispatched += len(claimed)
+            if len(claimed) < batch:
+                break
+            # a long backlog must not outlive the lock and let a second leader in
+            if not await renew_leader(rds, token, REMINDER_LEADER_TTL):
+                logger.warning("Lost the reminder dispatch lock")
+                break
+    finally:
+        await release_leader(rds, token)
+    if dispatched:
+        logger.info("Dispatched %d reminders", dispatched)
+    return dispatched
+
+
+@celery.task
+def check_calendar(batch: int = 100):
     logger.info("Checking calendar")
-    loop = asyncio.get_event_loop()
-    loop.run_until_complete(_async_check_calendar())
+    runner.run(_async_check_calendar(batch))
 
 
-async def _async_check_calendar():
-    from app.config import get_settings
-    from app.encryption import decrypt_text
-    from app.models import Message
-    from app.services.calendar import _batch_check_calendar_events
+async def _async_check_calendar(batch: int = 100) -> int:
+    import socket
+
+    from app.services.calendar_feed import consume_calendar_feed
 
-    settings = get_settings()
     rds = redis.Redis(connection_pool=redis_pool)
-    streams = await rds.smembers("calendar:streams")
-    for skey_b in streams:
-        skey = skey_b.decode() if isinstance(skey_b, bytes) else skey_b
-        if not skey.startswith("user:"):
-            continue
-        uuid = skey.split(":")[1]
-        logger.debug("Processing calendar stream %s", uuid)
-        last = await rds.get(f"calendar:last:{skey}")
-        if isinstance(last, bytes):
-            last = last.decode()
-        rng = await rds.xrange(skey, min=f"({last}" if last else "-", max="+")
-        if not rng:
-            continue
-        msgs = []
-        for mid, obj in rng:
-            msg = Message.model_validate_json(decrypt_text(obj[b"data"].decode()))
-            msgs.append(msg)
-            last = mid
-        await _batch_check_calendar_events(rds, uuid, msgs)
-        await rds.set(f"calendar:last:{skey}", last)
+    consumer = f"{socket.gethostname()}:{os.getpid()}"
+    handled = await consume_calendar_feed(rds, consumer, batch=batch)
+    if handled:
+        logger.info("Processed %d calendar feed entries", handled)
+    return handled
 
 
 @celery.task
 def process_idle_users():
     logger.info("Processing idle users")
-    loop = asyncio.get_event_loop()
-    loop.run_until_complete(_async_process_idle_users())
+    runner.run(_async_process_idle_users())
 
 
-async def _async_process_idle_users():
-    from datetime import datetime
+IDLE_TIMEOUTS_KEY = "companies:idle_timeout"
+IDLE_TIMEOUTS_BACKFILL_KEY = "companies:idle_timeout:backfilled"
 
-    from app.encryption import decrypt_text
-    from app.history_utils import stream_key
-    from app.models import Message
-    from app.services.calendar import _check_and_store_calendar_event
 
-    rds = redis.Redis(connection_pool=redis_pool)
-    now = int(datetime.utcnow().timestamp())
-    keys = await rds.keys("user:*:data")
-    for key_b in keys:
-        key = key_b.decode() if isinstance(key_b, bytes) else key_b
-        uuid = key.split(":")[1]
-        company_id = await rds.hget(key, "company_id")
-        if not company_id:
-            continue
-        company = company_id.decode() if isinstance(company_id, bytes) else company_id
-        idle = await rds.hget(f"company:{company}:data", "idle_timeout")
-        if not idle:
-            continue
+async def _backfill_idle_timeouts(rds) -> None:
+    """Copy the idle timeouts of the company records to ``IDLE_TIMEOUTS_KEY`` once.
+
+    Companies registered before the hash existed are only there after this
+    SCAN; ``IDLE_TIMEOUTS_BACKFILL_KEY`` marks it as done.
+    """
+    if await rds.exists(IDLE_TIMEOUTS_BACKFILL_KEY):
+        return
+    found = {}
+    async for key in rds.scan_iter(match="company:*:data", count=500):
+        key = key.decode() if isinstance(key, bytes) else key
+        idle = await rds.hget(key, "idle_timeout")
+        if idle and idle not in (b"0", "0"):
+            found[key.split(":")[1]] = idle
+    if found:
+        await rds.hset(IDLE_TIMEOUTS_KEY, mapping=found)
+    await rds.set(IDLE_TIMEOUTS_BACKFILL_KEY, 1)
+
+
+async def _idle_timeouts(rds) -> dict[str, int]:
+    """Return the idle timeout of every company that has one.
+
+    Read from the ``companies:idle_timeout`` hash kept up to date by
+    ``register_company`` after the one-time backfill.
+    """
+    await _backfill_idle_timeouts(rds)
+    raw = await rds.hgetall(IDLE_TIMEOUTS_KEY)
+    timeouts = {}
+    for company, idle in raw.items():
+        company = company.decode() if isinstance(company, bytes) else company
         try:
             idle = int(idle)
         except Exception:
             continue
-        if idle <= 0:
+        if idle > 0:
+            timeouts[company] = idle
+    return timeouts
+
+
+# Removes the processed users ARGV[2..] from the sorted set KEYS[1] unless
+# they were seen again after ARGV[1], i.e. their score has moved on.
+_ACK_IDLE_SCRIPT = """
+local removed = 0
+for i = 2, #ARGV do
+    local score = redis.call('ZSCORE', KEYS[1], ARGV[i])
+    if score and tonumber(score) <= tonumber(ARGV[1]) then
+        removed = removed + redis.call('ZREM', KEYS[1], ARGV[i])
+    end
+end
+return removed
+"""
+LAST_SEEN_BACKFILL_KEY = "last_seen:backfilled"
+
+
+async def _backfill_last_seen(rds) -> None:
+    """Fill the ``company:*:last_seen`` sets from ``user:*:last_seen`` once.
+
+    Users whose last message predates the sorted sets are only there after
+    this SCAN; ``LAST_SEEN_BACKFILL_KEY`` marks it as done.
+    """
+    if await rds.exists(LAST_SEEN_BACKFILL_KEY):
+        return
+    keys = []
+    async for key in rds.scan_iter(match="user:*:last_seen", count=500):
+        keys.append(key.decode() if isinstance(key, bytes) else key)
+        if len(keys) >= 500:
+            await _backfill_last_seen_batch(rds, keys)
+            keys = []
+    await _backfill_last_seen_batch(rds, keys)
+    await rds.set(LAST_SEEN_BACKFILL_KEY, 1)
+
+
+async def _backfill_last_seen_batch(rds, keys: list[str]) -> None:
+    if not keys:
+        return
+    uuids = [key.split(":")[1] for key in keys]
+    pipe = rds.pipeline(transaction=False)
+    for uuid, key in zip(uuids, keys):
+        pipe.get(key)
+        pipe.hget(f"user:{uuid}:data", "company_id")
+    rows = await pipe.execute()
+    pipe = rds.pipeline(transaction=False)
+    for uuid, seen, company in zip(uuids, rows[::2], rows[1::2]):
+        if seen is None or company is None:
             continue
-        last_seen = await rds.get(f"user:{uuid}:last_seen")
-        if not last_seen:
+        company = company.decode() if isinstance(company, bytes) else company
+        # a member added by a newer message already has the right score
+        pipe.zadd(f"company:{company}:last_seen", {uuid: int(seen)}, nx=True)
+    await pipe.execute()
+
+
+async def _async_process_idle_users():
+    from datetime import datetime
+
+    from app.history_utils import decode_payloads, stream_key
+    from app.services.calendar import _check_and_store_calendar_event
+
+    rds = redis.Redis(connection_pool=redis_pool)
+    await _backfill_last_seen(rds)
+    now = int(datetime.utcnow().timestamp())
+    for company, idle in (await _idle_timeouts(rds)).items():
+        key = f"company:{company}:last_seen"
+        cutoff = now - idle
+        idle_users = await rds.zrangebyscore(key, "-inf", cutoff)
+        if not idle_users:
             continue
-        last_seen_int = int(
-            last_seen.decode() if isinstance(last_seen, bytes) else last_seen
+        uuids = [u.decode() if isinstance(u, bytes) else u for u in idle_users]
+        logger.info("%d idle users in %s", len(uuids), company)
+        pipe = rds.pipeline(transaction=False)
+        for uuid in uuids:
+            pipe.xrevrange(stream_key(uuid), count=1)
+        last_entries = await pipe.execute()
+        present = [i for i, entry in enumerate(last_entries) if entry]
+        decoded = await decode_payloads(
+            rds, [last_entries[i][0][1][b"data"] for i in present]
         )
-        if now - last_seen_int < idle:
-            continue
-        summarize_if_needed.delay(uuid, settings.summary_token_threshold)
-        update_facts.delay(uuid)
-        entry = await rds.xrevrange(stream_key(uuid), count=1)
-        if entry:
-            msg = Message.model_validate_json(
-                decrypt_text(entry[0][1][b"data"].decode())
-            )
-            await _check_and_store_calendar_event(rds, uuid, msg)
+        last_msgs = dict(zip(present, decoded))
+        done = []
+        for i, uuid in enumerate(uuids):
+            msg = last_msgs.get(i)
+            try:
+                summarize_if_needed.delay(uuid, settings.summary_token_threshold)
+                update_facts.delay(uuid)
+                if msg is not None:
+                    await _check_and_store_calendar_event(rds, uuid, msg)
+            except Exception:
+                # left in the set and retried on the next run
+                logger.exception("Failed to process idle user %s", uuid)
+                continue
+            done.append(uuid)
+        if done:
+            # users who wrote again meanwhile stay for their next idle period
+            await rds.eval(_ACK_IDLE_SCRIPT, 1, key, cutoff, *done)